@@ -0,0 +1,419 @@
+"""Synthetic dataset generator for scale testing.
+
+Fills the tables of database_design/postgres_schema.md: categories,
+products, inventory_levels, customers, suppliers, sales and purchase
+orders, and their items. Rows are streamed with COPY from parallel worker
+processes. Each chunk of rows is generated from its own RNG, seeded from
+(--seed, table, chunk), so the same arguments always produce the same
+data whatever --workers is.
+
+Skew:
+- SKU popularity follows a Zipf distribution (--zipf), so a few products
+  appear on most order lines.
+- Customers and suppliers are skewed too, so some customers order often.
+- Lines per order follow a heavy-tailed distribution capped at 200.
+- Order dates carry yearly seasonality (November/December peak, summer
+  dip), a weekly cycle, business-hour peaks and growth over the range.
+
+Parent tables get explicit ids (1..N) so children can reference them
+without lookups, which means the target tables must be empty; --truncate
+empties them first. Afterwards the id and document-number sequences are
+moved past the loaded rows, resource_versions is bumped and the tables are
+analyzed.
+
+    python -m benchmarks.generate_dataset --products 1000000 --sales-lines 20000000 --workers 8 --truncate
+"""
+
+import io
+import os
+import sys
+import math
+import time
+import zlib
+import bisect
+import random
+import argparse
+import itertools
+import multiprocessing
+from datetime import datetime, timedelta
+
+import psycopg2
+
+CHUNK_ROWS = 50000
+MAX_ORDER_LINES = 200
+
+TABLES = ("purchase_order_items", "purchase_orders", "sales_order_items", "sales_orders",
+          "inventory_levels", "products", "categories", "customers", "suppliers")
+
+COLUMNS = {
+    "categories": ("category_id", "category_name", "description"),
+    "products": ("product_id", "sku", "product_name", "description", "category_id", "unit_price", "average_cost",
+                 "last_purchase_price", "created_at", "updated_at"),
+    "inventory_levels": ("product_id", "available_quantity", "inventory_level_status", "reorder_point", "last_updated"),
+    "customers": ("customer_id", "customer_name", "email", "phone", "address_line1", "city", "state_province",
+                  "postal_code", "country", "created_at"),
+    "suppliers": ("supplier_id", "supplier_name", "contact_name", "email", "phone", "address_line1", "city", "country", "created_at"),
+    "sales_orders": ("order_id", "order_number", "customer_id", "order_date", "total_amount", "status",
+                     "shipping_address_line1", "shipping_city", "shipping_state_province", "shipping_postal_code",
+                     "shipping_country", "updated_at"),
+    "sales_order_items": ("order_id", "product_id", "sku", "quantity", "unit_price", "line_total"),
+    "purchase_orders": ("po_id", "po_number", "supplier_id", "order_date", "expected_delivery_date", "total_amount",
+                        "status", "updated_at"),
+    "purchase_order_items": ("po_id", "product_id", "sku", "quantity", "unit_cost", "line_total"),
+}
+
+SALES_ORDER_NUMBER_FORMAT = os.getenv("SALES_ORDER_NUMBER_FORMAT", "SO-{timestamp}-{number}")
+PURCHASE_ORDER_NUMBER_FORMAT = os.getenv("PURCHASE_ORDER_NUMBER_FORMAT", "PO-{timestamp}-{number}")
+
+FIRST_NAMES = ("James", "Mary", "Wei", "Fatima", "Carlos", "Anna", "Yuki", "Olga", "Kwame", "Priya", "Lucas", "Sofia",
+               "Ahmed", "Emma", "Mateo", "Chloe", "Ivan", "Aisha", "Noah", "Mia", "Hiro", "Lena", "Omar", "Zoe")
+LAST_NAMES = ("Smith", "Garcia", "Chen", "Khan", "Silva", "Novak", "Tanaka", "Ivanova", "Mensah", "Patel", "Müller",
+              "Rossi", "Haddad", "Brown", "Lopez", "Martin", "Petrov", "Okafor", "Wilson", "Kim", "Sato", "Weber")
+CITIES = (("Berlin", "BE", "Germany"), ("Austin", "TX", "USA"), ("Lyon", "ARA", "France"), ("Osaka", "27", "Japan"),
+          ("Toronto", "ON", "Canada"), ("Leeds", "ENG", "UK"), ("Porto", "13", "Portugal"), ("Pune", "MH", "India"),
+          ("Denver", "CO", "USA"), ("Krakow", "MA", "Poland"), ("Melbourne", "VIC", "Australia"), ("Seattle", "WA", "USA"))
+PRODUCT_WORDS = ("Steel", "Compact", "Pro", "Eco", "Heavy-Duty", "Wireless", "Classic", "Premium", "Mini", "Smart")
+PRODUCT_NOUNS = ("Drill", "Bracket", "Cable", "Lamp", "Valve", "Sensor", "Chair", "Filter", "Panel", "Pump", "Router", "Clamp")
+
+# Relative order volume by month (Jan..Dec) and weekday (Mon..Sun); hour weights follow a business day.
+MONTH_WEIGHTS = (0.80, 0.75, 0.90, 0.95, 1.00, 0.90, 0.85, 0.90, 1.00, 1.10, 1.45, 1.70)
+WEEKDAY_WEIGHTS = (1.10, 1.05, 1.05, 1.05, 1.10, 0.80, 0.60)
+HOUR_WEIGHTS = (1, 1, 1, 1, 1, 2, 3, 5, 8, 10, 11, 11, 10, 10, 11, 11, 10, 9, 8, 7, 6, 4, 3, 2)
+
+
+# --- Distributions ---
+
+class ZipfSampler:
+    """Draws 1..n with P(k) proportional to 1 / k**s, via a precomputed CDF and bisect.
+
+    Ranks are scattered over the id range with a multiplicative permutation,
+    so the popular ids are not simply the lowest ones.
+    """
+
+    def __init__(self, n, s):
+        self.n = n
+        cdf = list(itertools.accumulate(1.0 / k ** s for k in range(1, n + 1)))
+        self.total = cdf[-1]
+        self.cdf = cdf
+        self.stride = next(a for a in range(int(n * 0.618) | 1, 2 * n + 2) if math.gcd(a, n) == 1)
+
+    def draw(self, rng):
+        rank = bisect.bisect_left(self.cdf, rng.random() * self.total)
+        return (rank * self.stride) % self.n + 1
+
+
+class DateSampler:
+    """Draws order timestamps between start and end with seasonal, weekly, daily and growth patterns."""
+
+    def __init__(self, start, end):
+        self.start = start
+        days = max((end - start).days, 1)
+        weights = []
+        for offset in range(days):
+            day = start + timedelta(days=offset)
+            growth = 1.0 + 0.5 * offset / days
+            weights.append(MONTH_WEIGHTS[day.month - 1] * WEEKDAY_WEIGHTS[day.weekday()] * growth)
+        self.day_cdf = list(itertools.accumulate(weights))
+        self.hour_cdf = list(itertools.accumulate(HOUR_WEIGHTS))
+
+    def draw(self, rng):
+        day = bisect.bisect_left(self.day_cdf, rng.random() * self.day_cdf[-1])
+        hour = bisect.bisect_left(self.hour_cdf, rng.random() * self.hour_cdf[-1])
+        return self.start + timedelta(days=day, hours=hour, seconds=rng.randrange(3600))
+
+
+def line_count(rng):
+    # Heavy tail: most orders have a handful of lines, a few approach MAX_ORDER_LINES.
+    return min(MAX_ORDER_LINES, int(rng.paretovariate(1.3)))
+
+
+def mean_line_count(seed):
+    rng = random.Random(seed)
+    return sum(line_count(rng) for _ in range(200000)) / 200000
+
+
+# --- COPY encoding ---
+
+def _copy_value(value):
+    if value is None:
+        return "\\N"
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+def _copy_line(values):
+    return "\t".join(map(_copy_value, values)) + "\n"
+
+
+def _money(value):
+    return f"{value:.2f}"
+
+
+# --- Workers ---
+
+_worker = {}
+
+
+def _init_worker(dsn, config):
+    _worker["conn"] = psycopg2.connect(dsn)
+    _worker["config"] = config
+    _worker["products"] = ZipfSampler(config["products"], config["zipf"])
+    _worker["customers"] = ZipfSampler(config["customers"], 0.7)
+    _worker["suppliers"] = ZipfSampler(config["suppliers"], 0.9)
+    _worker["dates"] = DateSampler(config["start"], config["end"])
+
+
+def _chunk_rng(table, chunk):
+    # Stable across processes and Python runs (unlike hash()).
+    return random.Random(zlib.crc32(f"{_worker['config']['seed']}:{table}:{chunk}".encode("utf-8")))
+
+
+def _product_price(product_id):
+    # Prices derive from the id alone so order lines can price a product without a lookup.
+    rng = random.Random(zlib.crc32(f"{_worker['config']['seed']}:price:{product_id}".encode("utf-8")))
+    price = round(min(math.exp(rng.gauss(3.4, 1.0)), 99999.0), 2)
+    return max(price, 0.5), round(max(price, 0.5) * rng.uniform(0.45, 0.8), 2)
+
+
+def _copy(cur, table, lines):
+    cur.copy_expert(f"COPY {table} ({', '.join(COLUMNS[table])}) FROM STDIN", io.StringIO("".join(lines)))
+
+
+def _generate_products(rng, first_id, count):
+    config = _worker["config"]
+    created = config["start"] - timedelta(days=30)
+    products, inventory = [], []
+    for product_id in range(first_id, first_id + count):
+        price, cost = _product_price(product_id)
+        stamp = created + timedelta(seconds=rng.randrange(86400 * 30))
+        products.append(_copy_line((
+            product_id, f"SKU-{product_id:08d}",
+            f"{rng.choice(PRODUCT_WORDS)} {rng.choice(PRODUCT_NOUNS)} {product_id}", None,
+            rng.randint(1, config["categories"]), _money(price), _money(cost),
+            _money(cost * rng.uniform(0.9, 1.1)) if rng.random() < 0.8 else None, stamp, stamp,
+        )))
+        quantity = int(rng.expovariate(1 / 200))
+        reorder_point = rng.choice((0, 10, 20, 50))
+        status = "Out of Stock" if quantity == 0 else "Low Stock" if quantity <= reorder_point else "In Stock"
+        inventory.append(_copy_line((product_id, quantity, status, reorder_point, stamp)))
+    return (("products", products), ("inventory_levels", inventory))
+
+
+def _generate_customers(rng, first_id, count):
+    created = _worker["config"]["start"] - timedelta(days=365)
+    lines = []
+    for customer_id in range(first_id, first_id + count):
+        city, state, country = rng.choice(CITIES)
+        lines.append(_copy_line((
+            customer_id, f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", f"customer{customer_id}@example.com",
+            f"+1-555-{rng.randrange(10**7):07d}", f"{rng.randint(1, 9999)} Market Street", city, state,
+            f"{rng.randrange(10**5):05d}", country, created + timedelta(seconds=rng.randrange(86400 * 365)),
+        )))
+    return (("customers", lines),)
+
+
+def _generate_suppliers(rng, first_id, count):
+    created = _worker["config"]["start"] - timedelta(days=365)
+    lines = []
+    for supplier_id in range(first_id, first_id + count):
+        city, _, country = rng.choice(CITIES)
+        lines.append(_copy_line((
+            supplier_id, f"{rng.choice(LAST_NAMES)} {rng.choice(PRODUCT_NOUNS)} Supply {supplier_id}",
+            f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", f"supplier{supplier_id}@example.com",
+            f"+1-555-{rng.randrange(10**7):07d}", f"{rng.randint(1, 999)} Industrial Way", city, country,
+            created + timedelta(seconds=rng.randrange(86400 * 365)),
+        )))
+    return (("suppliers", lines),)
+
+
+def _distinct_products(rng, count):
+    sampler = _worker["products"]
+    chosen = set()
+    for _ in range(count * 20):
+        chosen.add(sampler.draw(rng))
+        if len(chosen) == count:
+            return chosen
+    while len(chosen) < count: # Small catalogs: the tail is too rare to reach by skewed draws alone
+        chosen.add(rng.randint(1, sampler.n))
+    return chosen
+
+
+def _generate_sales(rng, first_id, count):
+    config = _worker["config"]
+    end = config["end"]
+    orders, items = [], []
+    for order_id in range(first_id, first_id + count):
+        order_date = _worker["dates"].draw(rng)
+        total = 0.0
+        for product_id in _distinct_products(rng, min(line_count(rng), config["products"])):
+            price, _ = _product_price(product_id)
+            quantity = 1 + int(rng.expovariate(0.6))
+            line_total = round(price * quantity, 2)
+            total += line_total
+            items.append(_copy_line((order_id, product_id, f"SKU-{product_id:08d}", quantity, _money(price), _money(line_total))))
+        age = (end - order_date).days
+        status = ("Cancelled" if rng.random() < 0.03 else "Delivered" if age > 14 else
+                  rng.choice(("Pending", "Processed", "Shipped")) if age > 2 else "Pending")
+        city, state, country = rng.choice(CITIES)
+        number = SALES_ORDER_NUMBER_FORMAT.format(number=order_id, timestamp=order_date.strftime("%Y%m%d%H%M%S"), date=order_date)
+        orders.append(_copy_line((
+            order_id, number, _worker["customers"].draw(rng), order_date, _money(total), status,
+            f"{rng.randint(1, 9999)} Market Street", city, state, f"{rng.randrange(10**5):05d}", country, order_date,
+        )))
+    return (("sales_orders", orders), ("sales_order_items", items))
+
+
+def _generate_purchases(rng, first_id, count):
+    config = _worker["config"]
+    end = config["end"]
+    orders, items = [], []
+    for po_id in range(first_id, first_id + count):
+        order_date = _worker["dates"].draw(rng)
+        total = 0.0
+        for product_id in _distinct_products(rng, min(1 + int(rng.expovariate(1 / 8)), 50, config["products"])):
+            _, cost = _product_price(product_id)
+            unit_cost = round(cost * rng.uniform(0.9, 1.1), 2)
+            quantity = 10 * (1 + int(rng.expovariate(0.2)))
+            line_total = round(unit_cost * quantity, 2)
+            total += line_total
+            items.append(_copy_line((po_id, product_id, f"SKU-{product_id:08d}", quantity, _money(unit_cost), _money(line_total))))
+        age = (end - order_date).days
+        status = "Cancelled" if rng.random() < 0.02 else "Received" if age > 10 else "Ordered"
+        number = PURCHASE_ORDER_NUMBER_FORMAT.format(number=po_id, timestamp=order_date.strftime("%Y%m%d%H%M%S"), date=order_date)
+        orders.append(_copy_line((
+            po_id, number, _worker["suppliers"].draw(rng), order_date, order_date + timedelta(days=rng.randint(3, 21)),
+            _money(total), status, order_date,
+        )))
+    return (("purchase_orders", orders), ("purchase_order_items", items))
+
+
+GENERATORS = {
+    "products": _generate_products,
+    "customers": _generate_customers,
+    "suppliers": _generate_suppliers,
+    "sales": _generate_sales,
+    "purchases": _generate_purchases,
+}
+
+
+def _load_chunk(task):
+    """Generates one chunk and COPYs it (parent rows before children) in one transaction."""
+    kind, chunk, first_id, count = task
+    conn = _worker["conn"]
+    tables = GENERATORS[kind](_chunk_rng(kind, chunk), first_id, count)
+    with conn.cursor() as cur:
+        for table, lines in tables:
+            _copy(cur, table, lines)
+    conn.commit()
+    return kind, {table: len(lines) for table, lines in tables}
+
+
+# --- Orchestration ---
+
+def _tasks(kind, total, chunk_rows):
+    return [(kind, chunk, first_id, min(chunk_rows, total - first_id + 1))
+            for chunk, first_id in enumerate(range(1, total + 1, chunk_rows))]
+
+
+def _run_phase(pool, tasks, label):
+    started = time.perf_counter()
+    loaded = {}
+    for done, (_, counts) in enumerate(pool.imap_unordered(_load_chunk, tasks), 1):
+        for table, rows in counts.items():
+            loaded[table] = loaded.get(table, 0) + rows
+        if done % 10 == 0 or done == len(tasks):
+            rate = sum(loaded.values()) / (time.perf_counter() - started)
+            print(f"  {label}: {done}/{len(tasks)} chunks, {rate:,.0f} rows/s", flush=True)
+    return loaded
+
+
+def prepare_tables(conn, truncate):
+    with conn.cursor() as cur:
+        if truncate:
+            cur.execute(f"TRUNCATE {', '.join(TABLES)} RESTART IDENTITY CASCADE;")
+        else:
+            for table in TABLES:
+                cur.execute(f"SELECT EXISTS (SELECT 1 FROM {table});")
+                if cur.fetchone()[0]:
+                    raise SystemExit(f"Table {table} is not empty; pass --truncate to replace its contents.")
+    conn.commit()
+
+
+def finish_load(conn):
+    """Moves sequences past the loaded ids, invalidates cached ETags and refreshes planner statistics."""
+    with conn.cursor() as cur:
+        for table, column in (("categories", "category_id"), ("products", "product_id"), ("inventory_levels", "inventory_id"),
+                              ("customers", "customer_id"), ("suppliers", "supplier_id"), ("sales_orders", "order_id"),
+                              ("sales_order_items", "order_item_id"), ("purchase_orders", "po_id"), ("purchase_order_items", "po_item_id")):
+            cur.execute(f"SELECT setval(pg_get_serial_sequence('{table}', '{column}'), COALESCE(MAX({column}), 0) + 1, false) FROM {table};")
+        cur.execute("SELECT to_regclass('sales_order_number_seq'), to_regclass('purchase_order_number_seq'), to_regclass('resource_versions');")
+        sales_seq, purchase_seq, versions = cur.fetchone()
+        if sales_seq:
+            cur.execute("SELECT setval('sales_order_number_seq', COALESCE((SELECT MAX(order_id) FROM sales_orders), 0) + 1, false);")
+        if purchase_seq:
+            cur.execute("SELECT setval('purchase_order_number_seq', COALESCE((SELECT MAX(po_id) FROM purchase_orders), 0) + 1, false);")
+        if versions:
+            cur.execute("UPDATE resource_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP;")
+    conn.commit()
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        for table in TABLES:
+            cur.execute(f"ANALYZE {table};")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"), help="Target database (default DATABASE_URL)")
+    parser.add_argument("--categories", type=int, default=500)
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--customers", type=int, default=50000)
+    parser.add_argument("--suppliers", type=int, default=1000)
+    parser.add_argument("--sales-lines", type=int, default=1000000, help="Approximate number of sales order lines")
+    parser.add_argument("--purchase-orders", type=int, default=20000)
+    parser.add_argument("--start-date", type=datetime.fromisoformat, default=datetime(2023, 1, 1))
+    parser.add_argument("--end-date", type=datetime.fromisoformat, default=datetime(2025, 1, 1))
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of SKU popularity")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="Parent rows per COPY chunk")
+    parser.add_argument("--truncate", action="store_true", help="Empty the ERP tables before loading")
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error("Pass --dsn or set DATABASE_URL.")
+
+    sales_orders = max(1, round(args.sales_lines / mean_line_count(args.seed)))
+    config = {
+        "seed": args.seed, "products": args.products, "categories": args.categories, "customers": args.customers,
+        "suppliers": args.suppliers, "zipf": args.zipf, "start": args.start_date, "end": args.end_date,
+    }
+    started = time.perf_counter()
+    conn = psycopg2.connect(args.dsn)
+    prepare_tables(conn, args.truncate)
+    with conn.cursor() as cur:
+        _copy(cur, "categories", [_copy_line((i, f"Category {i:04d}", None)) for i in range(1, args.categories + 1)])
+    conn.commit()
+
+    print(f"Loading with {args.workers} workers, seed {args.seed}, ~{sales_orders:,} sales orders")
+    ctx = multiprocessing.get_context("fork" if sys.platform != "win32" else "spawn")
+    with ctx.Pool(args.workers, initializer=_init_worker, initargs=(args.dsn, config)) as pool:
+        loaded = {"categories": args.categories}
+        # Parents first: the order chunks reference products, customers and suppliers by id.
+        loaded.update(_run_phase(pool, _tasks("products", args.products, args.chunk_rows)
+                                 + _tasks("customers", args.customers, args.chunk_rows)
+                                 + _tasks("suppliers", args.suppliers, args.chunk_rows), "catalog and parties"))
+        order_chunk = max(1, args.chunk_rows // 10) # Orders carry ~10x their count in item rows
+        loaded.update(_run_phase(pool, _tasks("sales", sales_orders, order_chunk)
+                                 + _tasks("purchases", args.purchase_orders, order_chunk), "orders"))
+
+    print("Updating sequences and statistics")
+    finish_load(conn)
+    conn.close()
+    elapsed = time.perf_counter() - started
+    print(f"Loaded {sum(loaded.values()):,} rows in {elapsed:.1f}s")
+    for table in reversed(TABLES):
+        print(f"  {table:<22} {loaded.get(table, 0):>12,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,408 @@
+"""End-to-end HTTP load test for the ERP API.
+
+Starts src/app.py against the PostgreSQL in DATABASE_URL (or targets a
+running server with --url), seeds a benchmark catalog through the import
+endpoint, then drives one traffic mix at a fixed concurrency for a fixed
+time. Latency percentiles and throughput are reported per endpoint and can
+be stored as a baseline, or compared against one (exit status 1 on a
+regression beyond --tolerance).
+
+Scenarios:
+    browse     catalog pages and product / order detail reads
+    orders     POST /api/sales with 1-200 lines (skewed towards small orders)
+    receiving  POST /api/purchases followed by marking the PO Received
+    reports    sales, inventory and purchase reports
+    mixed      mostly browse, with orders, receiving and reports mixed in
+
+The run writes to the target database (it upserts BENCH-* products and
+creates orders), so point it at a scratch database.
+
+    python -m benchmarks.http_load --scenario mixed --concurrency 16 --duration 30 --save-baseline
+    python -m benchmarks.http_load --scenario mixed --concurrency 16 --duration 30 --compare
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import threading
+import subprocess
+import http.client
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_DIR = os.path.join(REPO_ROOT, "benchmarks", "baselines")
+PERCENTILES = (50, 95, 99)
+
+
+# --- Server ---
+
+class AppServer:
+    """Runs src/app.py in a subprocess on a local port until the block exits."""
+
+    def __init__(self, port, log_path=None):
+        self.port = port
+        self.log_path = log_path
+        self.url = f"http://127.0.0.1:{port}"
+        self._process = None
+        self._log = None
+
+    def __enter__(self):
+        env = dict(os.environ, APP_PORT=str(self.port), DEBUG="False")
+        self._log = open(self.log_path, "ab") if self.log_path else subprocess.DEVNULL
+        self._process = subprocess.Popen([sys.executable, os.path.join("src", "app.py")], cwd=REPO_ROOT, env=env,
+                                         stdout=self._log, stderr=subprocess.STDOUT)
+        wait_until_ready(self.url, process=self._process)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._process.terminate()
+        try:
+            self._process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+        if self.log_path:
+            self._log.close()
+        return False
+
+
+def wait_until_ready(url, timeout=30.0, process=None):
+    deadline = time.monotonic() + timeout
+    client = HttpClient(url)
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"src/app.py exited with status {process.returncode} during startup")
+        try:
+            status, _ = client.request("GET", "/api/products?limit=1")
+            if status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server at {url} was not ready after {timeout:.0f}s")
+
+
+# --- Client ---
+
+class HttpClient:
+    """One keep-alive connection; reconnects once when the server closed it."""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self._conn = None
+
+    def request(self, method, path, body=None, content_type="application/json"):
+        payload = json.dumps(body).encode("utf-8") if isinstance(body, (dict, list)) else body
+        headers = {"Content-Type": content_type} if payload is not None else {}
+        for attempt in (1, 2):
+            if self._conn is None:
+                self._conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                self._conn.request(method, path, body=payload, headers=headers)
+                response = self._conn.getresponse()
+                data = response.read()
+                if response.will_close:
+                    self._conn.close()
+                    self._conn = None
+                return response.status, data
+            except (http.client.HTTPException, ConnectionError):
+                self._conn.close()
+                self._conn = None
+                if attempt == 2:
+                    raise
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+
+
+class Recorder:
+    """Collects (latency, ok) samples per endpoint label; thread-safe."""
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+        self.enabled = False
+
+    def add(self, label, elapsed, ok):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.samples.setdefault(label, []).append((elapsed, ok))
+
+
+class Session:
+    """What one load-generating thread uses: a connection, its RNG and the seeded data."""
+
+    def __init__(self, url, recorder, rng, data):
+        self.client = HttpClient(url)
+        self.recorder = recorder
+        self.rng = rng
+        self.data = data
+
+    def call(self, label, method, path, body=None):
+        started = time.perf_counter()
+        try:
+            status, payload = self.client.request(method, path, body)
+        except OSError:
+            self.recorder.add(label, time.perf_counter() - started, False)
+            return None, None
+        self.recorder.add(label, time.perf_counter() - started, status < 400 or status == 404)
+        return status, payload
+
+    def popular_sku(self):
+        # Zipf-like skew: a few SKUs get most of the traffic, as on a real storefront.
+        skus = self.data["skus"]
+        return skus[min(int(self.rng.paretovariate(1.16)) - 1, len(skus) - 1)]
+
+    def order_lines(self, max_lines):
+        count = 1 + int((max_lines - 1) * self.rng.random() ** 4) # Mostly small orders, a tail up to max_lines
+        return [{"sku": sku, "quantity": self.rng.randint(1, 5)} for sku in self.rng.sample(self.data["skus"], count)]
+
+
+# --- Operations ---
+
+def browse_catalog(session):
+    status, payload = session.call("GET /api/products?limit=50", "GET", "/api/products?limit=50")
+    if status == 200:
+        cursor = json.loads(payload).get("next_cursor")
+        if cursor and session.rng.random() < 0.5:
+            session.call("GET /api/products?limit=50&after=", "GET", f"/api/products?limit=50&after={cursor}")
+
+
+def view_product(session):
+    session.call("GET /api/products/<sku>", "GET", f"/api/products/{session.popular_sku()}")
+
+
+def list_sales(session):
+    session.call("GET /api/sales?limit=50", "GET", "/api/sales?limit=50")
+
+
+def view_sale(session):
+    order_ids = session.data["order_ids"]
+    if order_ids:
+        session.call("GET /api/sales/<order_id>", "GET", f"/api/sales/{session.rng.choice(order_ids)}")
+
+
+def post_order(session):
+    body = {"customer_name": f"Bench Customer {session.rng.randint(1, 500)}", "items": session.order_lines(200),
+            "order_date": datetime.now(timezone.utc).isoformat()}
+    status, payload = session.call("POST /api/sales", "POST", "/api/sales", body)
+    if status == 201:
+        session.data["order_ids"].append(json.loads(payload)["order_id"])
+
+
+def receive_purchase(session):
+    items = [dict(line, cost_price=round(session.rng.uniform(1, 50), 2)) for line in session.order_lines(20)]
+    body = {"supplier_name": f"Bench Supplier {session.rng.randint(1, 20)}", "items": items,
+            "order_date": datetime.now(timezone.utc).isoformat()}
+    status, payload = session.call("POST /api/purchases", "POST", "/api/purchases", body)
+    if status == 201:
+        po_id = json.loads(payload)["po_id"]
+        session.call("PUT /api/purchases/<po_id>/status", "PUT", f"/api/purchases/{po_id}/status", {"new_status": "Received"})
+
+
+def run_reports(session):
+    report = session.rng.choice(("sales", "inventory", "purchases"))
+    session.call(f"GET /api/reports/{report}", "GET", f"/api/reports/{report}")
+
+
+SCENARIOS = {
+    "browse": ((browse_catalog, 35), (view_product, 45), (list_sales, 10), (view_sale, 10)),
+    "orders": ((post_order, 80), (view_sale, 20)),
+    "receiving": ((receive_purchase, 100),),
+    "reports": ((run_reports, 100),),
+    "mixed": ((browse_catalog, 25), (view_product, 40), (list_sales, 5), (view_sale, 10), (post_order, 12),
+              (receive_purchase, 4), (run_reports, 4)),
+}
+
+
+# --- Seeding ---
+
+def seed(url, products, rng):
+    """Upserts the BENCH-* catalog with ample stock and creates a few orders to read back."""
+    client = HttpClient(url)
+    skus = [f"BENCH-{i:06d}" for i in range(products)]
+    lines = "".join(json.dumps({
+        "sku": sku, "name": f"Bench product {i}", "category": f"Bench category {i % 25}",
+        "unit_price": round(rng.uniform(1, 500), 2), "average_cost": round(rng.uniform(1, 250), 2),
+        "quantity": 10**8, "inventory_level_status": "In Stock",
+    }) + "\n" for i, sku in enumerate(skus))
+    status, payload = client.request("POST", "/api/products/import", lines.encode("utf-8"), "application/x-ndjson")
+    if status != 200:
+        raise RuntimeError(f"Seeding products failed ({status}): {payload[:200]!r}")
+
+    data = {"skus": skus, "order_ids": []}
+    recorder = Recorder()
+    session = Session(url, recorder, rng, data)
+    for _ in range(50):
+        post_order(session)
+    session.client.close()
+    client.close()
+    return data
+
+
+# --- Run and report ---
+
+def run_load(url, scenario, concurrency, duration, warmup, data, seed_value):
+    recorder = Recorder()
+    operations, weights = zip(*SCENARIOS[scenario])
+    stop = threading.Event()
+
+    def worker(index):
+        rng = random.Random(seed_value * 1000 + index)
+        session = Session(url, recorder, rng, {"skus": data["skus"], "order_ids": list(data["order_ids"])})
+        while not stop.is_set():
+            rng.choices(operations, weights)[0](session)
+        session.client.close()
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    time.sleep(warmup)
+    recorder.enabled = True
+    started = time.perf_counter()
+    time.sleep(duration)
+    recorder.enabled = False
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=60)
+    return summarize(recorder.samples, elapsed)
+
+
+def percentile(sorted_values, pct):
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, elapsed):
+    endpoints = {}
+    total = 0
+    for label, values in sorted(samples.items()):
+        latencies = sorted(value for value, _ in values)
+        errors = sum(1 for _, ok in values if not ok)
+        stats = {"requests": len(values), "errors": errors, "throughput_rps": round(len(values) / elapsed, 2),
+                 "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2), "max_ms": round(latencies[-1] * 1000, 2)}
+        for pct in PERCENTILES:
+            stats[f"p{pct}_ms"] = round(percentile(latencies, pct) * 1000, 2)
+        endpoints[label] = stats
+        total += len(values)
+    return {"duration_s": round(elapsed, 2), "requests": total, "throughput_rps": round(total / elapsed, 2), "endpoints": endpoints}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(current, baseline, tolerance):
+    """Prints per-endpoint deltas and returns the regressions (p50/p95 up or throughput down beyond tolerance)."""
+    regressions = []
+    print(f"\nCompared with baseline from {baseline['meta'].get('recorded_at')} (commit {baseline['meta'].get('git_commit')}), tolerance {tolerance:.0%}")
+    for label, stats in current["endpoints"].items():
+        base = baseline["results"]["endpoints"].get(label)
+        if base is None:
+            print(f"  {label:<40} (not in baseline)")
+            continue
+        deltas = []
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            change = (stats[key] - base[key]) / base[key] if base[key] else 0.0
+            deltas.append(f"{key[:-3]} {change:+6.1%}")
+            if key != "p99_ms" and change > tolerance: # p99 is reported but too noisy to gate on
+                regressions.append(f"{label} {key} {base[key]} -> {stats[key]}")
+        print(f"  {label:<40} " + "  ".join(deltas))
+    base_rps = baseline["results"]["throughput_rps"]
+    change = (current["throughput_rps"] - base_rps) / base_rps if base_rps else 0.0
+    print(f"  {'overall throughput':<40} {change:+6.1%}")
+    if change < -tolerance:
+        regressions.append(f"throughput {base_rps} -> {current['throughput_rps']} rps")
+    return regressions
+
+
+def print_results(results):
+    print(f"{results['requests']} requests in {results['duration_s']}s, {results['throughput_rps']} req/s")
+    print(f"  {'endpoint':<40} {'reqs':>7} {'err':>5} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for label, stats in results["endpoints"].items():
+        print(f"  {label:<40} {stats['requests']:>7} {stats['errors']:>5} {stats['throughput_rps']:>8.1f} "
+              f"{stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="mixed")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30.0, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Seconds of load before measuring")
+    parser.add_argument("--products", type=int, default=2000, help="BENCH-* products to seed")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--url", help="Target an already running server instead of starting src/app.py")
+    parser.add_argument("--port", type=int, default=8765, help="Port for the started server")
+    parser.add_argument("--server-log", help="Append the started server's output to this file")
+    parser.add_argument("--output", help="Also write this run's results to a JSON file")
+    parser.add_argument("--save-baseline", nargs="?", const="", help="Store the results as the baseline (default benchmarks/baselines/<scenario>.json)")
+    parser.add_argument("--compare", nargs="?", const="", help="Compare with a stored baseline (default benchmarks/baselines/<scenario>.json)")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative regression before failing")
+    args = parser.parse_args()
+
+    default_baseline = os.path.join(BASELINE_DIR, f"{args.scenario}.json")
+    server = None
+    if args.url:
+        url = args.url.rstrip("/")
+        wait_until_ready(url)
+    else:
+        server = AppServer(args.port, args.server_log).__enter__()
+        url = server.url
+    try:
+        data = seed(url, args.products, random.Random(args.seed))
+        print(f"Scenario {args.scenario}: {args.concurrency} concurrent clients, {args.warmup:.0f}s warm-up, {args.duration:.0f}s measured")
+        results = run_load(url, args.scenario, args.concurrency, args.duration, args.warmup, data, args.seed)
+    finally:
+        if server is not None:
+            server.__exit__(None, None, None)
+
+    print_results(results)
+    report = {
+        "meta": {
+            "scenario": args.scenario, "concurrency": args.concurrency, "duration_s": args.duration, "warmup_s": args.warmup,
+            "products": args.products, "seed": args.seed, "git_commit": git_commit(), "python": platform.python_version(),
+            "host": platform.node(), "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    status = 0
+    if args.compare is not None:
+        path = args.compare or default_baseline
+        with open(path) as f:
+            baseline = json.load(f)
+        if baseline["meta"]["scenario"] != args.scenario or baseline["meta"]["concurrency"] != args.concurrency:
+            print(f"Warning: baseline was recorded with scenario={baseline['meta']['scenario']}, concurrency={baseline['meta']['concurrency']}")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions:\n  " + "\n  ".join(regressions))
+            status = 1
+        else:
+            print("\nNo regressions beyond tolerance.")
+    if args.save_baseline is not None:
+        path = args.save_baseline or default_baseline
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {path}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""Micro-benchmark: serializing a large product list response.
+
+Compares the previous path (map_rows into dicts, then Flask's default
+jsonify) with returning a RowSet through ERPJSONProvider, using both the
+orjson backend and the stdlib fallback. Rows are synthetic tuples shaped
+like PRODUCT_SELECT, so no database is needed.
+
+Two more lines break the orjson path down: building RowSet.to_list()'s
+per-row dicts on its own, and encoding the bare row tuples (arrays, no
+keys), which is the floor for any encoder that still calls orjson once.
+
+    python -m benchmarks.json_serialization --rows 100000 --repeat 5
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from src.db import rows as rows_module
+from src.db.rows import RowSet, map_rows, json_default
+from src.web.json_provider import ERPJSONProvider
+from src.core_modules.product_management.product_service import PRODUCT_COLUMNS
+
+
+def make_rows(count):
+    created = datetime(2024, 1, 1, 9, 30)
+    return [
+        (
+            i, f"SKU-{i:07d}", f"Product {i}", "Synthetic benchmark product", f"Category {i % 50}",
+            Decimal("19.99") + i % 100, Decimal("12.50"), Decimal("11.75") if i % 3 else None,
+            i % 500, "In Stock", 10, created + timedelta(minutes=i), created + timedelta(minutes=i, seconds=30),
+        )
+        for i in range(count)
+    ]
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    app = Flask(__name__)
+    default_provider = DefaultJSONProvider(app)
+    fast_provider = ERPJSONProvider(app)
+
+    def previous_path():
+        with app.app_context():
+            return default_provider.response(map_rows(PRODUCT_COLUMNS, rows)).get_data()
+
+    def provider_path():
+        with app.app_context():
+            return fast_provider.response(RowSet(PRODUCT_COLUMNS, rows)).get_data()
+
+    def stdlib_fallback_path():
+        # Same provider with encode_json forced onto the stdlib branch.
+        body = json.dumps(RowSet(PRODUCT_COLUMNS, rows), default=json_default, separators=(",", ":"), ensure_ascii=False)
+        return body.encode("utf-8") + b"\n"
+
+    def row_dicts_only():
+        return RowSet(PRODUCT_COLUMNS, rows).to_list()
+
+    def row_tuples_path():
+        return rows_module.orjson.dumps(rows, default=json_default)
+
+    results = [("map_rows + Flask default jsonify", best_of(args.repeat, previous_path))]
+    if rows_module.orjson is not None:
+        results.append(("RowSet + ERPJSONProvider (orjson)", best_of(args.repeat, provider_path)))
+        results.append(("  of which RowSet.to_list() per-row dicts", best_of(args.repeat, row_dicts_only)))
+        results.append(("  row tuples as arrays (orjson, no keys)", best_of(args.repeat, row_tuples_path)))
+    results.append(("RowSet + ERPJSONProvider (stdlib fallback)", best_of(args.repeat, stdlib_fallback_path)))
+
+    baseline = results[0][1][0]
+    print(f"{args.rows} rows, best of {args.repeat}")
+    for label, (seconds, size) in results:
+        # The to_list() line counts rows, not bytes.
+        size_text = f"{size / 1e6:6.1f} MB" if size > args.rows else f"{size:>6} rows"
+        print(f"  {label:<45} {seconds * 1000:9.1f} ms  {size_text}  x{baseline / seconds:5.1f}")
+
+
+if __name__ == "__main__":
+    main()
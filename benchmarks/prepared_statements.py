@@ -0,0 +1,89 @@
+"""Micro-benchmark: per-call cost of the hot queries, plain versus prepared.
+
+Runs each registered hot query (src/db/prepared.py) against the database
+in DATABASE_URL, first as plain SQL, which PostgreSQL parses and plans on
+every call, then as EXECUTE of a statement prepared once on the
+connection. Both sides use the pool's connection and cursor classes and
+end each call with a rollback, as a pooled checkout does, so the
+difference is the parse/plan work saved per call.
+
+Parameters are sampled from existing rows, so load data first, e.g.:
+
+    python -m benchmarks.generate_dataset --products 20000 --sales-lines 100000 --truncate
+    python -m benchmarks.prepared_statements --iterations 2000 --repeat 3
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+import psycopg2
+
+from src.db.instrumentation import InstrumentedCursor
+from src.db.prepared import PreparingConnection
+from src.core_modules.product_management.product_service import PRODUCT_BY_SKU_SQL, PRODUCTS_BY_SKUS_SQL as MULTI_GET_SQL
+from src.core_modules.sales_management.sales_service import PRODUCTS_BY_SKUS_SQL, SALE_DETAILS_SQL
+
+
+def sample(conn, sql, size):
+    with conn.cursor() as cur:
+        cur.execute(sql, (size,))
+        values = [row[0] for row in cur.fetchall()]
+    conn.rollback()
+    return values
+
+
+def best_of(repeat, conn, query, params_list):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for params in params_list:
+            with conn.cursor() as cur:
+                cur.execute(query, params)
+                cur.fetchall()
+            conn.rollback()
+        timings.append((time.perf_counter() - start) / len(params_list))
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"), help="Target database (default DATABASE_URL)")
+    parser.add_argument("--iterations", type=int, default=2000, help="Calls per query and repeat")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--order-skus", type=int, default=5, help="SKUs per sale_products_by_skus lookup")
+    parser.add_argument("--multi-get-skus", type=int, default=50, help="SKUs per products_by_skus lookup")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error("Set DATABASE_URL or pass --dsn.")
+
+    conn = psycopg2.connect(args.dsn, connection_factory=PreparingConnection, cursor_factory=InstrumentedCursor)
+    skus = sample(conn, "SELECT sku FROM products ORDER BY random() LIMIT %s;", 1000)
+    order_ids = sample(conn, "SELECT order_id FROM sales_orders ORDER BY random() LIMIT %s;", 1000)
+    if not skus or not order_ids:
+        sys.exit("No products or sales orders found; load data with benchmarks.generate_dataset first.")
+
+    rng = random.Random(args.seed)
+    queries = [
+        (PRODUCT_BY_SKU_SQL, [(rng.choice(skus),) for _ in range(args.iterations)]),
+        (MULTI_GET_SQL, [(rng.sample(skus, min(args.multi_get_skus, len(skus))),) for _ in range(args.iterations)]),
+        (PRODUCTS_BY_SKUS_SQL, [(rng.sample(skus, min(args.order_skus, len(skus))),) for _ in range(args.iterations)]),
+        (SALE_DETAILS_SQL, [(ids, ids) for ids in ([rng.choice(order_ids)] for _ in range(args.iterations))]),
+    ]
+
+    print(f"{args.iterations} calls per query, best of {args.repeat} (microseconds per call)")
+    print(f"  {'query':<26} {'plain':>9} {'prepared':>9} {'saved':>9}")
+    for query, params_list in queries:
+        # str(query) drops the HotQuery type, so the cursor runs it as ordinary SQL.
+        plain = best_of(args.repeat, conn, str(query), params_list)
+        prepared = best_of(args.repeat, conn, query, params_list)
+        saved = plain - prepared
+        print(f"  {query.name:<26} {plain * 1e6:9.1f} {prepared * 1e6:9.1f} {saved * 1e6:9.1f}  ({saved / plain * 100:4.1f}%)")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
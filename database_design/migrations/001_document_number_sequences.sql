@@ -0,0 +1,9 @@
+-- Sequences backing sales order and purchase order numbers (see src/db/numbering.py).
+-- They replace the SELECT MAX(id) lookups previously run on every insert.
+
+CREATE SEQUENCE IF NOT EXISTS sales_order_number_seq;
+CREATE SEQUENCE IF NOT EXISTS purchase_order_number_seq;
+
+-- Continue after the ids already used in existing order numbers.
+SELECT setval('sales_order_number_seq', COALESCE((SELECT MAX(order_id) FROM sales_orders), 0) + 1, false);
+SELECT setval('purchase_order_number_seq', COALESCE((SELECT MAX(po_id) FROM purchase_orders), 0) + 1, false);
@@ -0,0 +1,6 @@
+-- Composite indexes matching the keyset pagination sort keys of the list endpoints,
+-- so every page of GET /api/products, /api/sales and /api/purchases is an index range scan.
+
+CREATE INDEX IF NOT EXISTS idx_products_name_id ON products (product_name, product_id);
+CREATE INDEX IF NOT EXISTS idx_sales_orders_date_id ON sales_orders (order_date DESC, order_id DESC);
+CREATE INDEX IF NOT EXISTS idx_purchase_orders_date_id ON purchase_orders (order_date DESC, po_id DESC);
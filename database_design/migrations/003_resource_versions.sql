@@ -0,0 +1,11 @@
+-- Per-resource change counters behind the ETag / Last-Modified headers (see src/db/versions.py).
+-- The services bump a resource after every committed write that changes what its GET endpoints return.
+
+CREATE TABLE IF NOT EXISTS resource_versions (
+    resource_name VARCHAR(50) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO resource_versions (resource_name) VALUES ('products'), ('sales'), ('purchases')
+ON CONFLICT (resource_name) DO NOTHING;
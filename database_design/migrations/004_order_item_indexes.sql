@@ -0,0 +1,6 @@
+-- Indexes on the order line foreign keys. PostgreSQL does not index the referencing
+-- side of a foreign key, so without them every order detail read, single or batched
+-- (GET /api/sales?ids=..., /api/purchases?ids=...), scans the whole line table.
+
+CREATE INDEX IF NOT EXISTS idx_sales_order_items_order_id ON sales_order_items (order_id);
+CREATE INDEX IF NOT EXISTS idx_purchase_order_items_po_id ON purchase_order_items (po_id);
@@ -0,0 +1,12 @@
+-- Splits each resource_versions counter over 16 rows (shard 0-15) so concurrent writers do not
+-- serialise on one row. A bump increments one random shard; readers sum the shards (see src/db/versions.py).
+
+ALTER TABLE resource_versions ADD COLUMN IF NOT EXISTS shard SMALLINT NOT NULL DEFAULT 0;
+
+ALTER TABLE resource_versions DROP CONSTRAINT IF EXISTS resource_versions_pkey;
+ALTER TABLE resource_versions ADD PRIMARY KEY (resource_name, shard);
+
+INSERT INTO resource_versions (resource_name, shard, version)
+SELECT name, shard, 0
+FROM unnest(ARRAY['products', 'sales', 'purchases']) AS name, generate_series(0, 15) AS shard
+ON CONFLICT (resource_name, shard) DO NOTHING;
@@ -0,0 +1,40 @@
+# Gunicorn settings for the ERP backend (gunicorn -c gunicorn.conf.py src.wsgi:app)
+
+import os
+
+bind = f"0.0.0.0:{os.getenv('APP_PORT', 8000)}"
+workers = int(os.getenv("WEB_CONCURRENCY", 2 * (os.cpu_count() or 1) + 1))
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+# Import the app once in the master and fork workers from it: workers start in
+# milliseconds instead of each re-importing the application.
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 60))
+# Longer than SHUTDOWN_READINESS_DELAY + SHUTDOWN_DRAIN_TIMEOUT, so draining finishes before gunicorn kills the worker.
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 35))
+keepalive = 5
+accesslog = None # The app writes its own structured access log
+
+
+def on_starting(server):
+    # Runs once in the master: clears the previous run's per-worker metrics files.
+    from src.observability.multiprocess import prepare_directory
+    prepare_directory()
+
+
+def post_worker_init(worker):
+    # Runs in each worker after the fork, once the app is loaded and before it accepts requests.
+    from src.web.lifecycle import init_worker, install_drain_signal
+    init_worker()
+    install_drain_signal()
+
+
+def worker_exit(server, worker):
+    from src.web.lifecycle import shutdown_worker
+    shutdown_worker()
+
+
+def child_exit(server, worker):
+    # Runs in the master for every exited worker, killed ones included: keeps its
+    # counters in the METRICS_MULTIPROC_DIR archive and drops its live files.
+    from src.observability.multiprocess import mark_process_dead
+    mark_process_dead(worker.pid)
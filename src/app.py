@@ -1,6 +1,7 @@
 # Main Flask application for ERP Backend APIs
 
-from flask import Flask, jsonify, request
+from flask import Flask, Blueprint, Response, jsonify, request
+import io
 from flask_cors import CORS # Import CORS
 import os
 import sys
@@ -18,33 +19,109 @@ logging.basicConfig(level=logging.INFO,
                     ])
 logger = logging.getLogger(__name__)
 
+from src.observability.access_log import start_async_logging, init_access_log
+from src.observability.metrics import init_metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from src.observability import multiprocess
+from src.observability.slow_queries import slow_query_log
+from src.observability.tracing import init_tracing
+
 from src.core_modules.product_management.product_service import ProductService
 from src.core_modules.sales_management.sales_service import SalesService
 from src.core_modules.purchase_management.purchase_service import PurchaseService
 from src.core_modules.reporting_module.reporting_service import generate_sales_report, generate_inventory_report, generate_purchase_report
 from src.core_modules.accounting_module.accounting_service import AccountingService
-
-app = Flask(__name__)
-CORS(app, resources={r"/api/*": {"origins": ["http://localhost:3002", "http://192.168.2.104:3002"]}})
-
-# Initialize services
+from src.db.pagination import parse_limit
+from src.db.streaming import STREAM_FORMATS, encode_stream
+from src.core_modules.product_management.product_import import IMPORT_FORMATS
+from src.web.conditional import conditional, content_etag
+from src.web.json_provider import ERPJSONProvider
+from src.web.lifecycle import init_lifecycle, init_worker
+from src.web.admission import admission, init_admission
+from src.web.deadlines import init_deadlines
+from src.web.stickiness import init_stickiness
+
+# Initialize services (no database connections are opened until a worker uses them)
 product_service = ProductService()
 sales_service = SalesService()
 purchase_service = PurchaseService()
 accounting_service = AccountingService()
 
-logger.info("ERP Backend Application Initialized")
-
-@app.before_request
-def log_request_info():
-    logger.info(f"Request: {request.method} {request.url} - Headers: {request.headers} - Body: {request.get_data(as_text=True)}")
-
-@app.after_request
-def log_response_info(response):
-    logger.info(f"Response: {response.status} - Body: {response.get_data(as_text=True)}")
-    return response
+SALES_BATCH_MAX_ORDERS = int(os.getenv("SALES_BATCH_MAX_ORDERS", 1000))
+BATCH_READ_MAX_KEYS = int(os.getenv("BATCH_READ_MAX_KEYS", 200))
+PRODUCT_IMPORT_MAX_ROWS = int(os.getenv("PRODUCT_IMPORT_MAX_ROWS", 50000))
+
+# Latency budgets in milliseconds by endpoint (see src/web/deadlines.py). Endpoints not
+# listed get REQUEST_BUDGET_MS; None turns the deadline off.
+REPORT_BUDGET_MS = int(os.getenv("REPORT_BUDGET_MS", 30000))
+BULK_WRITE_BUDGET_MS = int(os.getenv("BULK_WRITE_BUDGET_MS", 60000))
+REQUEST_BUDGETS_MS = {
+    "api.get_sales_report_api": REPORT_BUDGET_MS,
+    "api.get_inventory_report_api": REPORT_BUDGET_MS,
+    "api.get_purchase_report_api": REPORT_BUDGET_MS,
+    "api.get_trial_balance_api": REPORT_BUDGET_MS,
+    "api.get_income_statement_api": REPORT_BUDGET_MS,
+    "api.get_balance_sheet_api": REPORT_BUDGET_MS,
+    "api.record_sales_batch_api": BULK_WRITE_BUDGET_MS,
+    "api.import_products_api": BULK_WRITE_BUDGET_MS,
+    "api.metrics_api": None,
+}
+
+api = Blueprint("api", __name__)
+
+
+def create_app():
+    """Builds the Flask application.
+
+    Opens no database connections, so it can run in a pre-forking server's
+    master before the workers are forked (see src/wsgi.py). Each worker opens
+    its own pool in init_worker().
+    """
+    start_async_logging()
+    app = Flask(__name__)
+    app.json = ERPJSONProvider(app)
+    CORS(app, resources={r"/api/*": {"origins": ["http://localhost:3002", "http://192.168.2.104:3002"]}})
+    init_lifecycle(app, warm_ups=(product_service.warm_up,))
+    init_admission(app)
+    init_deadlines(app, REQUEST_BUDGETS_MS)
+    init_stickiness(app)
+    init_access_log(app)
+    init_metrics(app)
+    init_tracing(app)
+    app.register_blueprint(api)
+    logger.info(f"ERP Backend Application Initialized (JSON backend: {ERPJSONProvider.backend})")
+    return app
+
+def _is_paginated_request():
+    # Without limit/after the list endpoints keep returning the full JSON array.
+    return "limit" in request.args or "after" in request.args
+
+def _stream_format():
+    stream_format = request.args.get("stream")
+    if stream_format is not None and stream_format not in STREAM_FORMATS:
+        raise ValueError(f"Unsupported stream format: {stream_format}. Use one of: {', '.join(STREAM_FORMATS)}")
+    return stream_format
+
+def _stream_response(records, stream_format):
+    # Rows are fetched, encoded and flushed chunk by chunk while the response is sent.
+    return Response(encode_stream(records, stream_format), mimetype=STREAM_FORMATS[stream_format])
+
+def _itersize_arg():
+    itersize = request.args.get("itersize")
+    return int(itersize) if itersize else None
+
+def _keys_arg(name, convert=str):
+    # Comma-separated keys of a batch read, e.g. ?ids=3,5,8
+    keys = [key.strip() for key in request.args.get(name, "").split(",") if key.strip()]
+    if not keys:
+        raise ValueError(f"{name} must list at least one value")
+    if len(keys) > BATCH_READ_MAX_KEYS:
+        raise ValueError(f"{name} may list at most {BATCH_READ_MAX_KEYS} values")
+    try:
+        return [convert(key) for key in keys]
+    except ValueError:
+        raise ValueError(f"Invalid {name}: {request.args.get(name)!r}")
 
-@app.route("/")
+@api.route("/")
 def hello():
     db_url = os.getenv("DATABASE_URL", "Not Set")
     redis_host = os.getenv("REDIS_HOST", "Not Set")
@@ -56,17 +133,31 @@ def hello():
                <p>Access API endpoints under /api/...</p>"""
 
 # --- Product Management APIs ---
-@app.route("/api/products", methods=["GET"])
+@api.route("/api/products", methods=["GET"])
+@conditional("products")
 def get_products():
     logger.info("GET /api/products called")
     try:
+        if "skus" in request.args:
+            fields = _keys_arg("fields") if "fields" in request.args else None
+            return jsonify(product_service.get_products_by_skus(_keys_arg("skus"), fields))
+        if "fields" in request.args:
+            raise ValueError("fields is only supported together with skus")
+        stream_format = _stream_format()
+        if stream_format:
+            return _stream_response(product_service.export_products(_itersize_arg()), stream_format)
+        if _is_paginated_request():
+            return jsonify(product_service.list_products(parse_limit(request.args.get("limit")), request.args.get("after")))
         products = product_service.get_all_products()
         return jsonify(products)
+    except ValueError as ve:
+        logger.warning(f"Invalid list parameters for get_products: {ve}")
+        return jsonify({"error": str(ve)}), 400
     except Exception as e:
         logger.error(f"Error in get_products: {str(e)}", exc_info=True)
         return jsonify({"error": "Failed to retrieve products"}), 500
 
-@app.route("/api/products", methods=["POST"])
+@api.route("/api/products", methods=["POST"])
 def add_product_api():
     data = request.get_json()
     logger.info(f"POST /api/products called with data: {data}")
@@ -83,7 +174,30 @@ def add_product_api():
         logger.error(f"Error in add_product_api: {str(e)}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
-@app.route("/api/products/<string:sku>", methods=["GET"])
+@api.route("/api/products/import", methods=["POST"])
+@admission("import")
+def import_products_api():
+    import_format = IMPORT_FORMATS.get(request.mimetype) or request.args.get("format")
+    logger.info(f"POST /api/products/import called with format: {import_format}")
+    if import_format not in ("csv", "ndjson"):
+        logger.warning(f"Product import attempt with unsupported content type: {request.mimetype}")
+        return jsonify({"error": "Send text/csv or application/x-ndjson, or pass ?format=csv|ndjson"}), 400
+    try:
+        # Decoded line by line, but the valid rows are held in memory until the
+        # transaction opens, hence the PRODUCT_IMPORT_MAX_ROWS cap.
+        lines = io.TextIOWrapper(request.stream, encoding=request.mimetype_params.get("charset", "utf-8"), newline="")
+        result = product_service.import_products(lines, import_format, max_rows=PRODUCT_IMPORT_MAX_ROWS)
+        logger.info(f"Product import result: received={result['received']}, inserted={result['inserted']}, updated={result['updated']}, errors={len(result['errors'])}")
+        return jsonify(result)
+    except ValueError as ve:
+        logger.warning(f"Invalid product import file: {ve}")
+        return jsonify({"error": str(ve)}), 400
+    except Exception as e:
+        logger.error(f"Error in import_products_api: {str(e)}", exc_info=True)
+        return jsonify({"error": "Failed to import products"}), 500
+
+@api.route("/api/products/<string:sku>", methods=["GET"])
+@content_etag
 def get_product_by_sku_api(sku):
     logger.info(f"GET /api/products/{sku} called")
     try:
@@ -96,7 +210,7 @@ def get_product_by_sku_api(sku):
         logger.error(f"Error in get_product_by_sku_api for SKU {sku}: {str(e)}", exc_info=True)
         return jsonify({"error": "Failed to retrieve product"}), 500
 
-@app.route("/api/products/<string:sku>", methods=["PUT"])
+@api.route("/api/products/<string:sku>", methods=["PUT"])
 def update_product_api(sku):
     data = request.get_json()
     logger.info(f"PUT /api/products/{sku} called with data: {data}")
@@ -111,7 +225,7 @@ def update_product_api(sku):
         logger.error(f"Error in update_product_api for SKU {sku}: {str(e)}", exc_info=True)
         return jsonify({"error": "Failed to update product"}), 500
 
-@app.route("/api/products/<string:sku>", methods=["DELETE"])
+@api.route("/api/products/<string:sku>", methods=["DELETE"])
 def delete_product_api(sku):
     logger.info(f"DELETE /api/products/{sku} called")
     try:
@@ -125,17 +239,28 @@ def delete_product_api(sku):
         return jsonify({"error": "Failed to delete product"}), 500
 
 # --- Sales Management APIs ---
-@app.route("/api/sales", methods=["GET"])
+@api.route("/api/sales", methods=["GET"])
+@conditional("sales", with_ids=("products",))
 def get_all_sales_api():
     logger.info("GET /api/sales called")
     try:
+        if "ids" in request.args:
+            return jsonify(sales_service.get_sales_by_ids(_keys_arg("ids", int)))
+        stream_format = _stream_format()
+        if stream_format:
+            return _stream_response(sales_service.export_sales(_itersize_arg()), stream_format)
+        if _is_paginated_request():
+            return jsonify(sales_service.list_sales(parse_limit(request.args.get("limit")), request.args.get("after")))
         sales = sales_service.get_all_sales()
         return jsonify(sales)
+    except ValueError as ve:
+        logger.warning(f"Invalid list parameters for get_all_sales_api: {ve}")
+        return jsonify({"error": str(ve)}), 400
     except Exception as e:
         logger.error(f"Error in get_all_sales_api: {str(e)}", exc_info=True)
         return jsonify({"error": "Failed to retrieve sales orders"}), 500
 
-@app.route("/api/sales", methods=["POST"])
+@api.route("/api/sales", methods=["POST"])
 def record_sale_api():
     data = request.get_json()
     logger.info(f"POST /api/sales called with data: {data}")
@@ -153,7 +278,28 @@ def record_sale_api():
         logger.error(f"Error in record_sale_api: {str(e)}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
-@app.route("/api/sales/<string:order_id>", methods=["GET"])
+@api.route("/api/sales/batch", methods=["POST"])
+@admission("batch")
+def record_sales_batch_api():
+    data = request.get_json()
+    orders = data.get("orders") if isinstance(data, dict) else data
+    logger.info(f"POST /api/sales/batch called with {len(orders) if isinstance(orders, list) else 0} orders")
+    if not isinstance(orders, list) or not orders:
+        logger.warning("Record sales batch attempt without a list of orders")
+        return jsonify({"error": "Send a non-empty list of orders, or {\"orders\": [...]}"}), 400
+    if len(orders) > SALES_BATCH_MAX_ORDERS:
+        logger.warning(f"Record sales batch attempt with {len(orders)} orders exceeds limit {SALES_BATCH_MAX_ORDERS}")
+        return jsonify({"error": f"A batch may contain at most {SALES_BATCH_MAX_ORDERS} orders"}), 400
+    try:
+        result = sales_service.record_sales_batch(orders)
+        logger.info(f"Sales batch recorded: created={result['created']}, rejected={result['rejected']}")
+        return jsonify(result)
+    except Exception as e:
+        logger.error(f"Error in record_sales_batch_api: {str(e)}", exc_info=True)
+        return jsonify({"error": "Failed to record sales batch"}), 500
+
+@api.route("/api/sales/<string:order_id>", methods=["GET"])
+@conditional("sales", "products")
 def get_sale_by_id_api(order_id):
     logger.info(f"GET /api/sales/{order_id} called")
     try:
@@ -166,7 +312,7 @@ def get_sale_by_id_api(order_id):
         logger.error(f"Error in get_sale_by_id_api for ID {order_id}: {str(e)}", exc_info=True)
         return jsonify({"error": "Failed to retrieve sale"}), 500
 
-@app.route("/api/sales/<string:order_id>/status", methods=["PUT"])
+@api.route("/api/sales/<string:order_id>/status", methods=["PUT"])
 def update_sale_status_api(order_id):
     data = request.get_json()
     logger.info(f"PUT /api/sales/{order_id}/status called with data: {data}")
@@ -185,17 +331,28 @@ def update_sale_status_api(order_id):
         return jsonify({"error": "Failed to update sale status"}), 500
 
 # --- Purchase Management APIs ---
-@app.route("/api/purchases", methods=["GET"])
+@api.route("/api/purchases", methods=["GET"])
+@conditional("purchases", with_ids=("products",))
 def get_all_purchases_api():
     logger.info("GET /api/purchases called")
     try:
+        if "ids" in request.args:
+            return jsonify(purchase_service.get_purchases_by_ids(_keys_arg("ids", int)))
+        stream_format = _stream_format()
+        if stream_format:
+            return _stream_response(purchase_service.export_purchases(_itersize_arg()), stream_format)
+        if _is_paginated_request():
+            return jsonify(purchase_service.list_purchases(parse_limit(request.args.get("limit")), request.args.get("after")))
         purchases = purchase_service.get_all_purchases()
         return jsonify(purchases)
+    except ValueError as ve:
+        logger.warning(f"Invalid list parameters for get_all_purchases_api: {ve}")
+        return jsonify({"error": str(ve)}), 400
     except Exception as e:
         logger.error(f"Error in get_all_purchases_api: {str(e)}", exc_info=True)
         return jsonify({"error": "Failed to retrieve purchase orders"}), 500
 
-@app.route("/api/purchases", methods=["POST"])
+@api.route("/api/purchases", methods=["POST"])
 def record_purchase_api():
     data = request.get_json()
     logger.info(f"POST /api/purchases called with data: {data}")
@@ -213,7 +370,8 @@ def record_purchase_api():
         logger.error(f"Error in record_purchase_api: {str(e)}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
-@app.route("/api/purchases/<string:purchase_id>", methods=["GET"])
+@api.route("/api/purchases/<string:purchase_id>", methods=["GET"])
+@conditional("purchases", "products")
 def get_purchase_by_id_api(purchase_id):
     logger.info(f"GET /api/purchases/{purchase_id} called")
     try:
@@ -226,7 +384,7 @@ def get_purchase_by_id_api(purchase_id):
         logger.error(f"Error in get_purchase_by_id_api for ID {purchase_id}: {str(e)}", exc_info=True)
         return jsonify({"error": "Failed to retrieve purchase order"}), 500
 
-@app.route("/api/purchases/<string:purchase_id>/status", methods=["PUT"])
+@api.route("/api/purchases/<string:purchase_id>/status", methods=["PUT"])
 def update_purchase_status_api(purchase_id):
     data = request.get_json()
     logger.info(f"PUT /api/purchases/{purchase_id}/status called with data: {data}")
@@ -245,7 +403,8 @@ def update_purchase_status_api(purchase_id):
         return jsonify({"error": "Failed to update purchase order status"}), 500
 
 # --- Reporting/Analytics APIs ---
-@app.route("/api/reports/sales", methods=["GET"])
+@api.route("/api/reports/sales", methods=["GET"])
+@admission("reports")
 def get_sales_report_api():
     start_date = request.args.get("start_date", "2024-01-01")
     end_date = request.args.get("end_date", "2024-12-31")
@@ -258,7 +417,8 @@ def get_sales_report_api():
         logger.error(f"Error in get_sales_report_api: {str(e)}", exc_info=True)
         return jsonify({"error": "Failed to generate sales report"}), 500
 
-@app.route("/api/reports/inventory", methods=["GET"])
+@api.route("/api/reports/inventory", methods=["GET"])
+@admission("reports")
 def get_inventory_report_api():
     as_of_date = request.args.get("as_of_date", "2024-12-31")
     low_stock_threshold_str = request.args.get("low_stock_threshold")
@@ -271,7 +431,8 @@ def get_inventory_report_api():
         logger.error(f"Error in get_inventory_report_api: {str(e)}", exc_info=True)
         return jsonify({"error": "Failed to generate inventory report"}), 500
 
-@app.route("/api/reports/purchases", methods=["GET"])
+@api.route("/api/reports/purchases", methods=["GET"])
+@admission("reports")
 def get_purchase_report_api():
     start_date = request.args.get("start_date", "2024-01-01")
     end_date = request.args.get("end_date", "2024-12-31")
@@ -286,7 +447,7 @@ def get_purchase_report_api():
         return jsonify({"error": "Failed to generate purchase report"}), 500
 
 # --- Accounting APIs ---
-@app.route("/api/accounting/chart-of-accounts", methods=["GET"])
+@api.route("/api/accounting/chart-of-accounts", methods=["GET"])
 def get_chart_of_accounts_api():
     logger.info("GET /api/accounting/chart-of-accounts called")
     try:
@@ -296,7 +457,7 @@ def get_chart_of_accounts_api():
         logger.error(f"Error in get_chart_of_accounts_api: {str(e)}", exc_info=True)
         return jsonify({"error": "Failed to retrieve chart of accounts"}), 500
 
-@app.route("/api/accounting/chart-of-accounts", methods=["POST"])
+@api.route("/api/accounting/chart-of-accounts", methods=["POST"])
 def add_account_api():
     data = request.get_json()
     logger.info(f"POST /api/accounting/chart-of-accounts called with data: {data}")
@@ -314,7 +475,7 @@ def add_account_api():
         logger.error(f"Error in add_account_api: {str(e)}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
-@app.route("/api/accounting/journal-entries", methods=["GET"])
+@api.route("/api/accounting/journal-entries", methods=["GET"])
 def get_journal_entries_api():
     logger.info("GET /api/accounting/journal-entries called")
     try:
@@ -324,7 +485,7 @@ def get_journal_entries_api():
         logger.error(f"Error in get_journal_entries_api: {str(e)}", exc_info=True)
         return jsonify({"error": "Failed to retrieve journal entries"}), 500
 
-@app.route("/api/accounting/journal-entries", methods=["POST"])
+@api.route("/api/accounting/journal-entries", methods=["POST"])
 def create_journal_entry_api():
     data = request.get_json()
     logger.info(f"POST /api/accounting/journal-entries called with data: {data}")
@@ -342,7 +503,7 @@ def create_journal_entry_api():
         logger.error(f"Error in create_journal_entry_api: {str(e)}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
-@app.route("/api/accounting/journal-entries/<string:entry_id>", methods=["GET"])
+@api.route("/api/accounting/journal-entries/<string:entry_id>", methods=["GET"])
 def get_journal_entry_by_id_api(entry_id):
     logger.info(f"GET /api/accounting/journal-entries/{entry_id} called")
     try:
@@ -355,7 +516,7 @@ def get_journal_entry_by_id_api(entry_id):
         logger.error(f"Error in get_journal_entry_by_id_api for ID {entry_id}: {str(e)}", exc_info=True)
         return jsonify({"error": "Failed to retrieve journal entry"}), 500
 
-@app.route("/api/accounting/reports/trial-balance", methods=["GET"])
+@api.route("/api/accounting/reports/trial-balance", methods=["GET"])
 def get_trial_balance_api():
     as_of_date = request.args.get("as_of_date", "2024-12-31") # Example default
     logger.info(f"GET /api/accounting/reports/trial-balance called with as_of_date: {as_of_date}")
@@ -366,7 +527,7 @@ def get_trial_balance_api():
         logger.error(f"Error in get_trial_balance_api: {str(e)}", exc_info=True)
         return jsonify({"error": "Failed to generate trial balance"}), 500
 
-@app.route("/api/accounting/reports/income-statement", methods=["GET"])
+@api.route("/api/accounting/reports/income-statement", methods=["GET"])
 def get_income_statement_api():
     start_date = request.args.get("start_date", "2024-01-01")
     end_date = request.args.get("end_date", "2024-12-31")
@@ -378,7 +539,7 @@ def get_income_statement_api():
         logger.error(f"Error in get_income_statement_api: {str(e)}", exc_info=True)
         return jsonify({"error": "Failed to generate income statement"}), 500
 
-@app.route("/api/accounting/reports/balance-sheet", methods=["GET"])
+@api.route("/api/accounting/reports/balance-sheet", methods=["GET"])
 def get_balance_sheet_api():
     as_of_date = request.args.get("as_of_date", "2024-12-31")
     logger.info(f"GET /api/accounting/reports/balance-sheet called with as_of_date: {as_of_date}")
@@ -389,7 +550,46 @@ def get_balance_sheet_api():
         logger.error(f"Error in get_balance_sheet_api: {str(e)}", exc_info=True)
         return jsonify({"error": "Failed to generate balance sheet"}), 500
 
+# --- Operations APIs ---
+# With METRICS_MULTIPROC_DIR set these report every worker, not just the one that answers
+# (see src/observability/multiprocess.py).
+@api.route("/metrics", methods=["GET"])
+def metrics_api():
+    return Response(multiprocess.render_metrics(), mimetype=None, content_type=METRICS_CONTENT_TYPE)
+
+@api.route("/api/admin/cache-stats", methods=["GET"])
+def get_cache_stats_api():
+    logger.info("GET /api/admin/cache-stats called")
+    return jsonify(multiprocess.cache_stats())
+
+@api.route("/api/admin/slow-queries", methods=["GET"])
+def get_slow_queries_api():
+    logger.info("GET /api/admin/slow-queries called")
+    recorded, entries = multiprocess.slow_queries(request.args.get("limit", type=int))
+    return jsonify({
+        "threshold_ms": slow_query_log.threshold * 1000 if slow_query_log.threshold is not None else None,
+        "recorded": recorded,
+        "entries": entries,
+    })
+
+@api.route("/api/admin/traces", methods=["GET"])
+def get_traces_api():
+    logger.info("GET /api/admin/traces called")
+    recorded, traces = multiprocess.recent_traces(request.args.get("limit", type=int))
+    return jsonify({"recorded": recorded, "traces": traces})
+
+@api.route("/api/admin/traces/<trace_id>", methods=["GET"])
+def get_trace_api(trace_id):
+    logger.info(f"GET /api/admin/traces/{trace_id} called")
+    trace = multiprocess.find_trace(trace_id)
+    if trace is None:
+        return jsonify({"error": "Trace not found"}), 404
+    return jsonify(trace)
+
 if __name__ == "__main__":
+    # Development server; production runs src/wsgi.py under gunicorn (see gunicorn.conf.py).
+    app = create_app()
+    init_worker()
     port = int(os.getenv("APP_PORT", 8000))
     debug_mode = os.getenv("DEBUG", "False").lower() == "true"
     # Set Flask app logger level based on debug_mode, if not already set by basicConfig
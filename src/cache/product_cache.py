@@ -0,0 +1,192 @@
+# Read-through product cache keyed by SKU (in-process LRU tier + optional Redis tier)
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+from src.observability.metrics import register_cache
+
+try:
+    import redis
+    from redis.exceptions import WatchError
+except ImportError: # Redis tier is optional
+    redis = None
+    WatchError = None
+
+# Configure logger for this module
+logger = logging.getLogger(__name__)
+
+
+class ProductCache:
+    """Caches product dicts by SKU in front of ProductService.get_product_by_sku.
+
+    Lookups try the in-process LRU first, then Redis (when configured), then the
+    loader. Local entries expire after local_ttl seconds, which bounds how long
+    another worker can serve a product after it changed; Redis entries are
+    deleted on invalidation, so every worker sees the change on its next local
+    miss. Redis errors are logged and treated as misses.
+
+    A load can race a write in another process: the loader reads the old row,
+    the write commits and invalidates, then the load finishes. Each SKU has a
+    version key in Redis that invalidation increments; a loaded row is only
+    written to Redis (WATCH/MULTI) while that version is still the one read
+    before the load, so a stale row is never put back for redis_ttl seconds.
+    """
+
+    def __init__(self, max_entries=10000, local_ttl=5.0, redis_client=None, redis_ttl=300, key_prefix="erp:product:"):
+        self.max_entries = max_entries
+        self.local_ttl = local_ttl
+        self.redis_client = redis_client
+        self.redis_ttl = redis_ttl
+        self.key_prefix = key_prefix
+        self.version_prefix = key_prefix + "version:"
+        self._entries = OrderedDict() # sku -> (expires_at, product)
+        self._lock = threading.Lock()
+        self._generation = 0 # Bumped on every invalidation; guards against caching stale loads
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls):
+        redis_client = None
+        redis_host = os.getenv("REDIS_HOST")
+        if redis_host and os.getenv("PRODUCT_CACHE_REDIS", "true").lower() == "true":
+            if redis is None:
+                logger.warning("REDIS_HOST is set but the redis package is not installed; product cache runs in-process only.")
+            else:
+                redis_client = redis.Redis(host=redis_host, port=int(os.getenv("REDIS_PORT", 6379)),
+                                           socket_timeout=0.1, socket_connect_timeout=0.1)
+        return cls(
+            max_entries=int(os.getenv("PRODUCT_CACHE_MAX_ENTRIES", 10000)),
+            local_ttl=float(os.getenv("PRODUCT_CACHE_LOCAL_TTL", 5)),
+            redis_client=redis_client,
+            redis_ttl=int(os.getenv("PRODUCT_CACHE_REDIS_TTL", 300)),
+        )
+
+    def _get_local(self, sku):
+        with self._lock:
+            entry = self._entries.get(sku)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[sku]
+                return None
+            self._entries.move_to_end(sku)
+            self.local_hits += 1
+            return entry[1]
+
+    def _store_local(self, sku, product, generation):
+        with self._lock:
+            if generation != self._generation:
+                return # Invalidated while loading; the loaded copy may be stale
+            self._entries[sku] = (time.monotonic() + self.local_ttl, product)
+            self._entries.move_to_end(sku)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _get_redis(self, sku):
+        """Returns (product or None, version); version is the SKU's invalidation
+        counter as read before any load, or None when Redis is not usable."""
+        if self.redis_client is None:
+            return None, None
+        try:
+            payload, version = self.redis_client.mget(self.key_prefix + sku, self.version_prefix + sku)
+        except Exception as e:
+            logger.warning(f"Product cache Redis read failed for SKU {sku}: {e}")
+            return None, None
+        if payload is None:
+            return None, int(version or 0)
+        with self._lock:
+            self.redis_hits += 1
+        return json.loads(payload), None
+
+    def _store_redis(self, sku, product, version):
+        # Written only while the SKU's version is unchanged since before the load.
+        version_key = self.version_prefix + sku
+        try:
+            with self.redis_client.pipeline() as pipe:
+                pipe.watch(version_key)
+                if int(pipe.get(version_key) or 0) != version:
+                    logger.debug(f"Product cache skipped Redis write for SKU {sku}: invalidated during load.")
+                    return
+                pipe.multi()
+                pipe.set(self.key_prefix + sku, json.dumps(product), ex=self.redis_ttl)
+                pipe.execute()
+        except WatchError:
+            logger.debug(f"Product cache skipped Redis write for SKU {sku}: invalidated during load.")
+        except Exception as e:
+            logger.warning(f"Product cache Redis write failed for SKU {sku}: {e}")
+
+    def get(self, sku, loader):
+        """Returns the product for sku, calling loader(sku) on a miss in every tier.
+
+        Products that do not exist (loader returns None) are not cached.
+        """
+        product = self._get_local(sku)
+        if product is not None:
+            return product
+        with self._lock:
+            generation = self._generation
+        product, version = self._get_redis(sku)
+        if product is None:
+            with self._lock:
+                self.misses += 1
+            product = loader(sku)
+            if product is None:
+                return None
+            with self._lock:
+                current = generation == self._generation
+            if version is not None and current:
+                self._store_redis(sku, product, version)
+        self._store_local(sku, product, generation)
+        return product
+
+    def invalidate(self, skus):
+        """Drops the given SKUs from both tiers after a write."""
+        skus = [sku for sku in set(skus) if sku]
+        if not skus:
+            return
+        with self._lock:
+            self._generation += 1
+            for sku in skus:
+                self._entries.pop(sku, None)
+        if self.redis_client is not None:
+            try:
+                with self.redis_client.pipeline() as pipe:
+                    for sku in skus:
+                        # Bumping the version fails any load of this SKU still in flight (see _store_redis).
+                        pipe.incr(self.version_prefix + sku)
+                        pipe.expire(self.version_prefix + sku, self.redis_ttl * 2)
+                    pipe.delete(*[self.key_prefix + sku for sku in skus])
+                    pipe.execute()
+            except Exception as e:
+                logger.warning(f"Product cache Redis invalidation failed for {len(skus)} SKUs: {e}")
+        logger.debug(f"Product cache invalidated {len(skus)} SKUs.")
+
+    def clear(self):
+        """Drops every local entry (Redis entries expire on their own TTL)."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.local_hits + self.redis_hits + self.misses
+            return {
+                "local_hits": self.local_hits,
+                "redis_hits": self.redis_hits,
+                "misses": self.misses,
+                "hit_ratio": round((self.local_hits + self.redis_hits) / lookups, 4) if lookups else None,
+                "local_entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "redis_enabled": self.redis_client is not None,
+            }
+
+
+# Shared by the product, sales and purchase services so every write path can invalidate.
+product_cache = ProductCache.from_env()
+register_cache("products", product_cache.stats)
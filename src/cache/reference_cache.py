@@ -0,0 +1,87 @@
+# In-process cache for small reference/lookup tables (categories, ...)
+
+import os
+import logging
+import threading
+from collections import OrderedDict
+
+from src.observability.metrics import register_cache
+
+# Configure logger for this module
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = int(os.getenv("REFERENCE_CACHE_MAX_ENTRIES", 10000))
+
+
+class ReferenceCache:
+    """Bounded, thread-safe LRU map from a natural key (e.g. a name) to its id.
+
+    The cache is warmed in bulk with warm() and filled on misses through the
+    loader passed to get(); the loader runs outside the lock so one slow miss
+    does not block hits for other keys. Least recently used entries are evicted
+    once max_entries is reached.
+    """
+
+    def __init__(self, name, max_entries=None):
+        self.name = name
+        self.max_entries = max_entries or DEFAULT_MAX_ENTRIES
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        register_cache(name, self.stats)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _store(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def warm(self, items):
+        """Loads (key, value) pairs, e.g. straight from a SELECT over the table."""
+        with self._lock:
+            for key, value in items:
+                self._store(key, value)
+            size = len(self._entries)
+        logger.info(f"Reference cache '{self.name}' warmed with {size} entries.")
+
+    def get(self, key, loader=None):
+        """Returns the cached value for key, calling loader(key) on a miss.
+
+        Returns None on a miss without a loader, or when the loader returns None.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        if loader is None:
+            return None
+        value = loader(key)
+        if value is not None:
+            with self._lock:
+                self._store(key, value)
+        return value
+
+    def invalidate(self, key=None):
+        """Drops one key, or every entry when key is None."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+            }
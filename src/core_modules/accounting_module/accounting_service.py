@@ -54,8 +54,8 @@ class AccountingService:
         
         for entry_line in entries:
             if not any(acc["account_id"] == entry_line.get("account_id") for acc in self.chart_of_accounts):
-                logger.warning(f"AccountingService: Invalid account ID {entry_line.get("account_id")} in journal entry.")
-                return {"error": f"Invalid account ID {entry_line.get("account_id")} in journal entry."}
+                logger.warning(f"AccountingService: Invalid account ID {entry_line.get('account_id')} in journal entry.")
+                return {"error": f"Invalid account ID {entry_line.get('account_id')} in journal entry."}
 
         new_journal_entry = {
             "journal_entry_id": self._generate_journal_entry_id(),
@@ -66,7 +66,7 @@ class AccountingService:
             "total_credits": total_credits
         }
         self.journal_entries.append(new_journal_entry)
-        logger.info(f"AccountingService: Journal entry {new_journal_entry["journal_entry_id"]} created successfully.")
+        logger.info(f"AccountingService: Journal entry {new_journal_entry['journal_entry_id']} created successfully.")
         return new_journal_entry
 
     def get_all_journal_entries(self):
@@ -0,0 +1,121 @@
+# Product catalog import - parsing and validation of CSV / NDJSON catalog files
+
+import csv
+import json
+import logging
+from decimal import Decimal, InvalidOperation
+
+# Configure logger for this module
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+}
+
+# Field names follow the POST /api/products payload.
+IMPORT_FIELDS = (
+    "sku", "name", "category", "description", "unit_price", "average_cost",
+    "last_purchase_price", "quantity", "inventory_level_status", "reorder_point"
+)
+REQUIRED_FIELDS = ("sku", "name", "category")
+MONEY_FIELDS = ("unit_price", "average_cost", "last_purchase_price")
+INTEGER_FIELDS = ("quantity", "reorder_point")
+INVENTORY_STATUSES = ("In Stock", "Low Stock", "Out of Stock")
+
+MAX_TEXT_LENGTH = 255
+MAX_MONEY = Decimal("99999999.99") # DECIMAL(10, 2)
+MAX_INTEGER = 2**31 - 1
+
+
+def parse_records(lines, import_format):
+    """Yields (row_number, record, error) for every data row of the input.
+
+    row_number is 1-based and excludes the CSV header; exactly one of record
+    and error is set.
+    """
+    if import_format == "csv":
+        reader = csv.DictReader(lines)
+        missing = [field for field in REQUIRED_FIELDS if field not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"CSV header is missing required columns: {', '.join(missing)}")
+        for row_number, record in enumerate(reader, start=1):
+            yield row_number, record, None
+    elif import_format == "ndjson":
+        row_number = 0
+        for line in lines:
+            if not line.strip():
+                continue
+            row_number += 1
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield row_number, None, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield row_number, None, "Each NDJSON line must be a JSON object"
+                continue
+            yield row_number, record, None
+    else:
+        raise ValueError(f"Unsupported import format: {import_format!r}")
+
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and value.strip() == "")
+
+
+def normalize_record(record):
+    """Validates one record and returns it with typed values; missing optionals are None.
+
+    Raises ValueError with a message suitable for the per-row error report.
+    """
+    normalized = {}
+    for field in REQUIRED_FIELDS:
+        value = record.get(field)
+        if _blank(value):
+            raise ValueError(f"Missing required field: {field}")
+        value = str(value).strip()
+        if len(value) > MAX_TEXT_LENGTH:
+            raise ValueError(f"{field} is longer than {MAX_TEXT_LENGTH} characters")
+        normalized[field] = value
+
+    description = record.get("description")
+    normalized["description"] = None if _blank(description) else str(description)
+
+    for field in MONEY_FIELDS:
+        value = record.get(field)
+        if _blank(value):
+            normalized[field] = None
+            continue
+        try:
+            amount = Decimal(str(value).strip())
+        except InvalidOperation:
+            raise ValueError(f"{field} is not a number: {value!r}")
+        if not amount.is_finite() or amount < 0 or amount > MAX_MONEY:
+            raise ValueError(f"{field} is out of range: {value!r}")
+        normalized[field] = amount.quantize(Decimal("0.01"))
+
+    for field in INTEGER_FIELDS:
+        value = record.get(field)
+        if _blank(value):
+            normalized[field] = None
+            continue
+        try:
+            number = int(str(value).strip())
+        except ValueError:
+            raise ValueError(f"{field} is not an integer: {value!r}")
+        if number < 0:
+            raise ValueError(f"{field} must not be negative: {value!r}")
+        if number > MAX_INTEGER:
+            raise ValueError(f"{field} is out of range: {value!r}")
+        normalized[field] = number
+
+    status = record.get("inventory_level_status")
+    if _blank(status):
+        normalized["inventory_level_status"] = None
+    elif status not in INVENTORY_STATUSES:
+        raise ValueError(f"inventory_level_status must be one of: {', '.join(INVENTORY_STATUSES)}")
+    else:
+        normalized["inventory_level_status"] = status
+    return normalized
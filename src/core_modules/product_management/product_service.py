@@ -1,83 +1,125 @@
-import psycopg2
-import os
+import io
+import csv
 import logging # Import logging
-from psycopg2 import pool
+from src.db.pool import execute_query, transaction
+from src.db.prepared import hot_query
+from src.db.rows import map_row, RowSet
+from src.db.pagination import decode_cursor, build_page
+from src.db.streaming import stream_rows
+from src.db.replicas import read_only
+from src.db.versions import bump_versions
+from src.observability.tracing import traced
+from src.cache.reference_cache import ReferenceCache
+from src.cache.product_cache import product_cache
+from src.core_modules.product_management.product_import import IMPORT_FIELDS, parse_records, normalize_record
 
 # Configure logger for this module
 logger = logging.getLogger(__name__)
 
-# Initialize a connection pool
-DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    logger.error("DATABASE_URL environment variable is not set.")
-    raise RuntimeError("DATABASE_URL environment variable is not set.")
+PRODUCT_COLUMNS = (
+    "product_id", "sku", "name", "description", "category", "unit_price", "average_cost",
+    "last_purchase_price", "quantity", "inventory_level_status", "reorder_point", "created_at", "updated_at"
+)
 
-try:
-    db_pool = psycopg2.pool.SimpleConnectionPool(1, 10, dsn=DATABASE_URL)
-    logger.info("Database connection pool initialized successfully.")
-except Exception as e:
-    logger.critical(f"Error initializing database connection pool: {e}", exc_info=True)
-    db_pool = None
+PRODUCT_SELECT = """
+    SELECT 
+        p.product_id, p.sku, p.product_name, p.description, 
+        c.category_name, p.unit_price, p.average_cost, p.last_purchase_price,
+        il.available_quantity, il.inventory_level_status, il.reorder_point,
+        p.created_at, p.updated_at
+    FROM products p
+    LEFT JOIN categories c ON p.category_id = c.category_id
+    LEFT JOIN inventory_levels il ON p.product_id = il.product_id
+"""
+
+# Run as prepared statements on each pooled connection (see src/db/prepared.py).
+PRODUCT_BY_SKU_SQL = hot_query("product_by_sku", PRODUCT_SELECT + " WHERE p.sku = %s;")
+PRODUCTS_BY_SKUS_SQL = hot_query("products_by_skus", PRODUCT_SELECT + " WHERE p.sku = ANY(%s);")
+
+# Select-list expression of each PRODUCT_COLUMNS field, and the join each table alias needs,
+# for reads that ask for a subset of the fields.
+PRODUCT_FIELD_SQL = dict(zip(PRODUCT_COLUMNS, (
+    "p.product_id", "p.sku", "p.product_name", "p.description", "c.category_name", "p.unit_price", "p.average_cost",
+    "p.last_purchase_price", "il.available_quantity", "il.inventory_level_status", "il.reorder_point",
+    "p.created_at", "p.updated_at"
+)))
+PRODUCT_JOINS = (
+    ("c.", "LEFT JOIN categories c ON p.category_id = c.category_id"),
+    ("il.", "LEFT JOIN inventory_levels il ON p.product_id = il.product_id"),
+)
+
+IMPORT_STAGE_DDL = """
+    CREATE TEMP TABLE product_import_stage (
+        row_number INTEGER,
+        sku VARCHAR(255),
+        product_name VARCHAR(255),
+        category_name VARCHAR(255),
+        description TEXT,
+        unit_price DECIMAL(10, 2),
+        average_cost DECIMAL(10, 2),
+        last_purchase_price DECIMAL(10, 2),
+        available_quantity INTEGER,
+        inventory_level_status VARCHAR(50),
+        reorder_point INTEGER
+    ) ON COMMIT DROP;
+"""
+
+# Category name -> category_id, shared by every ProductService in the process
+category_cache = ReferenceCache("categories")
 
 class ProductService:
     def __init__(self):
-        if db_pool is None:
-            logger.error("ProductService initialized but database connection pool is not available.")
-            raise ConnectionError("Database connection pool is not available.")
-        logger.info("ProductService Initialized - Database connection pool ready.")
+        # No database work here: the app is built before the server forks its workers.
+        # Each worker opens its own pool and calls warm_up() after the fork.
+        logger.info("ProductService Initialized.")
 
-    def _get_connection(self):
-        if db_pool is None:
-            logger.error("Attempted to get DB connection, but pool is not available.")
-            raise ConnectionError("Database connection pool is not available.")
-        return db_pool.getconn()
-
-    def _put_connection(self, conn):
-        if db_pool is not None:
-            db_pool.putconn(conn)
+    def warm_up(self):
+        """Fills the category cache; run once per worker before it takes traffic."""
+        self._warm_category_cache()
 
     def _execute_query(self, query, params=None, fetch_one=False, fetch_all=False, commit=False):
-        conn = None
-        logger.debug(f"Executing query: {query} with params: {params}")
+        return execute_query(query, params, fetch_one=fetch_one, fetch_all=fetch_all, commit=commit)
+
+    def _warm_category_cache(self):
         try:
-            conn = self._get_connection()
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                if commit:
-                    conn.commit()
-                    logger.info(f"Query committed. {cur.rowcount} rows affected.")
-                    return cur.rowcount
-                if fetch_one:
-                    result = cur.fetchone()
-                    logger.debug(f"Query fetch_one result: {result}")
-                    return result
-                if fetch_all:
-                    results = cur.fetchall()
-                    logger.debug(f"Query fetch_all results count: {len(results) if results else 0}")
-                    return results
+            rows = self._execute_query("SELECT category_name, category_id FROM categories ORDER BY category_id LIMIT %s;",
+                                       (category_cache.max_entries,), fetch_all=True)
+            category_cache.warm(rows or [])
         except Exception as e:
-            logger.error(f"Database query error: {e} for query: {query} with params: {params}", exc_info=True)
-            if conn and not commit: 
-                try:
-                    conn.rollback()
-                    logger.info("Transaction rolled back due to error.")
-                except Exception as rb_e:
-                    logger.error(f"Error during rollback: {rb_e}", exc_info=True)
-            raise 
-        finally:
-            if conn:
-                self._put_connection(conn)
+            # A cold cache only costs round trips; misses are filled on demand.
+            logger.warning(f"Could not warm category cache: {e}")
 
+    @traced
+    def _upsert_category(self, category_name):
+        logger.info(f"Category {category_name} not in cache, resolving with upsert.")
+        row = self._execute_query("""
+            WITH inserted AS (
+                INSERT INTO categories (category_name) VALUES (%s)
+                ON CONFLICT (category_name) DO NOTHING
+                RETURNING category_id
+            )
+            SELECT category_id FROM inserted
+            UNION ALL
+            SELECT category_id FROM categories WHERE category_name = %s
+            LIMIT 1;
+        """, (category_name, category_name), fetch_one=True, commit=True)
+        if not row:
+            # A concurrent insert committed after this statement's snapshot was taken.
+            row = self._execute_query("SELECT category_id FROM categories WHERE category_name = %s;", (category_name,), fetch_one=True)
+        return row[0] if row else None
+
+    def _get_category_id(self, category_name):
+        """Resolves a category name to its id, creating the category if needed.
+
+        Served from category_cache; a miss costs a single upsert round trip.
+        """
+        return category_cache.get(category_name, loader=self._upsert_category)
+
+    @traced
     def add_product(self, sku, name, category_name, inventory_level_status="In Stock", quantity=0, description=None, unit_price=0.0, average_cost=0.0, last_purchase_price=None):
         logger.info(f"Attempting to add product with SKU: {sku}, Name: {name}, Category: {category_name}")
         try:
-            category_id_result = self._execute_query("SELECT category_id FROM categories WHERE category_name = %s", (category_name,), fetch_one=True)
-            if not category_id_result:
-                logger.info(f"Category 	{category_name}	 not found, creating new one.")
-                self._execute_query("INSERT INTO categories (category_name) VALUES (%s) RETURNING category_id", (category_name,), commit=True)
-                category_id_result = self._execute_query("SELECT category_id FROM categories WHERE category_name = %s", (category_name,), fetch_one=True)
-            
-            category_id = category_id_result[0] if category_id_result else None
+            category_id = self._get_category_id(category_name)
             if category_id is None:
                 logger.error(f"Could not find or create category: {category_name} for product SKU: {sku}")
                 raise ValueError(f"Could not find or create category: {category_name}")
@@ -87,170 +129,321 @@ class ProductService:
                 INSERT INTO products (sku, product_name, description, category_id, unit_price, average_cost, last_purchase_price)
                 VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING product_id;
             """
-            product_id_result = self._execute_query(sql_product, 
-                                         (sku, name, description, category_id, unit_price, average_cost, last_purchase_price),
-                                         fetch_one=True, commit=True)
-            
-            if not product_id_result:
-                 logger.error(f"Failed to add product {sku} and get product_id")
-                 raise Exception("Failed to add product and get product_id")
-            product_id = product_id_result[0]
-            logger.info(f"Product {sku} added with product_id: {product_id}")
-
             sql_inventory = """
                 INSERT INTO inventory_levels (product_id, available_quantity, inventory_level_status)
                 VALUES (%s, %s, %s);
             """
-            self._execute_query(sql_inventory, (product_id, quantity, inventory_level_status), commit=True)
-            logger.info(f"Inventory level for product_id {product_id} (SKU: {sku}) set to quantity: {quantity}, status: {inventory_level_status}")
+            with transaction() as cur:
+                cur.execute(sql_product, (sku, name, description, category_id, unit_price, average_cost, last_purchase_price))
+                product_id_result = cur.fetchone()
+                if not product_id_result:
+                     logger.error(f"Failed to add product {sku} and get product_id")
+                     raise Exception("Failed to add product and get product_id")
+                product_id = product_id_result[0]
+                logger.info(f"Product {sku} added with product_id: {product_id}")
+
+                cur.execute(sql_inventory, (product_id, quantity, inventory_level_status))
+                logger.info(f"Inventory level for product_id {product_id} (SKU: {sku}) set to quantity: {quantity}, status: {inventory_level_status}")
+                bump_versions(cur, "products")
             
             return self.get_product_by_sku(sku)
         except Exception as e:
             logger.error(f"Error in add_product for SKU {sku}: {str(e)}", exc_info=True)
             raise
 
+    @traced
+    def import_products(self, lines, import_format, max_rows=None):
+        """Bulk-imports a product catalog from CSV or NDJSON lines in one transaction.
+
+        Valid rows are staged with COPY FROM STDIN, missing categories are created
+        in one set-based pass, then products and inventory_levels are upserted
+        (fields left empty keep their current value on existing SKUs). Invalid
+        rows are reported per row and skipped without aborting the batch; when a
+        SKU appears more than once the last row wins. The input is parsed and
+        validated in memory before the transaction opens, so a slow upload does
+        not hold a connection; max_rows bounds that memory, and more rows raise
+        ValueError.
+        """
+        logger.info(f"Starting product catalog import. Format: {import_format}")
+        errors = []
+        staged = {}
+        received = 0
+        for row_number, record, error in parse_records(lines, import_format):
+            received += 1
+            if max_rows is not None and received > max_rows:
+                raise ValueError(f"An import may contain at most {max_rows} rows; split the file")
+            raw_sku = record.get("sku") if record else None
+            if error is None:
+                try:
+                    record = normalize_record(record)
+                except ValueError as ve:
+                    error = str(ve)
+            if error:
+                errors.append({"row": row_number, "sku": raw_sku, "error": error})
+                continue
+            previous = staged.get(record["sku"])
+            if previous:
+                errors.append({"row": previous[0], "sku": record["sku"], "error": f"Duplicate SKU in batch, superseded by row {row_number}"})
+            staged[record["sku"]] = (row_number, record)
+
+        result = {"received": received, "inserted": 0, "updated": 0, "categories_created": 0, "errors": errors}
+        if not staged:
+            logger.info(f"Product import finished with no valid rows. Errors: {len(errors)}")
+            return result
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row_number, record in staged.values():
+            writer.writerow([row_number] + [record[field] for field in IMPORT_FIELDS])
+        buffer.seek(0)
+
+        try:
+            with transaction() as cur:
+                cur.execute(IMPORT_STAGE_DDL)
+                cur.copy_expert("""
+                    COPY product_import_stage (row_number, sku, product_name, category_name, description, unit_price,
+                                               average_cost, last_purchase_price, available_quantity,
+                                               inventory_level_status, reorder_point)
+                    FROM STDIN WITH (FORMAT csv)
+                """, buffer)
+                cur.execute("ANALYZE product_import_stage;")
+
+                cur.execute("""
+                    INSERT INTO categories (category_name)
+                    SELECT DISTINCT category_name FROM product_import_stage
+                    ON CONFLICT (category_name) DO NOTHING;
+                """)
+                result["categories_created"] = cur.rowcount
+
+                # Insert first, then update everything that was not inserted: a SKU another
+                # transaction creates meanwhile makes the INSERT skip it, and the UPDATE,
+                # run after that transaction commits, then still applies the row.
+                cur.execute("""
+                    INSERT INTO products (sku, product_name, description, category_id, unit_price, average_cost, last_purchase_price)
+                    SELECT s.sku, s.product_name, s.description, c.category_id,
+                           COALESCE(s.unit_price, 0.0), COALESCE(s.average_cost, 0.0), s.last_purchase_price
+                    FROM product_import_stage s
+                    JOIN categories c ON c.category_name = s.category_name
+                    ON CONFLICT (sku) DO NOTHING
+                    RETURNING product_id, sku;
+                """)
+                inserted = dict(cur.fetchall())
+                result["inserted"] = len(inserted)
+
+                cur.execute("""
+                    UPDATE products p
+                    SET product_name = s.product_name,
+                        description = COALESCE(s.description, p.description),
+                        category_id = c.category_id,
+                        unit_price = COALESCE(s.unit_price, p.unit_price),
+                        average_cost = COALESCE(s.average_cost, p.average_cost),
+                        last_purchase_price = COALESCE(s.last_purchase_price, p.last_purchase_price),
+                        updated_at = CURRENT_TIMESTAMP
+                    FROM product_import_stage s
+                    JOIN categories c ON c.category_name = s.category_name
+                    WHERE p.sku = s.sku AND p.product_id <> ALL(%s)
+                    RETURNING p.sku;
+                """, (list(inserted),))
+                written = set(inserted.values()) | {row[0] for row in cur.fetchall()}
+                result["updated"] = len(written) - len(inserted)
+
+                cur.execute("""
+                    INSERT INTO inventory_levels (product_id, available_quantity, inventory_level_status, reorder_point)
+                    SELECT p.product_id, COALESCE(s.available_quantity, 0),
+                           COALESCE(s.inventory_level_status, 'In Stock'), COALESCE(s.reorder_point, 0)
+                    FROM product_import_stage s
+                    JOIN products p ON p.sku = s.sku
+                    ON CONFLICT (product_id) DO NOTHING
+                    RETURNING product_id;
+                """)
+                cur.execute("""
+                    UPDATE inventory_levels il
+                    SET available_quantity = COALESCE(s.available_quantity, il.available_quantity),
+                        inventory_level_status = COALESCE(s.inventory_level_status, il.inventory_level_status),
+                        reorder_point = COALESCE(s.reorder_point, il.reorder_point),
+                        last_updated = CURRENT_TIMESTAMP
+                    FROM product_import_stage s
+                    JOIN products p ON p.sku = s.sku
+                    WHERE il.product_id = p.product_id AND il.product_id <> ALL(%s);
+                """, ([row[0] for row in cur.fetchall()],))
+                # Only a product deleted while the import ran is neither inserted nor updated.
+                for sku in staged.keys() - written:
+                    errors.append({"row": staged[sku][0], "sku": sku, "error": "Not imported: the product or its category was deleted during the import"})
+                bump_versions(cur, "products")
+            product_cache.invalidate(staged.keys())
+            logger.info(f"Product import finished. Received: {received}, inserted: {result['inserted']}, updated: {result['updated']}, categories created: {result['categories_created']}, errors: {len(errors)}")
+            return result
+        except Exception as e:
+            logger.error(f"Error in import_products: {str(e)}", exc_info=True)
+            raise
+
+    @traced
+    @read_only
     def get_all_products(self):
         logger.info("Fetching all products.")
-        sql = """
-            SELECT 
-                p.product_id, p.sku, p.product_name, p.description, 
-                c.category_name, p.unit_price, p.average_cost, p.last_purchase_price,
-                il.available_quantity, il.inventory_level_status, il.reorder_point,
-                p.created_at, p.updated_at
-            FROM products p
-            LEFT JOIN categories c ON p.category_id = c.category_id
-            LEFT JOIN inventory_levels il ON p.product_id = il.product_id
-            ORDER BY p.product_name;
-        """
+        sql = PRODUCT_SELECT + " ORDER BY p.product_name, p.product_id;"
         try:
             rows = self._execute_query(sql, fetch_all=True)
-            products = []
-            if rows:
-                for row in rows:
-                    products.append({
-                        "product_id": row[0],
-                        "sku": row[1],
-                        "name": row[2],
-                        "description": row[3],
-                        "category": row[4],
-                        "unit_price": float(row[5]) if row[5] is not None else None,
-                        "average_cost": float(row[6]) if row[6] is not None else None,
-                        "last_purchase_price": float(row[7]) if row[7] is not None else None,
-                        "quantity": row[8],
-                        "inventory_level_status": row[9],
-                        "reorder_point": row[10],
-                        "created_at": row[11].isoformat() if row[11] else None,
-                        "updated_at": row[12].isoformat() if row[12] else None
-                    })
+            products = RowSet(PRODUCT_COLUMNS, rows)
             logger.info(f"Retrieved {len(products)} products.")
             return products
         except Exception as e:
             logger.error(f"Error in get_all_products: {str(e)}", exc_info=True)
             raise
 
+    @traced
+    @read_only
+    def list_products(self, limit, after=None):
+        """Returns one page of products ordered by (product_name, product_id).
+
+        after is the opaque next_cursor of the previous page; each page is an
+        index range scan on idx_products_name_id.
+        """
+        logger.info(f"Fetching products page. limit: {limit}, after: {after}")
+        params = []
+        where = ""
+        if after:
+            where = " WHERE (p.product_name, p.product_id) > (%s, %s)"
+            params.extend(decode_cursor(after, 2))
+        sql = PRODUCT_SELECT + where + " ORDER BY p.product_name, p.product_id LIMIT %s;"
+        params.append(limit + 1)
+        try:
+            rows = self._execute_query(sql, tuple(params), fetch_all=True)
+            page = build_page(RowSet(PRODUCT_COLUMNS, rows), limit, ("name", "product_id"))
+            logger.info(f"Retrieved {len(page['items'])} products for page.")
+            return page
+        except Exception as e:
+            logger.error(f"Error in list_products: {str(e)}", exc_info=True)
+            raise
+
+    @read_only
+    def export_products(self, itersize=None):
+        """Yields every product as a dict of raw column values through a server-side cursor, in list order."""
+        logger.info(f"Exporting all products. itersize: {itersize}")
+        sql = PRODUCT_SELECT + " ORDER BY p.product_name, p.product_id;"
+        return (dict(zip(PRODUCT_COLUMNS, row)) for row in stream_rows(sql, itersize=itersize))
+
+    @traced
+    @read_only
+    def get_products_by_skus(self, skus, fields=None):
+        """Returns many products with one statement, in the order of skus; unknown SKUs are left out.
+
+        fields limits both the select list and the result to those
+        PRODUCT_COLUMNS (sku is always included), and tables no requested
+        field comes from are not joined. Raises ValueError for an unknown field.
+        """
+        columns = PRODUCT_COLUMNS
+        sql = PRODUCTS_BY_SKUS_SQL
+        if fields:
+            unknown = [field for field in fields if field not in PRODUCT_FIELD_SQL]
+            if unknown:
+                raise ValueError(f"Unknown product field(s): {', '.join(unknown)}. Use: {', '.join(PRODUCT_COLUMNS)}")
+            columns = tuple(column for column in PRODUCT_COLUMNS if column == "sku" or column in fields)
+            expressions = [PRODUCT_FIELD_SQL[column] for column in columns]
+            joins = [join for alias, join in PRODUCT_JOINS if any(expression.startswith(alias) for expression in expressions)]
+            sql = f"SELECT {', '.join(expressions)} FROM products p {' '.join(joins)} WHERE p.sku = ANY(%s);"
+        logger.info(f"Fetching {len(skus)} products by SKU. fields: {fields}")
+        try:
+            rows = self._execute_query(sql, (list(skus),), fetch_all=True)
+            sku_index = columns.index("sku")
+            rows_by_sku = {row[sku_index]: row for row in rows or []}
+            products = RowSet(columns, [rows_by_sku[sku] for sku in skus if sku in rows_by_sku])
+            logger.info(f"Retrieved {len(rows_by_sku)} of {len(skus)} requested products.")
+            return products
+        except Exception as e:
+            logger.error(f"Error in get_products_by_skus: {str(e)}", exc_info=True)
+            raise
+
+    @traced
     def get_product_by_sku(self, sku):
+        """Returns the product for sku, served from product_cache when possible."""
+        product = product_cache.get(sku, loader=self._load_product_by_sku)
+        return dict(product) if product else None # Callers must not mutate the cached copy
+
+    @traced
+    def _load_product_by_sku(self, sku):
         logger.info(f"Fetching product by SKU: {sku}")
-        sql = """
-            SELECT 
-                p.product_id, p.sku, p.product_name, p.description, 
-                c.category_name, p.unit_price, p.average_cost, p.last_purchase_price,
-                il.available_quantity, il.inventory_level_status, il.reorder_point,
-                p.created_at, p.updated_at
-            FROM products p
-            LEFT JOIN categories c ON p.category_id = c.category_id
-            LEFT JOIN inventory_levels il ON p.product_id = il.product_id
-            WHERE p.sku = %s;
-        """
         try:
-            row = self._execute_query(sql, (sku,), fetch_one=True)
+            row = self._execute_query(PRODUCT_BY_SKU_SQL, (sku,), fetch_one=True)
             if row:
                 logger.info(f"Product found for SKU: {sku}")
-                return {
-                    "product_id": row[0],
-                    "sku": row[1],
-                    "name": row[2],
-                    "description": row[3],
-                    "category": row[4],
-                    "unit_price": float(row[5]) if row[5] is not None else None,
-                    "average_cost": float(row[6]) if row[6] is not None else None,
-                    "last_purchase_price": float(row[7]) if row[7] is not None else None,
-                    "quantity": row[8],
-                    "inventory_level_status": row[9],
-                    "reorder_point": row[10],
-                    "created_at": row[11].isoformat() if row[11] else None,
-                    "updated_at": row[12].isoformat() if row[12] else None
-                }
+                return map_row(PRODUCT_COLUMNS, row)
             logger.warning(f"Product not found for SKU: {sku}")
             return None
         except Exception as e:
             logger.error(f"Error in get_product_by_sku for SKU {sku}: {str(e)}", exc_info=True)
             raise
 
+    @traced
     def update_product(self, sku, update_data):
         logger.info(f"Attempting to update product with SKU: {sku}. Data: {update_data}")
         try:
-            product_info = self.get_product_by_sku(sku) # Uses its own logging
-            if not product_info:
-                logger.warning(f"Update failed: Product not found for SKU: {sku}")
-                return None
-            product_id = product_info["product_id"]
-
             product_fields = ["product_name", "description", "unit_price", "average_cost", "last_purchase_price"]
             product_updates = {k: v for k, v in update_data.items() if k in product_fields and v is not None}
             
             if "category" in update_data and update_data["category"] is not None:
                 category_name = update_data["category"]
                 logger.debug(f"Updating category to {category_name} for SKU {sku}")
-                category_id_result = self._execute_query("SELECT category_id FROM categories WHERE category_name = %s", (category_name,), fetch_one=True)
-                if not category_id_result:
-                    logger.info(f"Category {category_name} not found, creating for product update.")
-                    self._execute_query("INSERT INTO categories (category_name) VALUES (%s) RETURNING category_id", (category_name,), commit=True)
-                    category_id_result = self._execute_query("SELECT category_id FROM categories WHERE category_name = %s", (category_name,), fetch_one=True)
-                category_id = category_id_result[0] if category_id_result else None
+                category_id = self._get_category_id(category_name)
                 if category_id:
                     product_updates["category_id"] = category_id
                     logger.debug(f"Category ID for {category_name} is {category_id}")
 
-            if product_updates:
-                set_clauses = ", ".join([f"{key} = %s" for key in product_updates.keys()])
-                params = list(product_updates.values()) + [sku]
-                self._execute_query(f"UPDATE products SET {set_clauses}, updated_at = CURRENT_TIMESTAMP WHERE sku = %s", tuple(params), commit=True)
-                logger.info(f"Product table updated for SKU: {sku}")
-
             inventory_fields = ["available_quantity", "inventory_level_status", "reorder_point"]
             inventory_updates = {k: v for k, v in update_data.items() if k in inventory_fields and v is not None}
             if 'quantity' in update_data and update_data["quantity"] is not None: # Handle frontend sending 'quantity'
                 inventory_updates['available_quantity'] = update_data['quantity']
-            
-            if inventory_updates:
-                set_clauses_inv = ", ".join([f"{key} = %s" for key in inventory_updates.keys()])
-                params_inv = list(inventory_updates.values()) + [product_id]
-                self._execute_query(f"UPDATE inventory_levels SET {set_clauses_inv}, last_updated = CURRENT_TIMESTAMP WHERE product_id = %s", tuple(params_inv), commit=True)
-                logger.info(f"Inventory levels updated for product_id: {product_id} (SKU: {sku})")
-            
+
+            if product_updates or inventory_updates:
+                with transaction() as cur:
+                    # Resolved and locked here, not taken from the cache: a cached
+                    # entry can outlive a delete and re-create of the same SKU.
+                    product_id = self._lock_product(cur, sku)
+                    if product_id is not None:
+                        if product_updates:
+                            set_clauses = ", ".join([f"{key} = %s" for key in product_updates.keys()])
+                            params = list(product_updates.values()) + [product_id]
+                            cur.execute(f"UPDATE products SET {set_clauses}, updated_at = CURRENT_TIMESTAMP WHERE product_id = %s", tuple(params))
+                            logger.info(f"Product table updated for SKU: {sku}")
+                        if inventory_updates:
+                            set_clauses_inv = ", ".join([f"{key} = %s" for key in inventory_updates.keys()])
+                            params_inv = list(inventory_updates.values()) + [product_id]
+                            cur.execute(f"UPDATE inventory_levels SET {set_clauses_inv}, last_updated = CURRENT_TIMESTAMP WHERE product_id = %s", tuple(params_inv))
+                            logger.info(f"Inventory levels updated for product_id: {product_id} (SKU: {sku})")
+                        bump_versions(cur, "products")
+                product_cache.invalidate([sku])
+                if product_id is None:
+                    logger.warning(f"Update failed: Product not found for SKU: {sku}")
+                    return None
+
             return self.get_product_by_sku(sku)
         except Exception as e:
             logger.error(f"Error in update_product for SKU {sku}: {str(e)}", exc_info=True)
             raise
 
+    def _lock_product(self, cur, sku):
+        """Returns the product_id of sku, row-locked until the transaction ends; None if there is none."""
+        cur.execute("SELECT product_id FROM products WHERE sku = %s FOR UPDATE;", (sku,))
+        row = cur.fetchone()
+        return row[0] if row else None
+
+    @traced
     def delete_product(self, sku):
         logger.info(f"Attempting to delete product with SKU: {sku}")
         try:
-            product_info = self.get_product_by_sku(sku)
-            if not product_info:
+            with transaction() as cur:
+                product_id = self._lock_product(cur, sku)
+                if product_id is not None:
+                    cur.execute("DELETE FROM inventory_levels WHERE product_id = %s", (product_id,))
+                    logger.info(f"Inventory levels deleted for product_id: {product_id} (SKU: {sku})")
+                    cur.execute("DELETE FROM products WHERE product_id = %s", (product_id,))
+                    bump_versions(cur, "products")
+            product_cache.invalidate([sku])
+            if product_id is None:
                 logger.warning(f"Delete failed: Product not found for SKU: {sku}")
                 return False
-            product_id = product_info["product_id"]
-
-            self._execute_query("DELETE FROM inventory_levels WHERE product_id = %s", (product_id,), commit=True)
-            logger.info(f"Inventory levels deleted for product_id: {product_id} (SKU: {sku})")
-            deleted_rows = self._execute_query("DELETE FROM products WHERE sku = %s", (sku,), commit=True)
-            if deleted_rows > 0:
-                logger.info(f"Product {sku} (product_id: {product_id}) deleted successfully.")
-                return True
-            else:
-                logger.warning(f"Product {sku} (product_id: {product_id}) was not found in products table for deletion, though inventory might have been deleted.")
-                return False # Should ideally not happen if get_product_by_sku found it
+            logger.info(f"Product {sku} (product_id: {product_id}) deleted successfully.")
+            return True
         except Exception as e:
             logger.error(f"Error in delete_product for SKU {sku}: {str(e)}", exc_info=True)
             raise
@@ -1,89 +1,82 @@
 # Purchase Management Module - Integrated with PostgreSQL
 
-import psycopg2
 import os
 import logging # Import logging
-from psycopg2 import pool
 from datetime import datetime
+from src.db.pool import execute_query, transaction
+from src.db.prepared import hot_query
+from src.db.numbering import NumberGenerator
+from src.db.rows import map_row, map_rows, RowSet
+from src.db.pagination import decode_cursor, build_page
+from src.db.streaming import stream_rows
+from src.db.replicas import read_only
+from src.db.versions import bump_versions
+from src.observability.tracing import traced
+from src.cache.product_cache import product_cache
 
 # Configure logger for this module
 logger = logging.getLogger(__name__)
 
-# Initialize a connection pool
-DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    logger.error("DATABASE_URL environment variable is not set for PurchaseService.")
-    raise RuntimeError("DATABASE_URL environment variable is not set.")
+PURCHASE_SUMMARY_COLUMNS = (
+    "po_id", "po_number", "supplier_name", "order_date", "expected_delivery_date", "total_amount", "status"
+)
 
-try:
-    db_pool = psycopg2.pool.SimpleConnectionPool(1, 10, dsn=DATABASE_URL)
-    logger.info("Database connection pool initialized successfully for PurchaseService.")
-except Exception as e:
-    logger.critical(f"Error initializing database connection pool in PurchaseService: {e}", exc_info=True)
-    db_pool = None
+PURCHASE_SUMMARY_SELECT = """
+    SELECT 
+        po.po_id, po.po_number, s.supplier_name, po.order_date, 
+        po.expected_delivery_date, po.total_amount, po.status
+    FROM purchase_orders po
+    JOIN suppliers s ON po.supplier_id = s.supplier_id
+"""
 
-class PurchaseService:
-    def __init__(self):
-        if db_pool is None:
-            logger.error("PurchaseService initialized but database connection pool is not available.")
-            raise ConnectionError("Database connection pool is not available for PurchaseService.")
-        logger.info("PurchaseService Initialized - Database connection pool ready.")
+PURCHASE_DETAIL_COLUMNS = (
+    "po_id", "po_number", "supplier_name", "supplier_email", "order_date",
+    "expected_delivery_date", "total_amount", "status", "notes"
+)
+
+PURCHASE_ITEM_COLUMNS = ("po_item_id", "product_id", "product_name", "sku", "quantity", "unit_cost", "line_total")
+
+# Headers and lines of many purchase orders in one statement: each order's lines come
+# back as one JSON array of PURCHASE_ITEM_COLUMNS values (NULL for an order without lines).
+PURCHASE_DETAILS_SQL = hot_query("purchase_details_by_ids", """
+    WITH items AS (
+        SELECT poi.po_id,
+               json_agg(json_build_array(poi.po_item_id, poi.product_id, p.product_name, poi.sku,
+                                         poi.quantity, poi.unit_cost, poi.line_total)
+                        ORDER BY poi.po_item_id) AS items
+        FROM purchase_order_items poi
+        JOIN products p ON poi.product_id = p.product_id
+        WHERE poi.po_id = ANY(%s)
+        GROUP BY poi.po_id
+    )
+    SELECT 
+        po.po_id, po.po_number, s.supplier_name, s.email as supplier_email, po.order_date, 
+        po.expected_delivery_date, po.total_amount, po.status, po.notes,
+        items.items
+    FROM purchase_orders po
+    JOIN suppliers s ON po.supplier_id = s.supplier_id
+    LEFT JOIN items ON items.po_id = po.po_id
+    WHERE po.po_id = ANY(%s);
+""")
 
-    def _get_connection(self):
-        if db_pool is None:
-            logger.error("Attempted to get DB connection for PurchaseService, but pool is not available.")
-            raise ConnectionError("Database connection pool is not available.")
-        return db_pool.getconn()
+po_numbers = NumberGenerator("purchase_order_number_seq", os.getenv("PURCHASE_ORDER_NUMBER_FORMAT", "PO-{timestamp}-{number}"))
 
-    def _put_connection(self, conn):
-        if db_pool is not None:
-            db_pool.putconn(conn)
+class InvalidPurchaseError(Exception):
+    """Raised inside the purchase transaction when a line references an unknown SKU or lacks a cost."""
+
+class PurchaseService:
+    def __init__(self):
+        logger.info("PurchaseService Initialized.")
 
     def _execute_query(self, query, params=None, fetch_one=False, fetch_all=False, commit=False):
-        conn = None
-        logger.debug(f"PurchaseService executing query: {query} with params: {params}")
-        try:
-            conn = self._get_connection()
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                if commit:
-                    conn.commit()
-                    logger.info(f"PurchaseService query committed. {cur.rowcount} rows affected.")
-                    if "RETURNING" in query.upper() and (fetch_one or fetch_all):
-                        if fetch_one:
-                            result = cur.fetchone()
-                            logger.debug(f"PurchaseService query (commit with returning) fetch_one result: {result}")
-                            return result
-                        else:
-                            results = cur.fetchall()
-                            logger.debug(f"PurchaseService query (commit with returning) fetch_all results count: {len(results) if results else 0}")
-                            return results
-                    return cur.rowcount
-                if fetch_one:
-                    result = cur.fetchone()
-                    logger.debug(f"PurchaseService query fetch_one result: {result}")
-                    return result
-                if fetch_all:
-                    results = cur.fetchall()
-                    logger.debug(f"PurchaseService query fetch_all results count: {len(results) if results else 0}")
-                    return results
-        except Exception as e:
-            logger.error(f"PurchaseService Database query error: {e} for query: {query} with params: {params}", exc_info=True)
-            if conn and not commit:
-                try:
-                    conn.rollback()
-                    logger.info("PurchaseService transaction rolled back due to error.")
-                except Exception as rb_e:
-                    logger.error(f"PurchaseService error during rollback: {rb_e}", exc_info=True)
-            raise
-        finally:
-            if conn:
-                self._put_connection(conn)
+        return execute_query(query, params, fetch_one=fetch_one, fetch_all=fetch_all, commit=commit)
 
-    def _get_or_create_supplier(self, supplier_name, contact_name=None, email=None, phone=None, address_details=None):
+    @traced
+    def _get_or_create_supplier(self, cur, supplier_name, contact_name=None, email=None, phone=None, address_details=None):
         logger.info(f"Getting or creating supplier: {supplier_name}, email: {email}")
         sql_find_supplier = "SELECT supplier_id FROM suppliers WHERE supplier_name = %s OR (email IS NOT NULL AND email = %s) LIMIT 1"
-        supplier_row = self._execute_query(sql_find_supplier, (supplier_name, email), fetch_one=True)
+        cur.execute(sql_find_supplier, (supplier_name, email))
+        supplier_row = cur.fetchone()
         if supplier_row:
             logger.info(f"Found existing supplier_id: {supplier_row[0]} for name: {supplier_name}")
             return supplier_row[0]
@@ -94,10 +87,11 @@ class PurchaseService:
                 VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING supplier_id;
             """
             addr = address_details or {}
-            new_supplier_id_row = self._execute_query(sql_create_supplier, (
+            cur.execute(sql_create_supplier, (
                 supplier_name, contact_name, email, phone,
                 addr.get("address_line1"), addr.get("city"), addr.get("country")
-            ), commit=True, fetch_one=True)
+            ))
+            new_supplier_id_row = cur.fetchone()
             if new_supplier_id_row:
                 logger.info(f"Created new supplier_id: {new_supplier_id_row[0]} for name: {supplier_name}")
                 return new_supplier_id_row[0]
@@ -105,88 +99,100 @@ class PurchaseService:
                 logger.error(f"Failed to create or retrieve supplier: {supplier_name}")
                 raise Exception("Failed to create or retrieve supplier")
 
+    @traced
     def record_purchase(self, supplier_name, items, order_date_str, status="Ordered", supplier_contact=None, supplier_email=None, supplier_phone=None, expected_delivery_date_str=None, notes=None):
+        """Records a purchase order, its lines and, when it is already Received, the stock and cost updates in one transaction."""
         logger.info(f"Attempting to record purchase for supplier: {supplier_name}, items_count: {len(items) if items else 0}, order_date: {order_date_str}")
         if not supplier_name or not items or not order_date_str:
             logger.warning("Record purchase attempt with missing supplier_name, items, or order_date.")
             return {"error": "Missing supplier name, items, or order date"}
 
         try:
-            supplier_id = self._get_or_create_supplier(supplier_name, supplier_contact, supplier_email, supplier_phone)
-            
-            try:
-                order_date = datetime.fromisoformat(order_date_str.replace("Z", "+00:00")) if isinstance(order_date_str, str) else order_date_str
-                expected_delivery_date = None
-                if expected_delivery_date_str:
-                    expected_delivery_date = datetime.fromisoformat(expected_delivery_date_str.replace("Z", "+00:00")) if isinstance(expected_delivery_date_str, str) else expected_delivery_date_str
-            except ValueError as ve:
-                logger.warning(f"Invalid date format. Order Date: {order_date_str}, Expected Delivery: {expected_delivery_date_str}. Error: {ve}")
-                return {"error": "Invalid date format. Use ISO format for order_date and expected_delivery_date."}
-
-            total_amount = 0
-            processed_items = []
-            for item_idx, item_data in enumerate(items):
-                logger.debug(f"Processing purchase item {item_idx + 1}: SKU {item_data.get("sku")}")
-                product_info = self._execute_query("SELECT product_id FROM products WHERE sku = %s", (item_data["sku"],), fetch_one=True)
-                if not product_info:
-                    logger.error(f"Product with SKU {item_data["sku"]} not found during purchase recording.")
-                    return {"error": f"Product with SKU {item_data["sku"]} not found."}
-                
-                item_cost = item_data.get("cost_price") # Assuming cost_price is provided
-                if item_cost is None:
-                    logger.error(f"Missing cost_price for SKU {item_data["sku"]} in purchase item.")
-                    return {"error": f"Missing cost_price for SKU {item_data["sku"]}."}
-                item_cost = float(item_cost)
-                total_amount += item_data["quantity"] * item_cost
-                processed_items.append({
-                    "product_id": product_info[0],
-                    "sku": item_data["sku"],
-                    "quantity": item_data["quantity"],
-                    "unit_cost_at_purchase": item_cost
-                })
-            logger.debug(f"Calculated total_amount: {total_amount} for the purchase.")
-
-            po_number_prefix = datetime.now().strftime("%Y%m%d%H%M%S")
-            last_id_row = self._execute_query("SELECT MAX(po_id) FROM purchase_orders", fetch_one=True)
-            next_id = (last_id_row[0] if last_id_row and last_id_row[0] is not None else 0) + 1
-            po_number = f"PO-{po_number_prefix}-{next_id}"
-            logger.info(f"Generated po_number: {po_number}")
-
-            sql_insert_po = """
-                INSERT INTO purchase_orders (po_number, supplier_id, order_date, expected_delivery_date, total_amount, status, notes)
-                VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING po_id;
-            """
-            po_id_row = self._execute_query(sql_insert_po, (
-                po_number, supplier_id, order_date, expected_delivery_date, total_amount, status, notes
-            ), commit=True, fetch_one=True)
-
-            if not po_id_row:
-                logger.error("Failed to create purchase order after generating po_number.")
-                raise Exception("Failed to create purchase order.")
-            po_id = po_id_row[0]
-            logger.info(f"Purchase order created with po_id: {po_id}")
-
-            for item in processed_items:
-                sql_insert_item = """
-                    INSERT INTO purchase_order_items (po_id, product_id, sku, quantity, unit_cost, line_total)
-                    VALUES (%s, %s, %s, %s, %s, %s);
+            order_date = datetime.fromisoformat(order_date_str.replace("Z", "+00:00")) if isinstance(order_date_str, str) else order_date_str
+            expected_delivery_date = None
+            if expected_delivery_date_str:
+                expected_delivery_date = datetime.fromisoformat(expected_delivery_date_str.replace("Z", "+00:00")) if isinstance(expected_delivery_date_str, str) else expected_delivery_date_str
+        except ValueError as ve:
+            logger.warning(f"Invalid date format. Order Date: {order_date_str}, Expected Delivery: {expected_delivery_date_str}. Error: {ve}")
+            return {"error": "Invalid date format. Use ISO format for order_date and expected_delivery_date."}
+
+        try:
+            with transaction() as cur:
+                supplier_id = self._get_or_create_supplier(cur, supplier_name, supplier_contact, supplier_email, supplier_phone)
+
+                total_amount = 0
+                processed_items = []
+                for item_idx, item_data in enumerate(items):
+                    logger.debug(f"Processing purchase item {item_idx + 1}: SKU {item_data.get('sku')}")
+                    cur.execute("SELECT product_id FROM products WHERE sku = %s", (item_data["sku"],))
+                    product_info = cur.fetchone()
+                    if not product_info:
+                        logger.error(f"Product with SKU {item_data['sku']} not found during purchase recording.")
+                        raise InvalidPurchaseError(f"Product with SKU {item_data['sku']} not found.")
+
+                    item_cost = item_data.get("cost_price") # Assuming cost_price is provided
+                    if item_cost is None:
+                        logger.error(f"Missing cost_price for SKU {item_data['sku']} in purchase item.")
+                        raise InvalidPurchaseError(f"Missing cost_price for SKU {item_data['sku']}.")
+                    item_cost = float(item_cost)
+                    total_amount += item_data["quantity"] * item_cost
+                    processed_items.append({
+                        "product_id": product_info[0],
+                        "sku": item_data["sku"],
+                        "quantity": item_data["quantity"],
+                        "unit_cost_at_purchase": item_cost
+                    })
+                logger.debug(f"Calculated total_amount: {total_amount} for the purchase.")
+
+                po_number = po_numbers.next_number(cur)
+                logger.info(f"Generated po_number: {po_number}")
+
+                sql_insert_po = """
+                    INSERT INTO purchase_orders (po_number, supplier_id, order_date, expected_delivery_date, total_amount, status, notes)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING po_id;
                 """
-                line_total = item["quantity"] * item["unit_cost_at_purchase"]
-                self._execute_query(sql_insert_item, (
-                    po_id, item["product_id"], item["sku"], item["quantity"], item["unit_cost_at_purchase"], line_total
-                ), commit=True)
-                logger.debug(f"Inserted purchase_order_item for po_id {po_id}, product_id {item["product_id"]}")
-                
-                if status == "Received":
-                    logger.info(f"PO {po_id} is 'Received'. Updating inventory for product_id {item["product_id"]}")
-                    self._update_inventory_and_costs_on_receive(item["product_id"], item["quantity"], item["unit_cost_at_purchase"])
-
-            return self.get_purchase_by_id(po_id)
+                cur.execute(sql_insert_po, (
+                    po_number, supplier_id, order_date, expected_delivery_date, total_amount, status, notes
+                ))
+                po_id_row = cur.fetchone()
+                if not po_id_row:
+                    logger.error("Failed to create purchase order after generating po_number.")
+                    raise Exception("Failed to create purchase order.")
+                po_id = po_id_row[0]
+                logger.info(f"Purchase order created with po_id: {po_id}")
+
+                for item in processed_items:
+                    sql_insert_item = """
+                        INSERT INTO purchase_order_items (po_id, product_id, sku, quantity, unit_cost, line_total)
+                        VALUES (%s, %s, %s, %s, %s, %s);
+                    """
+                    line_total = item["quantity"] * item["unit_cost_at_purchase"]
+                    cur.execute(sql_insert_item, (
+                        po_id, item["product_id"], item["sku"], item["quantity"], item["unit_cost_at_purchase"], line_total
+                    ))
+                    logger.debug(f"Inserted purchase_order_item for po_id {po_id}, product_id {item['product_id']}")
+
+                    if status == "Received":
+                        logger.info(f"PO {po_id} is 'Received'. Updating inventory for product_id {item['product_id']}")
+                        self._update_inventory_and_costs_on_receive(cur, item["product_id"], item["quantity"], item["unit_cost_at_purchase"])
+
+                # Receiving also changed inventory and costs
+                bump_versions(cur, *(("purchases", "products") if status == "Received" else ("purchases",)))
+            if status == "Received":
+                product_cache.invalidate(item["sku"] for item in processed_items)
+            return self._get_purchase(po_id)
+        except InvalidPurchaseError as ipe:
+            return {"error": str(ipe)}
         except Exception as e:
             logger.error(f"Error in record_purchase for supplier {supplier_name}: {str(e)}", exc_info=True)
             return {"error": f"An unexpected error occurred: {str(e)}"}
 
-    def _update_inventory_and_costs_on_receive(self, product_id, quantity_received, unit_cost):
+    @traced
+    def _update_inventory_and_costs_on_receive(self, cur, product_id, quantity_received, unit_cost):
+        """Adds received stock and folds unit_cost into the average cost, on the caller's transaction.
+
+        The caller invalidates the product cache after committing.
+        """
         logger.info(f"Updating inventory and costs for product_id: {product_id} upon receiving {quantity_received} units at cost {unit_cost}")
         sql_update_inventory = """
             UPDATE inventory_levels 
@@ -194,10 +200,11 @@ class PurchaseService:
                 last_updated = CURRENT_TIMESTAMP
             WHERE product_id = %s;
         """
-        self._execute_query(sql_update_inventory, (quantity_received, product_id), commit=True)
+        cur.execute(sql_update_inventory, (quantity_received, product_id))
         logger.info(f"Inventory quantity updated for product_id: {product_id} by +{quantity_received}")
 
-        current_product_data = self._execute_query("SELECT p.average_cost, il.available_quantity FROM products p JOIN inventory_levels il ON p.product_id = il.product_id WHERE p.product_id = %s", (product_id,), fetch_one=True)
+        cur.execute("SELECT p.average_cost, il.available_quantity FROM products p JOIN inventory_levels il ON p.product_id = il.product_id WHERE p.product_id = %s", (product_id,))
+        current_product_data = cur.fetchone()
         if current_product_data:
             old_avg_cost = float(current_product_data[0] or 0)
             current_total_quantity = int(current_product_data[1] or 0) 
@@ -212,124 +219,147 @@ class PurchaseService:
                 SET last_purchase_price = %s, average_cost = %s, updated_at = CURRENT_TIMESTAMP
                 WHERE product_id = %s;
             """
-            self._execute_query(sql_update_product_costs, (unit_cost, new_avg_cost, product_id), commit=True)
+            cur.execute(sql_update_product_costs, (unit_cost, new_avg_cost, product_id))
             logger.info(f"Product costs (last_purchase_price, average_cost) updated for product_id: {product_id}")
         else:
             logger.warning(f"Could not retrieve current product data to update average_cost for product_id: {product_id}")
 
+    @traced
+    @read_only
     def get_all_purchases(self):
         logger.info("Fetching all purchase orders.")
-        sql = """
-            SELECT 
-                po.po_id, po.po_number, s.supplier_name, po.order_date, 
-                po.expected_delivery_date, po.total_amount, po.status
-            FROM purchase_orders po
-            JOIN suppliers s ON po.supplier_id = s.supplier_id
-            ORDER BY po.order_date DESC;
-        """
+        sql = PURCHASE_SUMMARY_SELECT + " ORDER BY po.order_date DESC, po.po_id DESC;"
         try:
             rows = self._execute_query(sql, fetch_all=True)
-            orders = []
-            if rows:
-                for row in rows:
-                    orders.append({
-                        "po_id": row[0],
-                        "po_number": row[1],
-                        "supplier_name": row[2],
-                        "order_date": row[3].isoformat() if row[3] else None,
-                        "expected_delivery_date": row[4].isoformat() if row[4] else None,
-                        "total_amount": float(row[5]) if row[5] is not None else None,
-                        "status": row[6]
-                    })
+            orders = RowSet(PURCHASE_SUMMARY_COLUMNS, rows)
             logger.info(f"Retrieved {len(orders)} purchase orders.")
             return orders
         except Exception as e:
             logger.error(f"Error in get_all_purchases: {str(e)}", exc_info=True)
             raise
 
+    @traced
+    @read_only
+    def list_purchases(self, limit, after=None):
+        """Returns one page of purchase orders, newest first, ordered by (order_date, po_id) DESC.
+
+        after is the opaque next_cursor of the previous page; each page is an
+        index range scan on idx_purchase_orders_date_id.
+        """
+        logger.info(f"Fetching purchase orders page. limit: {limit}, after: {after}")
+        params = []
+        where = ""
+        if after:
+            where = " WHERE (po.order_date, po.po_id) < (%s, %s)"
+            params.extend(decode_cursor(after, 2))
+        sql = PURCHASE_SUMMARY_SELECT + where + " ORDER BY po.order_date DESC, po.po_id DESC LIMIT %s;"
+        params.append(limit + 1)
+        try:
+            rows = self._execute_query(sql, tuple(params), fetch_all=True)
+            page = build_page(RowSet(PURCHASE_SUMMARY_COLUMNS, rows), limit, ("order_date", "po_id"))
+            logger.info(f"Retrieved {len(page['items'])} purchase orders for page.")
+            return page
+        except Exception as e:
+            logger.error(f"Error in list_purchases: {str(e)}", exc_info=True)
+            raise
+
+    @read_only
+    def export_purchases(self, itersize=None):
+        """Yields every purchase order as a dict of raw column values through a server-side cursor, in list order."""
+        logger.info(f"Exporting all purchase orders. itersize: {itersize}")
+        sql = PURCHASE_SUMMARY_SELECT + " ORDER BY po.order_date DESC, po.po_id DESC;"
+        return (dict(zip(PURCHASE_SUMMARY_COLUMNS, row)) for row in stream_rows(sql, itersize=itersize))
+
+    def _fetch_purchase_details(self, po_ids):
+        """Loads full details of the given purchase orders with one statement; returns {po_id: details}."""
+        rows = self._execute_query(PURCHASE_DETAILS_SQL, (po_ids, po_ids), fetch_all=True)
+        details = {}
+        for row in rows or []:
+            po_details = map_row(PURCHASE_DETAIL_COLUMNS, row[:9])
+            po_details["items"] = map_rows(PURCHASE_ITEM_COLUMNS, row[9])
+            details[row[0]] = po_details
+        return details
+
+    @traced
+    @read_only
+    def get_purchases_by_ids(self, po_ids):
+        """Returns the full details of many purchase orders, in the order of po_ids.
+
+        Ids that do not exist are left out. Headers and lines of all orders
+        are read with a single statement.
+        """
+        logger.info(f"Fetching {len(po_ids)} purchase orders by id.")
+        try:
+            details = self._fetch_purchase_details(list(po_ids))
+            orders = [details[po_id] for po_id in po_ids if po_id in details]
+            logger.info(f"Retrieved {len(orders)} of {len(po_ids)} requested purchase orders.")
+            return orders
+        except Exception as e:
+            logger.error(f"Error in get_purchases_by_ids: {str(e)}", exc_info=True)
+            raise
+
+    @traced
+    @read_only
     def get_purchase_by_id(self, po_id):
+        return self._get_purchase(po_id)
+
+    def _get_purchase(self, po_id):
+        # Not @read_only: the write paths read their own changes back through it, from the primary.
         logger.info(f"Fetching purchase order by po_id: {po_id}")
-        sql_po = """
-            SELECT 
-                po.po_id, po.po_number, s.supplier_name, s.email as supplier_email, po.order_date, 
-                po.expected_delivery_date, po.total_amount, po.status, po.notes
-            FROM purchase_orders po
-            JOIN suppliers s ON po.supplier_id = s.supplier_id
-            WHERE po.po_id = %s;
-        """
         try:
-            po_row = self._execute_query(sql_po, (po_id,), fetch_one=True)
-            if not po_row:
+            po_id = int(po_id) # Routes pass the id as a string
+        except (TypeError, ValueError):
+            logger.warning(f"Purchase order not found for po_id: {po_id!r}")
+            return None
+        try:
+            po_details = self._fetch_purchase_details([po_id]).get(po_id)
+            if not po_details:
                 logger.warning(f"Purchase order not found for po_id: {po_id}")
                 return None
-
-            po_details = {
-                "po_id": po_row[0],
-                "po_number": po_row[1],
-                "supplier_name": po_row[2],
-                "supplier_email": po_row[3],
-                "order_date": po_row[4].isoformat() if po_row[4] else None,
-                "expected_delivery_date": po_row[5].isoformat() if po_row[5] else None,
-                "total_amount": float(po_row[6]) if po_row[6] is not None else None,
-                "status": po_row[7],
-                "notes": po_row[8],
-                "items": []
-            }
-
-            sql_items = """
-                SELECT poi.po_item_id, poi.product_id, p.product_name, poi.sku, 
-                       poi.quantity, poi.unit_cost, poi.line_total
-                FROM purchase_order_items poi
-                JOIN products p ON poi.product_id = p.product_id
-                WHERE poi.po_id = %s;
-            """
-            item_rows = self._execute_query(sql_items, (po_id,), fetch_all=True)
-            if item_rows:
-                for item_row in item_rows:
-                    po_details["items"].append({
-                        "po_item_id": item_row[0],
-                        "product_id": item_row[1],
-                        "product_name": item_row[2],
-                        "sku": item_row[3],
-                        "quantity": item_row[4],
-                        "unit_cost": float(item_row[5]) if item_row[5] is not None else None,
-                        "line_total": float(item_row[6]) if item_row[6] is not None else None
-                    })
             logger.info(f"Successfully retrieved purchase order details for po_id: {po_id}")
             return po_details
         except Exception as e:
             logger.error(f"Error in get_purchase_by_id for po_id {po_id}: {str(e)}", exc_info=True)
             raise
 
+    @traced
     def update_purchase_status(self, po_id, new_status):
         logger.info(f"Attempting to update status for purchase order po_id: {po_id} to {new_status}")
         try:
-            current_po = self.get_purchase_by_id(po_id) # Uses its own logging
+            current_po = self._get_purchase(po_id) # Uses its own logging
             if not current_po:
                 logger.warning(f"Update status failed: Purchase order not found for po_id: {po_id}")
                 return None
 
-            sql = "UPDATE purchase_orders SET status = %s, updated_at = CURRENT_TIMESTAMP WHERE po_id = %s RETURNING po_id;"
-            updated_row = self._execute_query(sql, (new_status, po_id), commit=True, fetch_one=True)
-            
-            if updated_row and new_status == "Received" and current_po["status"] != "Received":
-                logger.info(f"Purchase order {po_id} status changed to 'Received'. Updating inventory and costs for its items.")
-                for item in current_po.get("items", []):
-                    self._update_inventory_and_costs_on_receive(item["product_id"], item["quantity"], item["unit_cost"])
-            
+            received = new_status == "Received" and current_po["status"] != "Received"
+            sql = "UPDATE purchase_orders SET status = %s, updated_at = CURRENT_TIMESTAMP WHERE po_id = %s RETURNING status;"
+            with transaction() as cur:
+                cur.execute(sql, (new_status, current_po["po_id"]))
+                updated_row = cur.fetchone()
+                if updated_row:
+                    if received:
+                        logger.info(f"Purchase order {po_id} status changed to 'Received'. Updating inventory and costs for its items.")
+                        for item in current_po.get("items", []):
+                            self._update_inventory_and_costs_on_receive(cur, item["product_id"], item["quantity"], float(item["unit_cost"]))
+                    bump_versions(cur, *(("purchases", "products") if received else ("purchases",)))
+
             if updated_row:
+                if received:
+                    product_cache.invalidate(item["sku"] for item in current_po.get("items", []))
                 logger.info(f"Purchase order po_id: {po_id} status updated to {new_status}")
-                return self.get_purchase_by_id(po_id)
+                # Only the status changed (receiving updates products, not the order), so no re-read
+                return dict(current_po, status=updated_row[0])
             logger.warning(f"Failed to update status for purchase order po_id: {po_id} (not found or no change)")
             return None
         except Exception as e:
             logger.error(f"Error in update_purchase_status for po_id {po_id}: {str(e)}", exc_info=True)
             raise
 
+    @traced
     def delete_purchase(self, po_id):
         logger.info(f"Attempting to delete purchase order po_id: {po_id}")
         try:
-            current_po = self.get_purchase_by_id(po_id)
+            current_po = self._get_purchase(po_id)
             if not current_po:
                 logger.warning(f"Delete failed: Purchase order not found for po_id: {po_id}")
                 return False
@@ -338,14 +368,17 @@ class PurchaseService:
                 logger.warning(f"Attempted to delete Purchase Order {po_id} which is already 'Received'. Deletion without inventory reversal can cause discrepancies. Proceeding with deletion of PO records only.")
                 # Consider if inventory should be reverted here or if deletion of received POs should be disallowed.
 
-            self._execute_query("DELETE FROM purchase_order_items WHERE po_id = %s", (po_id,), commit=True)
-            logger.info(f"Deleted purchase_order_items for po_id: {po_id}")
-            deleted_rows = self._execute_query("DELETE FROM purchase_orders WHERE po_id = %s", (po_id,), commit=True)
+            with transaction() as cur:
+                cur.execute("DELETE FROM purchase_order_items WHERE po_id = %s", (current_po["po_id"],))
+                logger.info(f"Deleted purchase_order_items for po_id: {po_id}")
+                cur.execute("DELETE FROM purchase_orders WHERE po_id = %s", (current_po["po_id"],))
+                deleted_rows = cur.rowcount
+                bump_versions(cur, "purchases")
             if deleted_rows > 0:
                 logger.info(f"Purchase order po_id: {po_id} deleted successfully.")
                 return True
             else:
-                # This case should ideally not be reached if get_purchase_by_id found it.
+                # This case should ideally not be reached if _get_purchase found it.
                 logger.warning(f"Purchase order po_id: {po_id} was not found in purchase_orders table for deletion, though items might have been deleted.")
                 return False
         except Exception as e:
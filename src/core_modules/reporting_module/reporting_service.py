@@ -1,12 +1,17 @@
 # Reporting and Analytics Module
 import logging
 
+from src.db.replicas import read_only
+from src.observability.tracing import traced
+
 # Configure logger for this module
 logger = logging.getLogger(__name__)
 
 # Placeholder for data aggregation and analysis functions
 # These would typically query the database, process data, and generate insights
 
+@traced
+@read_only
 def generate_sales_report(start_date, end_date, group_by=None):
     """Generates a sales report for a given period.
 
@@ -27,6 +32,8 @@ def generate_sales_report(start_date, end_date, group_by=None):
     logger.debug(f"Sales report data (placeholder): {report_data}")
     return report_data
 
+@traced
+@read_only
 def generate_inventory_report(as_of_date, low_stock_threshold=None):
     """Generates an inventory status report.
 
@@ -48,6 +55,8 @@ def generate_inventory_report(as_of_date, low_stock_threshold=None):
     logger.debug(f"Inventory report data (placeholder): {inventory_summary}")
     return inventory_summary
 
+@traced
+@read_only
 def generate_purchase_report(start_date, end_date, group_by_supplier=False):
     """Generates a purchase report for a given period.
 
@@ -1,89 +1,103 @@
 # Sales Management Module - Integrated with PostgreSQL
 
-import psycopg2
 import os
 import logging # Import logging
-from psycopg2 import pool
 from datetime import datetime
+from psycopg2.extras import execute_values
+from src.db.pool import execute_query, transaction
+from src.db.prepared import hot_query
+from src.db.numbering import NumberGenerator
+from src.db.rows import map_row, map_rows, RowSet
+from src.db.pagination import decode_cursor, build_page
+from src.db.streaming import stream_rows
+from src.db.replicas import read_only
+from src.db.versions import bump_versions
+from src.observability.tracing import traced
+from src.cache.product_cache import product_cache
 
 # Configure logger for this module
 logger = logging.getLogger(__name__)
 
-# Initialize a connection pool
-DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    logger.error("DATABASE_URL environment variable is not set for SalesService.")
-    raise RuntimeError("DATABASE_URL environment variable is not set.")
+SALE_SUMMARY_COLUMNS = (
+    "order_id", "order_number", "customer_name", "order_date", "total_amount", "status",
+    "shipping_address_line1", "shipping_city", "shipping_country"
+)
 
-try:
-    db_pool = psycopg2.pool.SimpleConnectionPool(1, 10, dsn=DATABASE_URL)
-    logger.info("Database connection pool initialized successfully for SalesService.")
-except Exception as e:
-    logger.critical(f"Error initializing database connection pool in SalesService: {e}", exc_info=True)
-    db_pool = None
+SALE_SUMMARY_SELECT = """
+    SELECT 
+        so.order_id, so.order_number, c.customer_name, so.order_date, 
+        so.total_amount, so.status,
+        so.shipping_address_line1, so.shipping_city, so.shipping_country
+    FROM sales_orders so
+    JOIN customers c ON so.customer_id = c.customer_id
+"""
 
-class SalesService:
-    def __init__(self):
-        if db_pool is None:
-            logger.error("SalesService initialized but database connection pool is not available.")
-            raise ConnectionError("Database connection pool is not available for SalesService.")
-        logger.info("SalesService Initialized - Database connection pool ready.")
+SALE_DETAIL_COLUMNS = (
+    "order_id", "order_number", "customer_name", "customer_email", "order_date", "total_amount", "status"
+)
+
+SHIPPING_ADDRESS_COLUMNS = ("line1", "line2", "city", "state_province", "postal_code", "country")
+
+SALE_ITEM_COLUMNS = ("order_item_id", "product_id", "product_name", "sku", "quantity", "unit_price", "line_total")
+
+# Hot queries run as prepared statements on each pooled connection (see src/db/prepared.py).
+PRODUCTS_BY_SKUS_SQL = hot_query("sale_products_by_skus", """
+    SELECT p.sku, p.product_id, p.unit_price
+    FROM products p
+    JOIN inventory_levels il ON p.product_id = il.product_id
+    WHERE p.sku = ANY(%s);
+""")
+
+# Headers and lines of many orders in one statement: each order's lines come back as
+# one JSON array of SALE_ITEM_COLUMNS values (NULL for an order without lines).
+SALE_DETAILS_SQL = hot_query("sale_details_by_ids", """
+    WITH items AS (
+        SELECT soi.order_id,
+               json_agg(json_build_array(soi.order_item_id, soi.product_id, p.product_name, soi.sku,
+                                         soi.quantity, soi.unit_price, soi.line_total)
+                        ORDER BY soi.order_item_id) AS items
+        FROM sales_order_items soi
+        JOIN products p ON soi.product_id = p.product_id
+        WHERE soi.order_id = ANY(%s)
+        GROUP BY soi.order_id
+    )
+    SELECT 
+        so.order_id, so.order_number, c.customer_name, c.email as customer_email, so.order_date, 
+        so.total_amount, so.status,
+        so.shipping_address_line1, so.shipping_address_line2, so.shipping_city, 
+        so.shipping_state_province, so.shipping_postal_code, so.shipping_country, so.notes,
+        items.items
+    FROM sales_orders so
+    JOIN customers c ON so.customer_id = c.customer_id
+    LEFT JOIN items ON items.order_id = so.order_id
+    WHERE so.order_id = ANY(%s);
+""")
 
-    def _get_connection(self):
-        if db_pool is None:
-            logger.error("Attempted to get DB connection for SalesService, but pool is not available.")
-            raise ConnectionError("Database connection pool is not available.")
-        return db_pool.getconn()
+order_numbers = NumberGenerator("sales_order_number_seq", os.getenv("SALES_ORDER_NUMBER_FORMAT", "SO-{timestamp}-{number}"))
 
-    def _put_connection(self, conn):
-        if db_pool is not None:
-            db_pool.putconn(conn)
+class InvalidOrderError(Exception):
+    """Raised when an order line references an unknown SKU or has an invalid quantity."""
+
+class InsufficientStockError(Exception):
+    """Raised inside the sale transaction when one or more lines are short on stock."""
+
+    def __init__(self, short_skus):
+        self.short_skus = short_skus
+        super().__init__(f"Insufficient stock for SKU(s): {', '.join(short_skus)}")
+
+class SalesService:
+    def __init__(self):
+        logger.info("SalesService Initialized.")
 
     def _execute_query(self, query, params=None, fetch_one=False, fetch_all=False, commit=False):
-        conn = None
-        logger.debug(f"SalesService executing query: {query} with params: {params}")
-        try:
-            conn = self._get_connection()
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                if commit:
-                    conn.commit()
-                    logger.info(f"SalesService query committed. {cur.rowcount} rows affected.")
-                    if "RETURNING" in query.upper() and (fetch_one or fetch_all):
-                        if fetch_one:
-                            result = cur.fetchone()
-                            logger.debug(f"SalesService query (commit with returning) fetch_one result: {result}")
-                            return result
-                        else:
-                            results = cur.fetchall()
-                            logger.debug(f"SalesService query (commit with returning) fetch_all results count: {len(results) if results else 0}")
-                            return results
-                    return cur.rowcount
-                if fetch_one:
-                    result = cur.fetchone()
-                    logger.debug(f"SalesService query fetch_one result: {result}")
-                    return result
-                if fetch_all:
-                    results = cur.fetchall()
-                    logger.debug(f"SalesService query fetch_all results count: {len(results) if results else 0}")
-                    return results
-        except Exception as e:
-            logger.error(f"SalesService Database query error: {e} for query: {query} with params: {params}", exc_info=True)
-            if conn and not commit:
-                try:
-                    conn.rollback()
-                    logger.info("SalesService transaction rolled back due to error.")
-                except Exception as rb_e:
-                    logger.error(f"SalesService error during rollback: {rb_e}", exc_info=True)
-            raise
-        finally:
-            if conn:
-                self._put_connection(conn)
+        return execute_query(query, params, fetch_one=fetch_one, fetch_all=fetch_all, commit=commit)
 
-    def _get_or_create_customer(self, customer_name, email=None, phone=None, address_details=None):
+    @traced
+    def _get_or_create_customer(self, cur, customer_name, email=None, phone=None, address_details=None):
         logger.info(f"Getting or creating customer: {customer_name}, email: {email}")
         sql_find_customer = "SELECT customer_id FROM customers WHERE customer_name = %s OR (email IS NOT NULL AND email = %s) LIMIT 1"
-        customer_row = self._execute_query(sql_find_customer, (customer_name, email), fetch_one=True)
+        cur.execute(sql_find_customer, (customer_name, email))
+        customer_row = cur.fetchone()
         if customer_row:
             logger.info(f"Found existing customer_id: {customer_row[0]} for name: {customer_name}")
             return customer_row[0]
@@ -94,10 +108,11 @@ class SalesService:
                 VALUES (%s, %s, %s, %s, %s, %s) RETURNING customer_id;
             """
             addr = address_details or {}
-            new_customer_id_row = self._execute_query(sql_create_customer, (
+            cur.execute(sql_create_customer, (
                 customer_name, email, phone, 
                 addr.get("address_line1"), addr.get("city"), addr.get("country")
-            ), commit=True, fetch_one=True)
+            ))
+            new_customer_id_row = cur.fetchone()
             if new_customer_id_row:
                 logger.info(f"Created new customer_id: {new_customer_id_row[0]} for name: {customer_name}")
                 return new_customer_id_row[0]
@@ -105,214 +120,479 @@ class SalesService:
                 logger.error(f"Failed to create or retrieve customer: {customer_name}")
                 raise Exception("Failed to create or retrieve customer")
 
+    @traced
+    def _decrement_inventory(self, cur, quantity_by_product, sku_by_product):
+        """Checks and decrements stock for every product in one guarded statement.
+
+        Rows are locked in product_id order so concurrent multi-line orders cannot
+        deadlock, and a row is only decremented while it still has enough stock.
+        Raises InsufficientStockError listing the short SKUs when any row is skipped.
+        """
+        requested = sorted(quantity_by_product.items())
+        updated_rows = execute_values(cur, """
+            WITH requested (product_id, quantity) AS (VALUES %s),
+            locked AS MATERIALIZED (
+                SELECT il.product_id
+                FROM inventory_levels il
+                JOIN requested r ON r.product_id = il.product_id
+                ORDER BY il.product_id
+                FOR UPDATE OF il
+            )
+            UPDATE inventory_levels il
+            SET available_quantity = il.available_quantity - r.quantity,
+                last_updated = CURRENT_TIMESTAMP
+            FROM requested r
+            WHERE il.product_id = r.product_id
+              AND il.product_id IN (SELECT product_id FROM locked)
+              AND il.available_quantity >= r.quantity
+            RETURNING il.product_id;
+        """, requested, page_size=len(requested), fetch=True)
+        decremented = {row[0] for row in updated_rows}
+        short_skus = [sku_by_product[product_id] for product_id, _ in requested if product_id not in decremented]
+        if short_skus:
+            raise InsufficientStockError(short_skus)
+        logger.info(f"Inventory decremented for {len(decremented)} products.")
+
+    def _item_errors(self, items):
+        """Returns why items is not a list of well-formed order lines, or None.
+
+        Runs before any transaction opens, so a malformed order is rejected on
+        its own instead of failing the statement (and, in a batch, every order).
+        """
+        if not isinstance(items, list):
+            return "Items must be a list of order lines."
+        for item_idx, item_data in enumerate(items, start=1):
+            if not isinstance(item_data, dict):
+                return f"Item {item_idx} must be an object."
+            sku = item_data.get("sku")
+            if not isinstance(sku, str) or not sku:
+                return f"Item {item_idx}: sku must be a non-empty string."
+            quantity = item_data.get("quantity")
+            if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity <= 0:
+                return f"Invalid quantity for SKU {sku}: {quantity!r}"
+            if "price" in item_data:
+                price = item_data["price"]
+                if not isinstance(price, (int, float)) or isinstance(price, bool) or price < 0:
+                    return f"Invalid price for SKU {sku}: {price!r}"
+        return None
+
+    def _parse_order_date(self, order_date_str):
+        return datetime.fromisoformat(order_date_str.replace("Z", "+00:00")) if isinstance(order_date_str, str) else order_date_str
+
+    @traced
+    def _lookup_products(self, cur, skus):
+        """Resolves every SKU in one statement; returns {sku: (product_id, unit_price)}."""
+        cur.execute(PRODUCTS_BY_SKUS_SQL, (list(skus),))
+        products_by_sku = {row[0]: row[1:] for row in cur.fetchall()}
+        logger.debug(f"Resolved {len(products_by_sku)} of {len(skus)} SKUs.")
+        return products_by_sku
+
+    @traced
+    def _price_items(self, items, products_by_sku):
+        """Prices the order lines against the resolved products.
+
+        Returns (processed_items, total_amount, quantity_by_product, sku_by_product),
+        or raises InvalidOrderError for an unknown SKU or a non-positive quantity.
+        """
+        total_amount = 0
+        processed_items = []
+        quantity_by_product = {}
+        sku_by_product = {}
+        for item_idx, item_data in enumerate(items):
+            logger.debug(f"Processing sale item {item_idx + 1}: SKU {item_data.get('sku')}")
+            product_info = products_by_sku.get(item_data.get("sku"))
+            if not product_info:
+                logger.error(f"Product with SKU {item_data.get('sku')} not found during sale recording.")
+                raise InvalidOrderError(f"Product with SKU {item_data.get('sku')} not found.")
+            quantity = item_data.get("quantity")
+            if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity <= 0:
+                raise InvalidOrderError(f"Invalid quantity for SKU {item_data['sku']}: {quantity!r}")
+            product_id, unit_price = product_info
+            quantity_by_product[product_id] = quantity_by_product.get(product_id, 0) + quantity
+            sku_by_product[product_id] = item_data["sku"]
+
+            item_price = item_data.get("price", float(unit_price))
+            total_amount += quantity * item_price
+            processed_items.append({
+                "product_id": product_id,
+                "sku": item_data["sku"],
+                "quantity": quantity,
+                "unit_price_at_sale": item_price
+            })
+        logger.debug(f"Calculated total_amount: {total_amount} for the sale.")
+        return processed_items, total_amount, quantity_by_product, sku_by_product
+
+    @traced
+    def _insert_order_items(self, cur, lines):
+        """Inserts (order_id, item) pairs for any number of orders with one multi-row INSERT."""
+        execute_values(cur, """
+            INSERT INTO sales_order_items (order_id, product_id, sku, quantity, unit_price, line_total)
+            VALUES %s;
+        """, [
+            (order_id, item["product_id"], item["sku"], item["quantity"], item["unit_price_at_sale"],
+             item["quantity"] * item["unit_price_at_sale"])
+            for order_id, item in lines
+        ], page_size=len(lines))
+        logger.debug(f"Inserted {len(lines)} sales_order_items.")
+
+    @traced
     def record_sale(self, customer_name, items, order_date_str, status="Pending", customer_email=None, customer_phone=None, shipping_address=None):
+        """Records a sales order, its lines and the inventory decrement in one transaction.
+
+        The number of statements is fixed regardless of how many lines the order
+        has: one batched SKU lookup, one guarded inventory decrement, one
+        multi-row line insert. If any line is short on stock the whole order is
+        rejected and the response lists the short SKUs.
+        """
         logger.info(f"Attempting to record sale for customer: {customer_name}, items_count: {len(items) if items else 0}, order_date: {order_date_str}")
         if not customer_name or not items or not order_date_str:
             logger.warning("Record sale attempt with missing customer_name, items, or order_date.")
             return {"error": "Missing customer name, items, or order date"}
+        item_error = self._item_errors(items)
+        if item_error:
+            logger.warning(f"Record sale attempt with malformed items: {item_error}")
+            return {"error": item_error}
 
         try:
-            customer_id = self._get_or_create_customer(customer_name, customer_email, customer_phone, shipping_address)
-            
-            try:
-                order_date = datetime.fromisoformat(order_date_str.replace("Z", "+00:00")) if isinstance(order_date_str, str) else order_date_str
-            except ValueError as ve:
-                logger.warning(f"Invalid order_date format: {order_date_str}. Error: {ve}")
-                return {"error": "Invalid order_date format. Use ISO format."}
-
-            total_amount = 0
-            processed_items = []
-            for item_idx, item_data in enumerate(items):
-                logger.debug(f"Processing sale item {item_idx + 1}: SKU {item_data.get("sku")}")
-                product_info = self._execute_query("SELECT product_id, unit_price, available_quantity FROM products p JOIN inventory_levels il ON p.product_id = il.product_id WHERE sku = %s", (item_data["sku"],), fetch_one=True)
-                if not product_info:
-                    logger.error(f"Product with SKU {item_data["sku"]} not found during sale recording.")
-                    return {"error": f"Product with SKU {item_data["sku"]} not found."}
-                
-                # Check stock
-                available_quantity = product_info[2]
-                if item_data["quantity"] > available_quantity:
-                    logger.error(f"Insufficient stock for SKU {item_data['sku']}. Requested: {item_data['quantity']}, Available: {available_quantity}")
-                    return {"error": f"Insufficient stock for SKU {item_data['sku']}. Available: {available_quantity}"}
-
-                item_price = item_data.get("price", float(product_info[1])) 
-                total_amount += item_data["quantity"] * item_price
-                processed_items.append({
-                    "product_id": product_info[0],
-                    "sku": item_data["sku"],
-                    "quantity": item_data["quantity"],
-                    "unit_price_at_sale": item_price
-                })
-            logger.debug(f"Calculated total_amount: {total_amount} for the sale.")
-
-            order_number_prefix = datetime.now().strftime("%Y%m%d%H%M%S")
-            last_id_row = self._execute_query("SELECT MAX(order_id) FROM sales_orders", fetch_one=True)
-            next_id = (last_id_row[0] if last_id_row and last_id_row[0] is not None else 0) + 1
-            order_number = f"SO-{order_number_prefix}-{next_id}"
-            logger.info(f"Generated order_number: {order_number}")
-
-            sql_insert_order = """
-                INSERT INTO sales_orders (order_number, customer_id, order_date, total_amount, status, 
-                                        shipping_address_line1, shipping_city, shipping_country)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING order_id;
-            """
-            sa = shipping_address or {}
-            order_id_row = self._execute_query(sql_insert_order, (
-                order_number, customer_id, order_date, total_amount, status,
-                sa.get("address_line1"), sa.get("city"), sa.get("country")
-            ), commit=True, fetch_one=True)
-
-            if not order_id_row:
-                logger.error("Failed to create sales order after generating order_number.")
-                raise Exception("Failed to create sales order.")
-            order_id = order_id_row[0]
-            logger.info(f"Sales order created with order_id: {order_id}")
-
-            for item in processed_items:
-                sql_insert_item = """
-                    INSERT INTO sales_order_items (order_id, product_id, sku, quantity, unit_price, line_total)
-                    VALUES (%s, %s, %s, %s, %s, %s);
-                """
-                line_total = item["quantity"] * item["unit_price_at_sale"]
-                self._execute_query(sql_insert_item, (
-                    order_id, item["product_id"], item["sku"], item["quantity"], item["unit_price_at_sale"], line_total
-                ), commit=True)
-                logger.debug(f"Inserted sales_order_item for order_id {order_id}, product_id {item['product_id']}")
-
-                sql_update_inventory = """
-                    UPDATE inventory_levels 
-                    SET available_quantity = available_quantity - %s 
-                    WHERE product_id = %s;
+            order_date = self._parse_order_date(order_date_str)
+        except ValueError as ve:
+            logger.warning(f"Invalid order_date format: {order_date_str}. Error: {ve}")
+            return {"error": "Invalid order_date format. Use ISO format."}
+
+        try:
+            with transaction() as cur:
+                products_by_sku = self._lookup_products(cur, {item_data.get("sku") for item_data in items})
+                processed_items, total_amount, quantity_by_product, sku_by_product = self._price_items(items, products_by_sku)
+
+                self._decrement_inventory(cur, quantity_by_product, sku_by_product)
+
+                customer_id = self._get_or_create_customer(cur, customer_name, customer_email, customer_phone, shipping_address)
+
+                order_number = order_numbers.next_number(cur)
+                logger.info(f"Generated order_number: {order_number}")
+
+                sql_insert_order = """
+                    INSERT INTO sales_orders (order_number, customer_id, order_date, total_amount, status, 
+                                            shipping_address_line1, shipping_city, shipping_country)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING order_id;
                 """
-                self._execute_query(sql_update_inventory, (item["quantity"], item["product_id"]), commit=True)
-                logger.info(f"Inventory updated for product_id {item['product_id']} (SKU: {item['sku']}), quantity reduced by {item['quantity']}")
+                sa = shipping_address or {}
+                cur.execute(sql_insert_order, (
+                    order_number, customer_id, order_date, total_amount, status,
+                    sa.get("address_line1"), sa.get("city"), sa.get("country")
+                ))
+                order_id_row = cur.fetchone()
+                if not order_id_row:
+                    logger.error("Failed to create sales order after generating order_number.")
+                    raise Exception("Failed to create sales order.")
+                order_id = order_id_row[0]
+                logger.info(f"Sales order created with order_id: {order_id}")
 
-            return self.get_sale_by_id(order_id)
+                self._insert_order_items(cur, [(order_id, item) for item in processed_items])
+                bump_versions(cur, "sales", "products")
+
+            product_cache.invalidate(sku_by_product.values())
+            return self._get_sale(order_id)
+        except InvalidOrderError as ioe:
+            return {"error": str(ioe)}
+        except InsufficientStockError as ise:
+            logger.warning(f"Sale for customer {customer_name} rejected, insufficient stock for SKUs: {ise.short_skus}")
+            return {"error": str(ise), "short_skus": ise.short_skus}
         except Exception as e:
             logger.error(f"Error in record_sale for customer {customer_name}: {str(e)}", exc_info=True)
             # Ensure a dictionary with an error key is returned for consistency if an unhandled exception occurs
             return {"error": f"An unexpected error occurred: {str(e)}"}
 
+    @traced
+    def _resolve_customers(self, cur, customers):
+        """Finds or creates many customers with at most two statements.
+
+        customers maps (customer_name, email) to (phone, address_details). Matching
+        follows _get_or_create_customer: an existing customer with the same name or
+        email is reused. Returns {(customer_name, email): customer_id}.
+        """
+        names = list({name for name, _ in customers})
+        emails = list({email for _, email in customers if email})
+        cur.execute("""
+            SELECT customer_id, customer_name, email FROM customers
+            WHERE customer_name = ANY(%s) OR email = ANY(%s)
+            ORDER BY customer_id;
+        """, (names, emails))
+        by_name, by_email = {}, {}
+        for customer_id, name, email in cur.fetchall():
+            by_name.setdefault(name, customer_id)
+            if email:
+                by_email.setdefault(email, customer_id)
+
+        resolved = {}
+        pending = [] # Customers to create, deduplicated by name and by email
+        pending_keys = {}
+        pending_by_name, pending_by_email = {}, {}
+        for (name, email), (phone, address_details) in customers.items():
+            customer_id = by_name.get(name) or (by_email.get(email) if email else None)
+            if customer_id:
+                resolved[(name, email)] = customer_id
+                continue
+            index = pending_by_name.get(name)
+            if index is None and email:
+                index = pending_by_email.get(email)
+            if index is None:
+                addr = address_details or {}
+                index = len(pending)
+                pending.append((name, email, phone, addr.get("address_line1"), addr.get("city"), addr.get("country")))
+                pending_by_name[name] = index
+                if email:
+                    pending_by_email[email] = index
+            pending_keys[(name, email)] = index
+
+        if pending:
+            created_rows = execute_values(cur, """
+                INSERT INTO customers (customer_name, email, phone, address_line1, city, country)
+                VALUES %s RETURNING customer_id, customer_name;
+            """, pending, page_size=len(pending), fetch=True)
+            created_ids = {name: customer_id for customer_id, name in created_rows}
+            logger.info(f"Created {len(created_ids)} new customers for the batch.")
+            for key, index in pending_keys.items():
+                resolved[key] = created_ids[pending[index][0]]
+        return resolved
+
+    @traced
+    def record_sales_batch(self, orders):
+        """Records many sales orders in one transaction with a fixed number of statements.
+
+        Customers and SKUs are resolved in bulk, stock is locked once in
+        product_id order and allocated to the orders in input order, headers and
+        lines are written with multi-row INSERTs, and the combined inventory
+        deltas are applied with one guarded update. Orders that fail validation
+        or cannot be fully allocated are rejected individually; the result lists
+        one entry per input order, in order.
+        """
+        logger.info(f"Attempting to record sales batch with {len(orders)} orders.")
+        results = [None] * len(orders)
+        candidates = []
+        for index, order in enumerate(orders):
+            if not isinstance(order, dict) or not order.get("customer_name") or not order.get("items") or not order.get("order_date"):
+                results[index] = {"index": index, "error": "Missing customer name, items, or order date"}
+                continue
+            item_error = self._item_errors(order["items"])
+            if item_error:
+                results[index] = {"index": index, "error": item_error}
+                continue
+            try:
+                order_date = self._parse_order_date(order["order_date"])
+            except ValueError:
+                results[index] = {"index": index, "error": "Invalid order_date format. Use ISO format."}
+                continue
+            candidates.append((index, order, order_date))
+
+        try:
+            with transaction() as cur:
+                skus = {item_data.get("sku") for _, order, _ in candidates for item_data in order["items"]}
+                products_by_sku = self._lookup_products(cur, skus) if skus else {}
+
+                priced = []
+                for index, order, order_date in candidates:
+                    try:
+                        priced.append((index, order, order_date, self._price_items(order["items"], products_by_sku)))
+                    except InvalidOrderError as ioe:
+                        results[index] = {"index": index, "error": str(ioe)}
+
+                product_ids = sorted({product_id for *_, pricing in priced for product_id in pricing[2]})
+                available = {}
+                if product_ids:
+                    cur.execute("""
+                        SELECT product_id, available_quantity FROM inventory_levels
+                        WHERE product_id = ANY(%s)
+                        ORDER BY product_id
+                        FOR UPDATE;
+                    """, (product_ids,))
+                    available = dict(cur.fetchall())
+
+                accepted = []
+                combined_quantities = {}
+                combined_skus = {}
+                for index, order, order_date, pricing in priced:
+                    processed_items, total_amount, quantity_by_product, sku_by_product = pricing
+                    short_skus = [sku_by_product[product_id] for product_id, quantity in quantity_by_product.items()
+                                  if available.get(product_id, 0) < quantity]
+                    if short_skus:
+                        results[index] = {"index": index, "error": str(InsufficientStockError(short_skus)), "short_skus": short_skus}
+                        continue
+                    for product_id, quantity in quantity_by_product.items():
+                        available[product_id] -= quantity
+                        combined_quantities[product_id] = combined_quantities.get(product_id, 0) + quantity
+                    combined_skus.update(sku_by_product)
+                    accepted.append((index, order, order_date, processed_items, total_amount))
+
+                if accepted:
+                    self._decrement_inventory(cur, combined_quantities, combined_skus)
+
+                    customer_ids = self._resolve_customers(cur, {
+                        (order["customer_name"], order.get("customer_email")): (order.get("customer_phone"), order.get("shipping_address"))
+                        for _, order, *_ in accepted
+                    })
+
+                    headers = []
+                    for index, order, order_date, processed_items, total_amount in accepted:
+                        sa = order.get("shipping_address") or {}
+                        headers.append((
+                            order_numbers.next_number(cur), customer_ids[(order["customer_name"], order.get("customer_email"))],
+                            order_date, total_amount, order.get("status", "Pending"),
+                            sa.get("address_line1"), sa.get("city"), sa.get("country")
+                        ))
+                    order_rows = execute_values(cur, """
+                        INSERT INTO sales_orders (order_number, customer_id, order_date, total_amount, status,
+                                                  shipping_address_line1, shipping_city, shipping_country)
+                        VALUES %s RETURNING order_number, order_id;
+                    """, headers, page_size=len(headers), fetch=True)
+                    order_ids = dict(order_rows)
+
+                    lines = []
+                    for (index, order, order_date, processed_items, total_amount), header in zip(accepted, headers):
+                        order_id = order_ids[header[0]]
+                        lines.extend((order_id, item) for item in processed_items)
+                        results[index] = {"index": index, "order_id": order_id, "order_number": header[0], "total_amount": total_amount}
+                    self._insert_order_items(cur, lines)
+                    bump_versions(cur, "sales", "products")
+
+            created = sum(1 for result in results if "order_id" in result)
+            if created:
+                product_cache.invalidate(combined_skus.values())
+            logger.info(f"Sales batch recorded. Created: {created}, rejected: {len(orders) - created}")
+            return {"created": created, "rejected": len(orders) - created, "results": results}
+        except Exception as e:
+            logger.error(f"Error in record_sales_batch: {str(e)}", exc_info=True)
+            raise
+
+    @traced
+    @read_only
     def get_all_sales(self):
         logger.info("Fetching all sales orders.")
-        sql = """
-            SELECT 
-                so.order_id, so.order_number, c.customer_name, so.order_date, 
-                so.total_amount, so.status,
-                so.shipping_address_line1, so.shipping_city, so.shipping_country
-            FROM sales_orders so
-            JOIN customers c ON so.customer_id = c.customer_id
-            ORDER BY so.order_date DESC;
-        """
+        sql = SALE_SUMMARY_SELECT + " ORDER BY so.order_date DESC, so.order_id DESC;"
         try:
             rows = self._execute_query(sql, fetch_all=True)
-            orders = []
-            if rows:
-                for row in rows:
-                    orders.append({
-                        "order_id": row[0],
-                        "order_number": row[1],
-                        "customer_name": row[2],
-                        "order_date": row[3].isoformat() if row[3] else None,
-                        "total_amount": float(row[4]) if row[4] is not None else None,
-                        "status": row[5],
-                        "shipping_address_line1": row[6],
-                        "shipping_city": row[7],
-                        "shipping_country": row[8],
-                    })
+            orders = RowSet(SALE_SUMMARY_COLUMNS, rows)
             logger.info(f"Retrieved {len(orders)} sales orders.")
             return orders
         except Exception as e:
             logger.error(f"Error in get_all_sales: {str(e)}", exc_info=True)
             raise
 
+    @traced
+    @read_only
+    def list_sales(self, limit, after=None):
+        """Returns one page of sales orders, newest first, ordered by (order_date, order_id) DESC.
+
+        after is the opaque next_cursor of the previous page; each page is an
+        index range scan on idx_sales_orders_date_id.
+        """
+        logger.info(f"Fetching sales orders page. limit: {limit}, after: {after}")
+        params = []
+        where = ""
+        if after:
+            where = " WHERE (so.order_date, so.order_id) < (%s, %s)"
+            params.extend(decode_cursor(after, 2))
+        sql = SALE_SUMMARY_SELECT + where + " ORDER BY so.order_date DESC, so.order_id DESC LIMIT %s;"
+        params.append(limit + 1)
+        try:
+            rows = self._execute_query(sql, tuple(params), fetch_all=True)
+            page = build_page(RowSet(SALE_SUMMARY_COLUMNS, rows), limit, ("order_date", "order_id"))
+            logger.info(f"Retrieved {len(page['items'])} sales orders for page.")
+            return page
+        except Exception as e:
+            logger.error(f"Error in list_sales: {str(e)}", exc_info=True)
+            raise
+
+    @read_only
+    def export_sales(self, itersize=None):
+        """Yields every sales order as a dict of raw column values through a server-side cursor, in list order."""
+        logger.info(f"Exporting all sales orders. itersize: {itersize}")
+        sql = SALE_SUMMARY_SELECT + " ORDER BY so.order_date DESC, so.order_id DESC;"
+        return (dict(zip(SALE_SUMMARY_COLUMNS, row)) for row in stream_rows(sql, itersize=itersize))
+
+    def _fetch_sale_details(self, order_ids):
+        """Loads full details of the given orders with one statement; returns {order_id: details}."""
+        rows = self._execute_query(SALE_DETAILS_SQL, (order_ids, order_ids), fetch_all=True)
+        details = {}
+        for row in rows or []:
+            order_details = map_row(SALE_DETAIL_COLUMNS, row[:7])
+            order_details["shipping_address"] = map_row(SHIPPING_ADDRESS_COLUMNS, row[7:13])
+            order_details["notes"] = row[13]
+            order_details["items"] = map_rows(SALE_ITEM_COLUMNS, row[14])
+            details[row[0]] = order_details
+        return details
+
+    @traced
+    @read_only
+    def get_sales_by_ids(self, order_ids):
+        """Returns the full details of many sales orders, in the order of order_ids.
+
+        Ids that do not exist are left out. Headers and lines of all orders
+        are read with a single statement.
+        """
+        logger.info(f"Fetching {len(order_ids)} sales orders by id.")
+        try:
+            details = self._fetch_sale_details(list(order_ids))
+            orders = [details[order_id] for order_id in order_ids if order_id in details]
+            logger.info(f"Retrieved {len(orders)} of {len(order_ids)} requested sales orders.")
+            return orders
+        except Exception as e:
+            logger.error(f"Error in get_sales_by_ids: {str(e)}", exc_info=True)
+            raise
+
+    @traced
+    @read_only
     def get_sale_by_id(self, order_id):
+        return self._get_sale(order_id)
+
+    def _get_sale(self, order_id):
+        # Not @read_only: the write paths read their own changes back through it, from the primary.
         logger.info(f"Fetching sale by order_id: {order_id}")
-        sql_order = """
-            SELECT 
-                so.order_id, so.order_number, c.customer_name, c.email as customer_email, so.order_date, 
-                so.total_amount, so.status,
-                so.shipping_address_line1, so.shipping_address_line2, so.shipping_city, 
-                so.shipping_state_province, so.shipping_postal_code, so.shipping_country, so.notes
-            FROM sales_orders so
-            JOIN customers c ON so.customer_id = c.customer_id
-            WHERE so.order_id = %s;
-        """
         try:
-            order_row = self._execute_query(sql_order, (order_id,), fetch_one=True)
-            if not order_row:
+            order_id = int(order_id) # Routes pass the id as a string
+        except (TypeError, ValueError):
+            logger.warning(f"Sale not found for order_id: {order_id!r}")
+            return None
+        try:
+            order_details = self._fetch_sale_details([order_id]).get(order_id)
+            if not order_details:
                 logger.warning(f"Sale not found for order_id: {order_id}")
                 return None
-
-            order_details = {
-                "order_id": order_row[0],
-                "order_number": order_row[1],
-                "customer_name": order_row[2],
-                "customer_email": order_row[3],
-                "order_date": order_row[4].isoformat() if order_row[4] else None,
-                "total_amount": float(order_row[5]) if order_row[5] is not None else None,
-                "status": order_row[6],
-                "shipping_address": {
-                    "line1": order_row[7],
-                    "line2": order_row[8],
-                    "city": order_row[9],
-                    "state_province": order_row[10],
-                    "postal_code": order_row[11],
-                    "country": order_row[12]
-                },
-                "notes": order_row[13],
-                "items": []
-            }
-
-            sql_items = """
-                SELECT soi.order_item_id, soi.product_id, p.product_name, soi.sku, 
-                       soi.quantity, soi.unit_price, soi.line_total
-                FROM sales_order_items soi
-                JOIN products p ON soi.product_id = p.product_id
-                WHERE soi.order_id = %s;
-            """
-            item_rows = self._execute_query(sql_items, (order_id,), fetch_all=True)
-            if item_rows:
-                for item_row in item_rows:
-                    order_details["items"].append({
-                        "order_item_id": item_row[0],
-                        "product_id": item_row[1],
-                        "product_name": item_row[2],
-                        "sku": item_row[3],
-                        "quantity": item_row[4],
-                        "unit_price": float(item_row[5]) if item_row[5] is not None else None,
-                        "line_total": float(item_row[6]) if item_row[6] is not None else None
-                    })
             logger.info(f"Successfully retrieved sale details for order_id: {order_id}")
             return order_details
         except Exception as e:
             logger.error(f"Error in get_sale_by_id for order_id {order_id}: {str(e)}", exc_info=True)
             raise
 
+    @traced
     def update_sale_status(self, order_id, new_status):
         logger.info(f"Attempting to update status for sale order_id: {order_id} to {new_status}")
         sql = "UPDATE sales_orders SET status = %s, updated_at = CURRENT_TIMESTAMP WHERE order_id = %s RETURNING order_id;"
         try:
-            updated_row = self._execute_query(sql, (new_status, order_id), commit=True, fetch_one=True)
+            with transaction() as cur:
+                cur.execute(sql, (new_status, order_id))
+                updated_row = cur.fetchone()
+                if updated_row:
+                    bump_versions(cur, "sales")
             if updated_row:
                 logger.info(f"Sale order_id: {order_id} status updated to {new_status}")
-                return self.get_sale_by_id(order_id)
+                return self._get_sale(order_id)
             logger.warning(f"Failed to update status for sale order_id: {order_id} (not found or no change)")
             return None
         except Exception as e:
             logger.error(f"Error in update_sale_status for order_id {order_id}: {str(e)}", exc_info=True)
             raise
 
+    @traced
     def delete_sale(self, order_id):
         logger.info(f"Attempting to delete sale order_id: {order_id}")
-        conn = self._get_connection()
         try:
-            with conn.cursor() as cur:
-                sale_info = self.get_sale_by_id(order_id) # Uses its own logging
-                if not sale_info:
-                    logger.warning(f"Delete failed: Sale not found for order_id: {order_id}")
-                    return False
+            sale_info = self._get_sale(order_id) # Uses its own logging
+            if not sale_info:
+                logger.warning(f"Delete failed: Sale not found for order_id: {order_id}")
+                return False
 
+            with transaction() as cur:
                 logger.info(f"Reverting inventory for items in deleted sale order_id: {order_id}")
                 for item in sale_info.get("items", []):
                     sql_revert_inventory = """
@@ -327,19 +607,13 @@ class SalesService:
                 logger.info(f"Deleted sales_order_items for order_id: {order_id}")
                 cur.execute("DELETE FROM sales_orders WHERE order_id = %s", (order_id,))
                 logger.info(f"Deleted sales_order for order_id: {order_id}")
-                conn.commit()
-                logger.info(f"Sale order_id: {order_id} and its items deleted successfully, inventory reverted.")
-                return True
+                bump_versions(cur, "sales", "products")
+            product_cache.invalidate(item["sku"] for item in sale_info.get("items", []))
+            logger.info(f"Sale order_id: {order_id} and its items deleted successfully, inventory reverted.")
+            return True
         except Exception as e:
             logger.error(f"Error deleting sale {order_id}: {str(e)}", exc_info=True)
-            if conn:
-                conn.rollback()
-                logger.info(f"Transaction rolled back for delete_sale order_id: {order_id}")
             raise
-        finally:
-            if conn:
-                self._put_connection(conn)
-        return False # Should not be reached if exception is raised
 
 logger.info("Sales Management Module (sales_service.py) Loaded with DB integration and logging.")
 
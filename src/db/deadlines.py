@@ -0,0 +1,112 @@
+# Request deadlines: a time budget enforced at pool checkout and as each transaction's statement_timeout
+
+import time
+import logging
+from contextvars import ContextVar
+
+from psycopg2.extensions import STATUS_READY, cursor as _plain_cursor
+
+# Configure logger for this module
+logger = logging.getLogger(__name__)
+
+# The deadline of the current request; None when the caller has no time budget.
+_current_deadline = ContextVar("erp_deadline", default=None)
+
+
+class DeadlineExceededError(Exception):
+    """Raised when the current request's time budget ran out before its database work could run."""
+
+
+class Deadline:
+    """A time budget that started when the request arrived."""
+
+    __slots__ = ("budget_ms", "expires_at", "exceeded")
+
+    def __init__(self, budget_ms):
+        self.budget_ms = budget_ms
+        self.expires_at = time.monotonic() + budget_ms / 1000.0
+        self.exceeded = None # Where the budget ran out: "checkout" or "statement"
+
+    def remaining(self):
+        return self.expires_at - time.monotonic()
+
+
+def current_deadline():
+    return _current_deadline.get()
+
+
+def set_deadline(budget_ms):
+    """Starts a deadline for the current context; returns the token for clear_deadline()."""
+    return _current_deadline.set(Deadline(budget_ms))
+
+
+def clear_deadline(token):
+    try:
+        _current_deadline.reset(token)
+    except ValueError:
+        _current_deadline.set(None) # Cleared from a different context than the one it was set in
+
+
+def expire(stage):
+    """Marks the current deadline as exceeded at `stage` and raises DeadlineExceededError."""
+    deadline = _current_deadline.get()
+    deadline.exceeded = stage
+    raise DeadlineExceededError(f"Request exceeded its {deadline.budget_ms} ms deadline ({stage}).")
+
+
+def checkout_timeout(default):
+    """How long a pool checkout may wait: `default`, shortened to what is left of the deadline."""
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return default
+    remaining = deadline.remaining()
+    if remaining <= 0:
+        expire("checkout")
+    return min(default, remaining)
+
+
+def deadline_passed():
+    deadline = _current_deadline.get()
+    return deadline is not None and deadline.remaining() <= 0
+
+
+def statement_timeout_sql(conn):
+    """The SET LOCAL that limits the transaction about to start on conn to what is left of the deadline.
+
+    None when there is no deadline or conn is already inside a transaction
+    (its first statement carried the SET). The caller sends it in the same
+    round trip as that first statement; SET LOCAL then lasts until the
+    transaction commits or rolls back, so the server cancels any statement
+    in it that would run past the deadline.
+    """
+    deadline = _current_deadline.get()
+    if deadline is None or conn.status != STATUS_READY:
+        return None
+    remaining_ms = int(deadline.remaining() * 1000)
+    if remaining_ms < 1: # statement_timeout = 0 would mean no limit at all
+        expire("statement")
+    return f"SET LOCAL statement_timeout = {remaining_ms}; "
+
+
+def apply_statement_timeout(conn):
+    """Sets the statement timeout in a round trip of its own, for statements it cannot be prepended to.
+
+    A plain cursor keeps the SET out of the statement metrics and the slow-query log.
+    """
+    sql = statement_timeout_sql(conn)
+    if sql is not None:
+        with conn.cursor(cursor_factory=_plain_cursor) as cur:
+            cur.execute(sql)
+
+
+def statement_cancelled():
+    """Records that the server cancelled a statement because the deadline ran out.
+
+    A cancel while budget is left (another timeout, an operator's
+    pg_cancel_backend) is not the deadline's doing and is not recorded.
+    """
+    deadline = _current_deadline.get()
+    # Tolerance: the timeout was truncated to whole milliseconds when it was set.
+    if deadline is not None and deadline.exceeded is None and deadline.remaining() < 0.005:
+        deadline.exceeded = "statement"
+        logger.warning(f"Statement cancelled by the {deadline.budget_ms} ms request deadline.")
@@ -0,0 +1,74 @@
+# Cursor factory that reports every statement to the metrics registry and the slow-query log
+
+import time
+
+from psycopg2.extensions import cursor as _cursor
+
+from src.db.deadlines import apply_statement_timeout, statement_timeout_sql
+from src.db.prepared import HotQuery, execute_prepared
+from src.observability.metrics import record_statement
+from src.observability.slow_queries import slow_query_log
+from src.observability.statements import statement_fingerprint
+from src.observability.tracing import record_span
+
+
+class InstrumentedCursor(_cursor):
+    """Cursor that records execution time, row counts and errors for every statement.
+
+    Installed as the pool's cursor_factory, so it covers execute_query,
+    transaction() blocks, execute_values and named (server-side) cursors.
+    Statements over SLOW_QUERY_MS are handed to the slow-query log, and
+    traced requests get one span per statement. Registered hot queries
+    (src/db/prepared.py) run as EXECUTE of a per-connection prepared statement.
+    Under a request deadline the first statement of each transaction carries
+    the SET LOCAL statement_timeout (src/db/deadlines.py) in the same round trip.
+    """
+
+    def _with_timeout(self, query):
+        # Returns query with the deadline's SET LOCAL in front when it opens a transaction.
+        timeout_sql = statement_timeout_sql(self.connection)
+        if timeout_sql is None:
+            return query
+        if self.name is None:
+            if isinstance(query, str):
+                return timeout_sql + query
+            if isinstance(query, bytes): # e.g. execute_values pages
+                return timeout_sql.encode() + query
+        # Server-side cursors wrap the query in DECLARE, and composed SQL is not text yet.
+        apply_statement_timeout(self.connection)
+        return query
+
+    def _execute_with_timeout(self, query, vars=None):
+        # For execute_prepared: the first statement it sends (PREPARE, DEALLOCATE or EXECUTE) carries the SET.
+        return super().execute(self._with_timeout(query), vars)
+
+    def _record(self, query, params, started, failed):
+        elapsed = time.perf_counter() - started
+        fingerprint = statement_fingerprint(query)
+        record_statement(fingerprint, elapsed, self.rowcount, failed)
+        slow_query_log.observe(query, params, elapsed)
+        record_span("db " + fingerprint, started, elapsed, {"rows": self.rowcount, "failed": failed})
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        failed = True
+        try:
+            if type(query) is HotQuery:
+                result = execute_prepared(self, query, vars, self._execute_with_timeout)
+            else:
+                result = super().execute(self._with_timeout(query), vars)
+            failed = False
+            return result
+        finally:
+            self._record(query, vars, started, failed)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = super().executemany(self._with_timeout(query), vars_list)
+            failed = False
+            return result
+        finally:
+            # The parameter list can be arbitrarily long, so it is not logged.
+            self._record(query, None, started, failed)
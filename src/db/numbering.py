@@ -0,0 +1,74 @@
+# Sequence-backed document number generation (sales orders, purchase orders, ...)
+
+import os
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+
+from src.db.pool import connection
+
+# Configure logger for this module
+logger = logging.getLogger(__name__)
+
+DEFAULT_BLOCK_SIZE = 20
+
+
+class NumberGenerator:
+    """Hands out formatted document numbers backed by a PostgreSQL sequence.
+
+    Numbers are reserved from the sequence in blocks of block_size with a single
+    round trip, then handed out from memory, so most calls never touch the
+    database. Numbers reserved by a worker that exits are skipped, which leaves
+    gaps but never duplicates.
+
+    The format is a str.format template with the fields:
+        number     the sequence value
+        timestamp  the current time as YYYYmmddHHMMSS
+        date       the current datetime, e.g. "{date:%Y%m}"
+    """
+
+    def __init__(self, sequence_name, number_format, block_size=None):
+        self.sequence_name = sequence_name
+        self.number_format = number_format
+        self.block_size = block_size or int(os.getenv("DOCUMENT_NUMBER_BLOCK_SIZE", DEFAULT_BLOCK_SIZE))
+        if self.block_size < 1:
+            raise ValueError(f"block_size must be positive, got {self.block_size}")
+        self._numbers = deque()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _reserve_block(self, cur):
+        cur.execute("SELECT nextval(%s::regclass) FROM generate_series(1, %s);", (self.sequence_name, self.block_size))
+        self._numbers.extend(row[0] for row in cur.fetchall())
+        logger.debug(f"Reserved {self.block_size} numbers from {self.sequence_name}.")
+
+    def next_value(self, cur=None):
+        """Returns the next raw sequence value.
+
+        A cursor from the caller's transaction is used for the refill when given;
+        sequence values are not transactional, so a rollback never reuses them.
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                # Numbers reserved before a fork would be handed out by every child.
+                self._numbers.clear()
+                self._pid = os.getpid()
+            if not self._numbers:
+                if cur is not None:
+                    self._reserve_block(cur)
+                else:
+                    with connection() as conn:
+                        with conn.cursor() as own_cur:
+                            self._reserve_block(own_cur)
+                        conn.commit()
+            return self._numbers.popleft()
+
+    def next_number(self, cur=None):
+        """Returns the next formatted document number."""
+        now = datetime.now()
+        return self.number_format.format(
+            number=self.next_value(cur),
+            timestamp=now.strftime("%Y%m%d%H%M%S"),
+            date=now,
+        )
@@ -0,0 +1,57 @@
+# Keyset (cursor) pagination helpers for the list endpoints
+
+import json
+import base64
+import binascii
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a client sends a malformed page size or cursor."""
+
+
+def encode_cursor(values):
+    """Encodes the sort-key values of the last row on a page as an opaque token."""
+    payload = json.dumps(list(values), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, key_count):
+    """Decodes a token produced by encode_cursor into its key_count sort-key values."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError, binascii.Error) as e:
+        raise InvalidCursorError(f"Invalid pagination cursor: {cursor!r}") from e
+    if not isinstance(values, list) or len(values) != key_count:
+        raise InvalidCursorError(f"Invalid pagination cursor: {cursor!r}")
+    return values
+
+
+def parse_limit(limit):
+    """Validates a requested page size, defaulting and clamping it to MAX_PAGE_SIZE."""
+    if limit is None or limit == "":
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError) as e:
+        raise InvalidCursorError(f"Invalid page size: {limit!r}") from e
+    if limit < 1:
+        raise InvalidCursorError(f"Invalid page size: {limit!r}")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def build_page(items, limit, key_fields):
+    """Builds the page payload from up to limit + 1 fetched items.
+
+    The extra row only signals that another page exists; the cursor is taken
+    from the key_fields of the last item actually returned.
+    """
+    has_more = len(items) > limit
+    items = items[:limit]
+    next_cursor = None
+    if has_more and items:
+        next_cursor = encode_cursor(items[-1][field] for field in key_fields)
+    return {"items": items, "next_cursor": next_cursor}
@@ -0,0 +1,443 @@
+# Shared Database Access Layer - connection pool, connections and transactions
+
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import psycopg2
+from psycopg2 import pool
+from psycopg2.errors import QueryCanceled
+
+from src.db.deadlines import checkout_timeout, deadline_passed, expire, statement_cancelled
+from src.db.instrumentation import InstrumentedCursor
+from src.db.prepared import PREPARED_STATEMENTS, PreparingConnection
+from src.db.replicas import choose_replica, note_write, set_serving_replica, clear_serving_replica
+from src.observability.metrics import registry, pool_checkout_wait, pool_checkout_errors, pool_checkout_rejections, replica_reads
+from src.observability.tracing import record_span
+
+# Configure logger for this module
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIN_CONN = 1
+DEFAULT_MAX_CONN = 20
+DEFAULT_CHECKOUT_TIMEOUT = 2.0
+DEFAULT_MAX_WAITERS = 100
+# Every pooled connection records its statements and, unless DB_PREPARED_STATEMENTS is off,
+# keeps a prepared-statement cache for hot queries.
+_CONNECT_ARGS = {"cursor_factory": InstrumentedCursor,
+                 "connection_factory": PreparingConnection if PREPARED_STATEMENTS else None}
+
+_pool = None
+_pool_pid = None # Process that created _pool
+# Guards creating, replacing and closing _pool. get_pool() checks for a pool without
+# it and again under it, so concurrent first callers create exactly one pool; an
+# RLock because get_pool() calls init_pool(), which takes it too.
+_pool_lock = threading.RLock()
+_slots = None # BoundedSemaphore(max_conn): a checkout waits here instead of failing when the pool is exhausted
+_waiting = 0
+_waiting_lock = threading.Lock()
+# Set when this request had a checkout rejected, so the web layer can answer 503 even
+# if a service or view turned the error into its own response.
+_checkout_rejected = ContextVar("erp_checkout_rejected", default=False)
+_replica_pools = {} # Replica name -> (pool, slots), opened on first use by the process that owns _pool
+# Pools inherited across a fork. Their sockets are shared with the parent, so the
+# child must neither use nor close them; they are only kept referenced here.
+_inherited_pools = []
+
+
+class RetainingConnectionPool(pool.ThreadedConnectionPool):
+    """ThreadedConnectionPool that keeps every returned connection open.
+
+    psycopg2 closes a connection on putconn() whenever minconn connections are
+    already idle, so with a small minconn a busy pool reconnects on almost
+    every checkout and loses each session's prepared statements. Here minconn
+    is only how many connections are opened up front (kept as initial_conn);
+    once opened, up to maxconn stay in the pool.
+    """
+
+    def __init__(self, minconn, maxconn, *args, **kwargs):
+        super().__init__(minconn, maxconn, *args, **kwargs)
+        self.initial_conn = minconn
+        self.minconn = maxconn # _putconn keeps a returned connection while fewer than minconn are idle
+
+
+class PoolSaturatedError(pool.PoolError):
+    """Raised when no pooled connection became free within the checkout timeout,
+    or when too many callers are already waiting for one."""
+
+
+def _env_float(name, default):
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        logger.warning(f"Invalid number for {name}: {value!r}. Falling back to {default}.")
+        return default
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning(f"Invalid integer for {name}: {value!r}. Falling back to {default}.")
+        return default
+
+
+CHECKOUT_TIMEOUT = _env_float("DB_POOL_CHECKOUT_TIMEOUT", DEFAULT_CHECKOUT_TIMEOUT)
+MAX_WAITERS = _env_int("DB_POOL_MAX_WAITERS", DEFAULT_MAX_WAITERS)
+
+
+def init_pool(dsn=None, min_conn=None, max_conn=None):
+    """Creates the process-wide connection pool.
+
+    Args:
+        dsn: PostgreSQL DSN. Defaults to the DATABASE_URL environment variable.
+        min_conn: Connections opened up front (DB_POOL_MIN_CONN, default 1). Connections
+            opened later on demand stay open too (see RetainingConnectionPool).
+        max_conn: Upper bound on open connections shared by every service (DB_POOL_MAX_CONN, default 20).
+    """
+    global _pool, _pool_pid, _slots
+    dsn = dsn or os.getenv("DATABASE_URL")
+    if not dsn:
+        logger.error("DATABASE_URL environment variable is not set.")
+        raise RuntimeError("DATABASE_URL environment variable is not set.")
+    min_conn = min_conn if min_conn is not None else _env_int("DB_POOL_MIN_CONN", DEFAULT_MIN_CONN)
+    max_conn = max_conn if max_conn is not None else _env_int("DB_POOL_MAX_CONN", DEFAULT_MAX_CONN)
+    if max_conn < 1 or min_conn < 0 or min_conn > max_conn:
+        raise ValueError(f"Invalid pool bounds: min_conn={min_conn}, max_conn={max_conn}")
+
+    with _pool_lock:
+        _discard_pools()
+        _pool = RetainingConnectionPool(min_conn, max_conn, dsn=dsn, **_CONNECT_ARGS)
+        _slots = threading.BoundedSemaphore(max_conn)
+        _pool_pid = os.getpid()
+        logger.info(f"Shared database connection pool initialized (min={min_conn}, max={max_conn}, pid={_pool_pid}).")
+    return _pool
+
+
+def _discard_pools():
+    # Closes this process's pools; pools inherited across a fork are only set aside.
+    owned = _pool_pid == os.getpid()
+    for db_pool in ([_pool] if _pool is not None else []) + [entry[0] for entry in _replica_pools.values()]:
+        if owned:
+            db_pool.closeall()
+        else:
+            _inherited_pools.append(db_pool)
+    _replica_pools.clear()
+    return owned
+
+
+def get_pool():
+    """Returns the shared pool, creating it on first use.
+
+    A pool created before a fork is never used by the child: the first call
+    in a new process sets the inherited pool aside and opens a fresh one.
+    """
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            # Re-checked under the lock: concurrent first callers must not each
+            # create a pool, and init_pool() closes the one it replaces.
+            if _pool is None or _pool_pid != os.getpid():
+                try:
+                    init_pool()
+                except (RuntimeError, ValueError):
+                    raise
+                except Exception as e:
+                    logger.critical(f"Error initializing database connection pool: {e}", exc_info=True)
+                    raise ConnectionError("Database connection pool is not available.") from e
+    return _pool
+
+
+def close_pool():
+    """Closes every pooled connection. Safe to call when no pool exists."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            if _discard_pools():
+                logger.info("Shared database connection pool closed.")
+            _pool = None
+
+
+def warm_pool():
+    """Opens the pool and checks each of its DB_POOL_MIN_CONN connections with SELECT 1.
+
+    Run once per worker before it takes traffic, so the first requests do
+    not pay for connection setup. Returns the number of connections checked.
+    """
+    db_pool = get_pool()
+    conns = []
+    try:
+        for _ in range(max(db_pool.initial_conn, 1)):
+            conns.append(db_pool.getconn())
+        for conn in conns:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            conn.rollback()
+    finally:
+        for conn in conns:
+            db_pool.putconn(conn)
+    return len(conns)
+
+
+def check_database():
+    """Runs SELECT 1 on a pooled connection; raises when the database is unreachable."""
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1;")
+            cur.fetchone()
+        conn.rollback()
+
+
+def _pool_connections():
+    # ThreadedConnectionPool keeps checked-out connections in _used and idle ones in _pool.
+    db_pool = _pool
+    if db_pool is None or _pool_pid != os.getpid():
+        return
+    yield ("in_use",), len(db_pool._used)
+    yield ("idle",), len(db_pool._pool)
+    yield ("max",), db_pool.maxconn
+
+
+registry.gauge("erp_db_pool_connections", "Shared pool connections by state (in_use, idle) and the configured max.", ("state",), _pool_connections)
+registry.gauge("erp_db_pool_waiting", "Callers queued for a pooled connection.", (), lambda: [((), _waiting)])
+
+
+def _reject(reason, message):
+    pool_checkout_rejections.inc(reason)
+    _checkout_rejected.set(True)
+    raise PoolSaturatedError(message)
+
+
+def _acquire_slot(slots):
+    # Fast path: a connection is free. Otherwise join a bounded queue and wait up to
+    # DB_POOL_CHECKOUT_TIMEOUT (or what is left of the request deadline); past that,
+    # or with the queue full, fail fast so the caller can shed load instead of
+    # piling up threads.
+    global _waiting
+    if slots.acquire(blocking=False):
+        return
+    timeout = checkout_timeout(CHECKOUT_TIMEOUT)
+    with _waiting_lock:
+        if _waiting >= MAX_WAITERS:
+            queue_full = True
+        else:
+            queue_full = False
+            _waiting += 1
+    if queue_full:
+        _reject("queue_full", f"Connection pool saturated: {MAX_WAITERS} requests already waiting.")
+    try:
+        acquired = slots.acquire(timeout=timeout)
+    finally:
+        with _waiting_lock:
+            _waiting -= 1
+    if not acquired:
+        if deadline_passed():
+            expire("checkout")
+        _reject("timeout", f"No database connection became free within {CHECKOUT_TIMEOUT:g}s.")
+
+
+def checkout_rejected():
+    """True when a checkout was rejected in the current context (request) since the last reset."""
+    return _checkout_rejected.get()
+
+
+def reset_checkout_rejected():
+    _checkout_rejected.set(False)
+
+
+def _replica_pool(replica):
+    with _pool_lock:
+        entry = _replica_pools.get(replica.name)
+        if entry is None:
+            # minconn=0: creating the pool must not fail while the replica is down.
+            max_conn = _pool.maxconn
+            entry = (RetainingConnectionPool(0, max_conn, dsn=replica.dsn, **_CONNECT_ARGS),
+                     threading.BoundedSemaphore(max_conn))
+            _replica_pools[replica.name] = entry
+            logger.info(f"Replica connection pool initialized for {replica.name} (max={max_conn}).")
+        return entry
+
+
+def _replica_down(replica, error):
+    replica.mark_down(error)
+    replica_reads.inc("primary", "unhealthy")
+    with _pool_lock:
+        # Its idle connections are most likely dead too. Checkouts still in use
+        # return to the old pool, which is then dropped with them.
+        _replica_pools.pop(replica.name, None)
+
+
+def _checkout(db_pool, slots, attrs=None):
+    started = time.perf_counter()
+    _acquire_slot(slots)
+    try:
+        conn = db_pool.getconn()
+    except Exception:
+        slots.release()
+        pool_checkout_errors.inc()
+        raise
+    waited = time.perf_counter() - started
+    pool_checkout_wait.observe(waited)
+    record_span("db checkout", started, waited, attrs)
+    return conn
+
+
+def _release(db_pool, slots, conn):
+    discard = bool(conn.closed)
+    if not discard and conn.status != psycopg2.extensions.STATUS_READY:
+        try:
+            conn.rollback()
+        except Exception as rb_e:
+            logger.error(f"Error rolling back connection before release: {rb_e}", exc_info=True)
+            discard = True
+    db_pool.putconn(conn, close=discard)
+    slots.release()
+
+
+def _replica_checkout(replica):
+    """Checks a connection out of `replica`; returns (pool, slots, conn), or None to read from the primary.
+
+    A replica that refuses connections is skipped for REPLICA_RETRY_SECONDS;
+    one more than REPLICA_MAX_LAG_SECONDS behind is skipped until it catches up.
+    Saturation is not a reason to fall back: report load must not spill onto the primary.
+    """
+    db_pool, slots = _replica_pool(replica)
+    try:
+        conn = _checkout(db_pool, slots, {"replica": replica.name})
+    except psycopg2.OperationalError as e:
+        _replica_down(replica, e)
+        return None
+    try:
+        fresh = replica.fresh(conn)
+    except psycopg2.Error as e:
+        _release(db_pool, slots, conn)
+        _replica_down(replica, e)
+        return None
+    if not fresh:
+        _release(db_pool, slots, conn)
+        replica_reads.inc("primary", "lagging")
+        return None
+    replica_reads.inc(replica.name, "routed")
+    return db_pool, slots, conn
+
+
+@contextmanager
+def connection(replica=None):
+    """Checks a connection out of the shared pool and always returns it.
+
+    When every connection is in use the caller waits in a bounded queue (see
+    _acquire_slot) and gets PoolSaturatedError if none frees up in time.
+    Inside a @read_only service call the connection comes from a healthy,
+    caught-up replica when DATABASE_REPLICA_URLS is set (see src/db/replicas.py);
+    `replica` passes one chosen earlier, for work that runs after that call.
+    Under a request deadline (src/db/deadlines.py) each transaction started on
+    the connection gets a statement_timeout of the time left, sent with its
+    first statement, and a checkout after the deadline raises DeadlineExceededError.
+    An open transaction left behind by the caller is rolled back before the
+    connection goes back to the pool; broken connections are discarded.
+    """
+    db_pool = get_pool()
+    slots = _slots
+    replica = replica or choose_replica()
+    checkout = _replica_checkout(replica) if replica is not None else None
+    if checkout is not None:
+        db_pool, slots, conn = checkout
+    else:
+        replica = None
+        conn = _checkout(db_pool, slots)
+    serving = set_serving_replica(replica)
+    try:
+        if deadline_passed():
+            expire("checkout")
+        yield conn
+    except QueryCanceled:
+        statement_cancelled()
+        raise
+    finally:
+        clear_serving_replica(serving)
+        _release(db_pool, slots, conn)
+
+
+@contextmanager
+def transaction():
+    """Runs the enclosed statements as one transaction and yields a cursor.
+
+    Commits when the block exits normally and rolls back on any exception.
+    Callbacks registered with on_commit(cur, ...) run after the commit.
+    """
+    with connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                cur.commit_callbacks = []
+                yield cur
+            started = time.perf_counter()
+            conn.commit()
+            record_span("db commit", started, time.perf_counter() - started)
+            note_write()
+        except Exception:
+            try:
+                conn.rollback()
+                logger.info("Transaction rolled back due to error.")
+            except Exception as rb_e:
+                logger.error(f"Error during rollback: {rb_e}", exc_info=True)
+            raise
+    for callback in cur.commit_callbacks:
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"After-commit callback failed: {e}", exc_info=True)
+
+
+def on_commit(cur, callback):
+    """Runs callback once the transaction() that yielded cur has committed.
+
+    For in-process state derived from the data being written: dropped
+    earlier, a concurrent reader could fill it again from the old rows. A
+    rolled-back transaction skips its callbacks; a cursor from elsewhere
+    runs the callback straight away.
+    """
+    callbacks = getattr(cur, "commit_callbacks", None)
+    if callbacks is None:
+        callback()
+    else:
+        callbacks.append(callback)
+
+
+def execute_query(query, params=None, fetch_one=False, fetch_all=False, commit=False):
+    """Runs a single statement on a pooled connection.
+
+    With commit=True the statement is committed and, when fetch_one/fetch_all
+    is also set, the RETURNING rows are returned; otherwise the rowcount is.
+    """
+    logger.debug(f"Executing query: {query} with params: {params}")
+    try:
+        with connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(query, params)
+                result = None
+                if fetch_one:
+                    result = cur.fetchone()
+                    logger.debug(f"Query fetch_one result: {result}")
+                elif fetch_all:
+                    result = cur.fetchall()
+                    logger.debug(f"Query fetch_all results count: {len(result) if result else 0}")
+                if commit:
+                    started = time.perf_counter()
+                    conn.commit()
+                    record_span("db commit", started, time.perf_counter() - started)
+                    note_write()
+                    logger.debug(f"Query committed. {cur.rowcount} rows affected.")
+                    if not (fetch_one or fetch_all):
+                        return cur.rowcount
+                return result
+    except Exception as e:
+        logger.error(f"Database query error: {e} for query: {query} with params: {params}", exc_info=True)
+        raise
@@ -0,0 +1,134 @@
+# Per-connection prepared-statement cache for registered hot queries
+
+import os
+import re
+import logging
+from collections import OrderedDict
+
+from psycopg2 import errors
+from psycopg2.extensions import connection as _connection, cursor as _plain_cursor
+
+from src.observability.metrics import prepared_statements
+
+# Configure logger for this module
+logger = logging.getLogger(__name__)
+
+# Off for poolers in transaction mode (e.g. PgBouncer), where a session's prepared
+# statements are not guaranteed to be on the next transaction's server connection.
+PREPARED_STATEMENTS = os.getenv("DB_PREPARED_STATEMENTS", "true").strip().lower() in ("1", "true", "yes", "on")
+CACHE_SIZE = int(os.getenv("DB_PREPARED_CACHE_SIZE", 32))
+
+_PLACEHOLDER = re.compile(r"%%|%s|%\(")
+_hot_queries = {}
+
+
+def _to_positional(sql):
+    """Rewrites psycopg2's %s placeholders as PREPARE's $1..$n; returns (sql, parameter count)."""
+    count = 0
+
+    def replace(match):
+        nonlocal count
+        token = match.group(0)
+        if token == "%%":
+            return "%"
+        if token == "%(":
+            raise ValueError("Hot queries take positional %s parameters only.")
+        count += 1
+        return f"${count}"
+
+    return _PLACEHOLDER.sub(replace, sql), count
+
+
+class HotQuery(str):
+    """SQL text registered for preparation.
+
+    It is still the plain SQL string to everything else (logging, statement
+    fingerprints, the slow-query EXPLAIN, cursors that are not pooled), so a
+    registered query behaves exactly like the unregistered one when it is not
+    run through a PreparingConnection.
+    """
+
+    def __new__(cls, name, sql):
+        query = super().__new__(cls, sql)
+        query.name = name
+        query.statement = f"erp_{name}"
+        positional_sql, query.arity = _to_positional(sql.strip().rstrip(";"))
+        query.prepare_sql = f"PREPARE {query.statement} AS {positional_sql}"
+        placeholders = ", ".join(["%s"] * query.arity)
+        query.execute_sql = f"EXECUTE {query.statement} ({placeholders})" if query.arity else f"EXECUTE {query.statement}"
+        return query
+
+
+def hot_query(name, sql):
+    """Registers sql under name and returns it as a HotQuery for cursor.execute()/execute_query()."""
+    existing = _hot_queries.get(name)
+    if existing is not None and str(existing) != sql:
+        raise ValueError(f"Hot query name already registered with different SQL: {name}")
+    _hot_queries[name] = HotQuery(name, sql)
+    return _hot_queries[name]
+
+
+class PreparingConnection(_connection):
+    """Connection that remembers which hot queries it has prepared.
+
+    At most DB_PREPARED_CACHE_SIZE statements stay prepared; the least
+    recently used one is deallocated to make room. Prepared statements live
+    as long as the session, so the cache goes with the connection when the
+    pool discards it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = OrderedDict()
+        self.deallocate_pending = set() # Prepared server-side, but no longer usable
+
+    def reset(self):
+        # RESET ALL keeps prepared statements, so drop them with the cache.
+        super().reset()
+        with self.cursor(cursor_factory=_plain_cursor) as cur:
+            cur.execute("DEALLOCATE ALL")
+        self.rollback()
+        self.prepared.clear()
+        self.deallocate_pending.clear()
+        prepared_statements.inc("invalidated")
+
+
+def execute_prepared(cur, query, params, execute):
+    """Runs a HotQuery on cur as EXECUTE, preparing it first on this connection if needed.
+
+    `execute` is the cursor's own (uninstrumented) execute; the caller times
+    the call as one statement under the original SQL.
+    """
+    conn = cur.connection
+    cache = getattr(conn, "prepared", None)
+    if cache is None or cur.name is not None: # Not a PreparingConnection, or a server-side cursor
+        return execute(query, params)
+    statement = query.statement
+    if statement in cache:
+        cache.move_to_end(statement)
+    else:
+        if statement in conn.deallocate_pending:
+            execute(f"DEALLOCATE {statement}")
+            conn.deallocate_pending.discard(statement)
+        while len(cache) >= CACHE_SIZE:
+            evicted, _ = cache.popitem(last=False)
+            execute(f"DEALLOCATE {evicted}")
+            prepared_statements.inc("evicted")
+        execute(query.prepare_sql)
+        cache[statement] = query.name
+        prepared_statements.inc("prepared")
+    try:
+        return execute(query.execute_sql, params)
+    except errors.InvalidSqlStatementName:
+        # Deallocated behind the cache's back (e.g. DISCARD ALL); prepared again next time.
+        cache.pop(statement, None)
+        prepared_statements.inc("invalidated")
+        raise
+    except errors.FeatureNotSupported:
+        # "cached plan must not change result type" after a schema change; the
+        # transaction is aborted, so the statement is replaced on its next use.
+        cache.pop(statement, None)
+        conn.deallocate_pending.add(statement)
+        prepared_statements.inc("invalidated")
+        logger.warning(f"Prepared statement {statement} invalidated by a schema change; it will be prepared again.")
+        raise
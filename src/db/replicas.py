@@ -0,0 +1,178 @@
+# Read-replica routing: which database a read-only checkout goes to, replica health and lag
+
+import os
+import time
+import random
+import logging
+import functools
+import threading
+from contextvars import ContextVar
+
+from psycopg2.extensions import cursor as _plain_cursor, parse_dsn
+
+from src.observability.metrics import registry, replica_reads
+
+# Configure logger for this module
+logger = logging.getLogger(__name__)
+
+# One replica DSN or a comma-separated list of them; reads stay on the primary when unset.
+REPLICA_DSNS = [dsn.strip() for dsn in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if dsn.strip()]
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", 2))
+REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", 1))
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", 10))
+# A client that wrote keeps reading from the primary until no usable replica can be
+# missing that write: at most REPLICA_MAX_LAG_SECONDS behind, measured at most
+# REPLICA_CHECK_INTERVAL ago.
+STICKY_SECONDS = REPLICA_MAX_LAG_SECONDS + REPLICA_CHECK_INTERVAL
+
+# Replication lag in seconds; 0 when the standby has replayed everything it received
+# (an idle primary would otherwise look like a growing lag) or is not in recovery.
+LAG_QUERY = """
+    SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END;
+"""
+
+# True inside a @read_only call.
+_read_only = ContextVar("erp_read_only", default=False)
+# True once the current request wrote, or came from a client that wrote recently.
+_primary_only = ContextVar("erp_primary_only", default=False)
+_wrote = ContextVar("erp_wrote", default=False)
+# The replica the innermost connection() checkout reads from; None on the primary.
+_serving = ContextVar("erp_serving_replica", default=None)
+
+
+def _replica_name(dsn, index):
+    try:
+        params = parse_dsn(dsn)
+    except Exception:
+        return f"replica{index}"
+    return f"{params.get('host', 'localhost')}:{params.get('port', 5432)}/{params.get('dbname', '')}"
+
+
+class Replica:
+    """Health and lag of one replica, as last seen by this process."""
+
+    def __init__(self, dsn, name):
+        self.dsn = dsn
+        self.name = name
+        self.lag = 0.0
+        self.up = True
+        self.down_until = 0.0
+        self.checked_at = 0.0
+        self._check_lock = threading.Lock()
+
+    def usable(self, now):
+        # A lagging replica is tried again once its lag is due to be re-measured.
+        if now < self.down_until:
+            return False
+        return self.lag <= REPLICA_MAX_LAG_SECONDS or now - self.checked_at >= REPLICA_CHECK_INTERVAL
+
+    def fresh(self, conn):
+        """Whether a connection just checked out of this replica may serve the read;
+        re-measures the lag on it when the last measurement is older than REPLICA_CHECK_INTERVAL."""
+        if self.claim_check(time.monotonic()):
+            return self.measure_lag(conn)
+        return self.lag <= REPLICA_MAX_LAG_SECONDS
+
+    def claim_check(self, now):
+        """True for the one caller that should re-measure the lag now."""
+        with self._check_lock:
+            if now - self.checked_at < REPLICA_CHECK_INTERVAL:
+                return False
+            self.checked_at = now
+            return True
+
+    def measure_lag(self, conn):
+        """Reads the replication lag on a connection just checked out of this replica."""
+        with conn.cursor(cursor_factory=_plain_cursor) as cur:
+            cur.execute(LAG_QUERY)
+            lag = float(cur.fetchone()[0])
+        conn.rollback()
+        if lag > REPLICA_MAX_LAG_SECONDS and self.lag <= REPLICA_MAX_LAG_SECONDS:
+            logger.warning(f"Replica {self.name} is {lag:.1f}s behind; reads go to the primary until it catches up.")
+        self.lag = lag
+        self.up = True
+        return lag <= REPLICA_MAX_LAG_SECONDS
+
+    def mark_down(self, error):
+        if self.up:
+            logger.warning(f"Replica {self.name} unavailable, retrying in {REPLICA_RETRY_SECONDS:g}s: {error}")
+        self.up = False
+        self.down_until = time.monotonic() + REPLICA_RETRY_SECONDS
+        self.checked_at = 0.0 # Re-measure on the first use after the retry delay
+
+
+replicas = [Replica(dsn, _replica_name(dsn, index)) for index, dsn in enumerate(REPLICA_DSNS)]
+
+registry.gauge("erp_db_replica_lag_seconds", "Replication lag last measured on each replica.", ("replica",),
+               lambda: (((replica.name,), replica.lag) for replica in replicas))
+registry.gauge("erp_db_replica_up", "1 while a replica accepts connections, 0 during its retry delay.", ("replica",),
+               lambda: (((replica.name,), int(replica.up)) for replica in replicas))
+
+
+def read_only(func):
+    """Decorator for service methods that only read: their checkouts may go to a replica.
+
+    A generator such as an export must resolve its connection inside the call
+    (see src/db/streaming.py), since the scope ends when the method returns.
+    """
+    if not replicas:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _read_only.set(True)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _read_only.reset(token)
+    return wrapper
+
+
+def choose_replica():
+    """The replica the current checkout should use, or None for the primary."""
+    if not replicas or not _read_only.get():
+        return None
+    if _primary_only.get():
+        replica_reads.inc("primary", "sticky")
+        return None
+    now = time.monotonic()
+    candidates = [replica for replica in replicas if replica.usable(now)]
+    if not candidates:
+        down = all(now < replica.down_until for replica in replicas)
+        replica_reads.inc("primary", "unhealthy" if down else "lagging")
+        return None
+    return candidates[0] if len(candidates) == 1 else random.choice(candidates)
+
+
+def note_write():
+    """Called after a commit on the primary: later reads of this request and client stay there."""
+    if replicas:
+        _wrote.set(True)
+        _primary_only.set(True)
+
+
+def serving_replica():
+    """The Replica the current connection() checkout reads from, or None for the primary."""
+    return _serving.get()
+
+
+def set_serving_replica(replica):
+    return _serving.set(replica)
+
+
+def clear_serving_replica(token):
+    _serving.reset(token)
+
+
+def stick_to_primary():
+    _primary_only.set(True)
+
+
+def wrote():
+    return _wrote.get()
+
+
+def reset_routing():
+    _primary_only.set(False)
+    _wrote.set(False)
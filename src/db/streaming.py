@@ -0,0 +1,88 @@
+# Server-side cursor streaming for large exports
+
+import os
+import uuid
+import logging
+
+from src.db.pool import connection
+from src.db.replicas import choose_replica
+from src.db.rows import encode_json
+
+# Configure logger for this module
+logger = logging.getLogger(__name__)
+
+DEFAULT_ITERSIZE = int(os.getenv("EXPORT_ITERSIZE", 2000))
+DEFAULT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", 500))
+MAX_ITERSIZE = 50000
+
+STREAM_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "json": "application/json",
+}
+
+
+def stream_rows(query, params=None, itersize=None):
+    """Returns a generator of result rows read through a named (server-side) cursor.
+
+    Only itersize rows are held in memory at a time. The pooled connection is
+    checked out on the first iteration and returned when the generator is
+    exhausted or closed, e.g. when the client disconnects mid-export. The
+    database (primary or replica) is chosen now, in the caller's read-only
+    scope, because the rows are read after the request has returned.
+    """
+    itersize = min(itersize or DEFAULT_ITERSIZE, MAX_ITERSIZE)
+    return _stream_rows(query, params, itersize, choose_replica())
+
+
+def _stream_rows(query, params, itersize, replica):
+    cursor_name = f"export_{uuid.uuid4().hex}"
+    logger.debug(f"Streaming query through cursor {cursor_name} (itersize={itersize}): {query}")
+    row_count = 0
+    with connection(replica) as conn:
+        with conn.cursor(name=cursor_name) as cur:
+            cur.itersize = itersize
+            cur.execute(query, params)
+            for row in cur:
+                row_count += 1
+                yield row
+        conn.rollback() # Read-only; ends the transaction that held the cursor open
+    logger.info(f"Streamed {row_count} rows through cursor {cursor_name}.")
+
+
+def encode_ndjson(records, chunk_rows=None):
+    """Encodes records as newline-delimited JSON, yielding chunk_rows records per chunk."""
+    chunk_rows = chunk_rows or DEFAULT_CHUNK_ROWS
+    buffer = []
+    for record in records:
+        buffer.append(encode_json(record))
+        if len(buffer) >= chunk_rows:
+            yield b"\n".join(buffer) + b"\n"
+            buffer = []
+    if buffer:
+        yield b"\n".join(buffer) + b"\n"
+
+
+def encode_json_array(records, chunk_rows=None):
+    """Encodes records as a single JSON array, yielding chunk_rows records per chunk."""
+    chunk_rows = chunk_rows or DEFAULT_CHUNK_ROWS
+    yield b"["
+    buffer = []
+    first = True
+    for record in records:
+        buffer.append(encode_json(record))
+        if len(buffer) >= chunk_rows:
+            yield (b"" if first else b",") + b",".join(buffer)
+            first = False
+            buffer = []
+    if buffer:
+        yield (b"" if first else b",") + b",".join(buffer)
+    yield b"]"
+
+
+def encode_stream(records, stream_format, chunk_rows=None):
+    """Returns the chunk generator for stream_format ("ndjson" or "json")."""
+    if stream_format == "ndjson":
+        return encode_ndjson(records, chunk_rows)
+    if stream_format == "json":
+        return encode_json_array(records, chunk_rows)
+    raise ValueError(f"Unsupported stream format: {stream_format!r}")
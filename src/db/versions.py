@@ -0,0 +1,102 @@
+# Per-resource change counters used for ETag / Last-Modified validators
+
+import logging
+import os
+import random
+import threading
+import time
+
+from src.db.pool import execute_query, on_commit
+
+# Configure logger for this module
+logger = logging.getLogger(__name__)
+
+# What each resource covers:
+#   products  - products, categories and inventory_levels (quantities change on sales and receipts)
+#   sales     - sales_orders, sales_order_items and customers
+#   purchases - purchase_orders, purchase_order_items and suppliers
+RESOURCES = ("products", "sales", "purchases")
+
+# Each resource's counter is split over this many rows (see 005_resource_version_shards.sql);
+# a bump locks one random shard, so concurrent writers rarely queue behind each other.
+SHARDS = 16
+VERSIONS_TTL = float(os.getenv("RESOURCE_VERSIONS_TTL", 1))
+
+_BUMP_SQL = """
+    WITH locked AS MATERIALIZED (
+        SELECT resource_name, shard FROM resource_versions
+        WHERE resource_name = ANY(%s) AND shard = %s
+        ORDER BY resource_name
+        FOR UPDATE
+    )
+    UPDATE resource_versions rv
+    SET version = rv.version + 1, updated_at = CURRENT_TIMESTAMP
+    FROM locked l
+    WHERE rv.resource_name = l.resource_name AND rv.shard = l.shard;
+"""
+
+# resource -> (version, updated_at, fetched at monotonic time)
+_cache = {}
+_cache_lock = threading.Lock()
+_generation = 0 # Advanced on every invalidation; a read that overlaps one does not fill the cache
+
+
+def bump_versions(cur, *resources):
+    """Advances the counters of resources on the caller's transaction cursor.
+
+    Runs inside the write's own transaction, so the new version commits or
+    rolls back with the data and a failed bump aborts the write. Rows are
+    locked in name order, which keeps writers bumping several resources
+    from deadlocking each other. This worker's cached versions are dropped
+    once the transaction commits; dropped any earlier, a concurrent reader
+    could cache the old version again for RESOURCE_VERSIONS_TTL.
+    """
+    cur.execute(_BUMP_SQL, (sorted(resources), random.randrange(SHARDS)))
+    on_commit(cur, lambda: _invalidate(resources))
+
+
+def _invalidate(resources):
+    global _generation
+    with _cache_lock:
+        _generation += 1
+        for name in resources:
+            _cache.pop(name, None)
+
+
+def get_versions(resources, fresh=False):
+    """Returns ({resource: version}, latest updated_at) for resources.
+
+    Versions are cached in process for RESOURCE_VERSIONS_TTL seconds, so a
+    write made by another worker shows up in the validators within that
+    window; a miss sums the shards of the missing resources in one query.
+    fresh=True skips the cache, for a client that may have just written
+    through another worker.
+    """
+    now = time.monotonic()
+    with _cache_lock:
+        generation = _generation
+        cached = {} if fresh else {name: _cache[name] for name in resources if name in _cache and now - _cache[name][2] < VERSIONS_TTL}
+    missing = [name for name in resources if name not in cached]
+    if missing:
+        rows = execute_query("""
+            SELECT resource_name, sum(version)::bigint, max(updated_at)
+            FROM resource_versions WHERE resource_name = ANY(%s)
+            GROUP BY resource_name;
+        """, (missing,), fetch_all=True)
+        fetched = {name: (version, updated_at, now) for name, version, updated_at in rows}
+        with _cache_lock:
+            # A commit that landed while the query ran may not be in these rows.
+            if generation == _generation:
+                _cache.update(fetched)
+        cached.update(fetched)
+    versions = {name: entry[0] for name, entry in cached.items()}
+    last_modified = max((entry[1] for entry in cached.values()), default=None)
+    return versions, last_modified
+
+
+def clear_cache():
+    """Drops the in-process versions, so the next read goes to the database."""
+    global _generation
+    with _cache_lock:
+        _generation += 1
+        _cache.clear()
@@ -0,0 +1,214 @@
+# Structured access log and queue-backed (non-blocking) logging
+
+import os
+import sys
+import time
+import queue
+import atexit
+import random
+import logging
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, request
+
+from src.db.rows import encode_json
+from src.observability.metrics import registry
+
+# Configure logger for this module
+logger = logging.getLogger(__name__)
+
+access_logger = logging.getLogger("erp.access")
+
+ACCESS_LOG_ENABLED = os.getenv("ACCESS_LOG_ENABLED", "true").lower() == "true"
+BODY_SAMPLE_RATE = float(os.getenv("ACCESS_LOG_BODY_SAMPLE_RATE", 0.0))
+BODY_MAX_BYTES = int(os.getenv("ACCESS_LOG_BODY_MAX_BYTES", 2048))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking or raising when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        if hasattr(record, "access"):
+            # Access records have no args or exc_info and no other handler sees them; skip the copy.
+            return record
+        return super().prepare(record)
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class AccessLogFormatter(logging.Formatter):
+    """Renders an access record's fields as one JSON object per line."""
+
+    def format(self, record):
+        entry = {"ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds")}
+        entry.update(getattr(record, "access", None) or {"message": record.getMessage()})
+        return encode_json(entry).decode("utf-8")
+
+
+_listeners = []
+_queue_handlers = []
+_lock = threading.Lock()
+
+
+def _start_listener(target_logger, handlers):
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = DroppingQueueHandler(log_queue)
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    queue_handler.listener = listener
+    for handler in handlers:
+        target_logger.removeHandler(handler)
+    target_logger.addHandler(queue_handler)
+    _listeners.append(listener)
+    _queue_handlers.append(queue_handler)
+
+
+def start_async_logging():
+    """Moves the root handlers and the access log behind QueueListener threads.
+
+    Request threads only enqueue records; formatting and the write to stdout
+    happen on the listener threads. When a queue is full new records are
+    dropped (and counted) rather than blocking the request. Safe to call more
+    than once; the listeners are stopped at interpreter exit.
+    """
+    with _lock:
+        if _listeners:
+            return
+        root = logging.getLogger()
+        root_handlers = [h for h in root.handlers if not isinstance(h, QueueHandler)]
+        if root_handlers:
+            _start_listener(root, root_handlers)
+
+        access_handler = logging.StreamHandler(sys.stdout)
+        access_handler.setFormatter(AccessLogFormatter())
+        access_logger.setLevel(logging.INFO)
+        access_logger.propagate = False
+        _start_listener(access_logger, [access_handler])
+        atexit.register(stop_async_logging)
+
+
+def stop_async_logging():
+    """Flushes the queued records and stops the listener threads."""
+    with _lock:
+        while _listeners:
+            _listeners.pop().stop()
+
+
+def _restart_listeners_after_fork():
+    # Listener threads do not survive a fork, and the parent's queues may have been
+    # copied mid-operation; the child gets fresh queues and threads.
+    global _lock
+    _lock = threading.Lock()
+    for queue_handler in _queue_handlers:
+        listener = queue_handler.listener
+        if listener not in _listeners:
+            continue # Stopped before the fork
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        queue_handler.queue = log_queue
+        listener.queue = log_queue
+        listener._thread = None
+        listener.start()
+
+
+os.register_at_fork(after_in_child=_restart_listeners_after_fork)
+
+
+def dropped_records():
+    """Records dropped so far because a log queue was full."""
+    return sum(handler.dropped for handler in _queue_handlers)
+
+
+registry.gauge("erp_log_records_dropped_total", "Log records dropped because a log queue was full.", (),
+               lambda: [((), dropped_records())], type_name="counter")
+
+
+def _capture(data):
+    if data is None:
+        return None
+    captured = data[:BODY_MAX_BYTES].decode("utf-8", errors="replace")
+    if len(data) > BODY_MAX_BYTES:
+        captured += f"...<{len(data) - BODY_MAX_BYTES} more bytes>"
+    return captured
+
+
+def _count_bytes(iterable, counter):
+    # Passes a streamed body through while counting its size; closing the
+    # wrapper closes the wrapped generator (and releases its DB connection).
+    try:
+        for chunk in iterable:
+            counter[0] += len(chunk)
+            yield chunk
+    finally:
+        close = getattr(iterable, "close", None)
+        if close:
+            close()
+
+
+def _emit(fields, started):
+    fields["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    access_logger.info("access", extra={"access": fields})
+
+
+def init_access_log(app):
+    """Registers the request hooks that write one access record per request.
+
+    Records carry method, route, path, status, latency and byte counts.
+    Bodies are captured for ACCESS_LOG_BODY_SAMPLE_RATE of requests only,
+    truncated to ACCESS_LOG_BODY_MAX_BYTES; request bodies only for JSON
+    requests, which the views buffer anyway, so streamed uploads stay
+    streamed. Streamed responses are logged when the stream closes, with the
+    bytes actually sent.
+    """
+    if not ACCESS_LOG_ENABLED:
+        logger.info("Access log disabled (ACCESS_LOG_ENABLED=false).")
+        return
+
+    @app.before_request
+    def _start_access_record():
+        g.access_started = time.perf_counter()
+        g.access_sample_body = BODY_SAMPLE_RATE > 0 and random.random() < BODY_SAMPLE_RATE
+
+    @app.after_request
+    def _write_access_record(response):
+        started = g.get("access_started")
+        if started is None:
+            return response
+        fields = {
+            "method": request.method,
+            "route": request.url_rule.rule if request.url_rule else None,
+            "path": request.path,
+            "query": request.query_string.decode("latin-1") or None,
+            "status": response.status_code,
+            "request_bytes": request.content_length or 0,
+            "remote_addr": request.remote_addr,
+        }
+        if g.get("access_sample_body"):
+            if request.is_json:
+                fields["request_body"] = _capture(request.get_data(cache=True))
+            if not response.is_streamed:
+                fields["response_body"] = _capture(response.get_data())
+
+        if response.is_streamed:
+            counter = [0]
+            response.response = _count_bytes(response.response, counter)
+
+            def _on_close():
+                fields["response_bytes"] = counter[0]
+                fields["streamed"] = True
+                _emit(fields, started)
+            response.call_on_close(_on_close)
+        else:
+            fields["response_bytes"] = response.content_length or 0
+            _emit(fields, started)
+        return response
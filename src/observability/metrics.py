@@ -0,0 +1,317 @@
+# In-process metrics registry rendered in the Prometheus text exposition format
+
+import time
+import bisect
+import logging
+import threading
+
+from flask import g, request
+
+# Configure logger for this module
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers sub-millisecond cache hits up to multi-second exports.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with a fixed set of label names."""
+
+    type_name = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(labelvalues), value] for labelvalues, value in self._values.items()]
+
+    def merge(self, snapshot):
+        for labelvalues, value in snapshot:
+            self.inc(*labelvalues, amount=value)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        if not values and not self.labelnames:
+            values = [((), 0)]
+        for labelvalues, value in values:
+            yield self.name + _labels(self.labelnames, labelvalues), value
+
+
+class Histogram:
+    """Histogram with fixed buckets; observe() is one bisect plus three increments under a lock."""
+
+    type_name = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {} # labelvalues -> [per-bucket counts (last = +Inf), sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(labelvalues), [list(counts), total, count]] for labelvalues, (counts, total, count) in self._series.items()]
+
+    def merge(self, snapshot):
+        with self._lock:
+            for labelvalues, (counts, total, count) in snapshot:
+                labelvalues = tuple(labelvalues)
+                series = self._series.get(labelvalues)
+                if series is None:
+                    series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                series[0] = [mine + theirs for mine, theirs in zip(series[0], counts)]
+                series[1] += total
+                series[2] += count
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def samples(self):
+        with self._lock:
+            series = [(labelvalues, list(counts), total, count) for labelvalues, (counts, total, count) in self._series.items()]
+        for labelvalues, counts, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                yield self.name + "_bucket" + _labels(self.labelnames, labelvalues, ("le", _number(bound))), cumulative
+            yield self.name + "_sum" + _labels(self.labelnames, labelvalues), total
+            yield self.name + "_count" + _labels(self.labelnames, labelvalues), count
+
+
+class Gauge:
+    """Gauge whose samples are read from a callback at scrape time.
+
+    The callback returns an iterable of (labelvalues, value) pairs, so
+    current state (pool sizes, cache counters) costs nothing between scrapes.
+    """
+
+    type_name = "gauge"
+
+    def __init__(self, name, help_text, labelnames, callback, type_name=None):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        if type_name:
+            self.type_name = type_name
+
+    def snapshot(self):
+        return [[list(labelvalues), value] for labelvalues, value in self.callback() if value is not None]
+
+    def samples(self):
+        for labelvalues, value in self.callback():
+            if value is not None:
+                yield self.name + _labels(self.labelnames, labelvalues), value
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def gauge(self, name, help_text, labelnames, callback, type_name=None):
+        return self._register(Gauge(name, help_text, labelnames, callback, type_name))
+
+    def snapshot(self):
+        """Returns {name: samples} for every metric, as JSON-friendly lists (see merged())."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        snapshot = {}
+        for metric in metrics:
+            try:
+                snapshot[metric.name] = metric.snapshot()
+            except Exception as e:
+                logger.error(f"Failed to snapshot metric {metric.name}: {e}", exc_info=True)
+        return snapshot
+
+    def reset(self):
+        """Zeroes the counters and histograms (gauges read live state)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            if not isinstance(metric, Gauge):
+                metric.reset()
+
+    def merged(self, processes):
+        """Returns a registry holding several processes' metrics, for render().
+
+        processes is a list of (pid, snapshot(), live). Counters and histograms
+        are summed over all of them; gauges describe current state, so each
+        live process's samples are kept apart under a pid label.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        merged = MetricsRegistry()
+        for metric in metrics:
+            if isinstance(metric, Gauge):
+                samples = [(tuple(labelvalues) + (str(pid),), value)
+                           for pid, snapshot, live in processes if live
+                           for labelvalues, value in snapshot.get(metric.name, ())]
+                merged.gauge(metric.name, metric.help_text, metric.labelnames + ("pid",), lambda samples=samples: samples, metric.type_name)
+                continue
+            if isinstance(metric, Histogram):
+                target = merged.histogram(metric.name, metric.help_text, metric.labelnames, metric.buckets)
+            else:
+                target = merged.counter(metric.name, metric.help_text, metric.labelnames)
+            for _, snapshot, _ in processes:
+                target.merge(snapshot.get(metric.name, ()))
+        return merged
+
+    def render(self):
+        """Returns every metric in the Prometheus text format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            try:
+                for sample, value in metric.samples():
+                    lines.append(f"{sample} {_number(value)}")
+            except Exception as e:
+                logger.error(f"Failed to collect metric {metric.name}: {e}", exc_info=True)
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_requests = registry.counter("erp_http_requests_total", "HTTP requests handled, by route and status.", ("method", "route", "status"))
+http_latency = registry.histogram("erp_http_request_duration_seconds", "Time from request start until the view returned a response.", ("method", "route"))
+db_statement_latency = registry.histogram("erp_db_statement_duration_seconds", "Statement execution time, by statement fingerprint.", ("statement",))
+db_statement_rows = registry.counter("erp_db_statement_rows_total", "Rows returned or affected, by statement fingerprint.", ("statement",))
+db_statement_errors = registry.counter("erp_db_statement_errors_total", "Statements that raised, by statement fingerprint.", ("statement",))
+pool_checkout_wait = registry.histogram("erp_db_pool_checkout_seconds", "Time spent checking a connection out of the shared pool.",
+                                        buckets=(0.0001, 0.00025, 0.0005) + LATENCY_BUCKETS)
+pool_checkout_errors = registry.counter("erp_db_pool_checkout_errors_total", "Pool checkouts that failed to connect.")
+pool_checkout_rejections = registry.counter("erp_db_pool_checkout_rejections_total", "Checkouts refused under saturation, by reason (timeout, queue_full).", ("reason",))
+prepared_statements = registry.counter("erp_db_prepared_statements_total", "Prepared-statement cache events, by event (prepared, evicted, invalidated).", ("event",))
+replica_reads = registry.counter("erp_db_read_routes_total", "Read-only checkouts by target database and reason (routed, sticky, unhealthy, lagging).", ("target", "reason"))
+request_deadline_exceeded = registry.counter("erp_request_deadline_exceeded_total", "Requests that ran out of their latency budget, by route and stage (checkout, statement).", ("route", "stage"))
+
+
+def record_statement(fingerprint, elapsed, rowcount, failed):
+    """Records one executed statement (called by src.db.instrumentation.InstrumentedCursor)."""
+    db_statement_latency.observe(elapsed, fingerprint)
+    if failed:
+        db_statement_errors.inc(fingerprint)
+    elif rowcount > 0:
+        db_statement_rows.inc(fingerprint, amount=rowcount)
+
+
+# --- Caches ---
+
+_caches = {}
+
+
+def register_cache(name, stats):
+    """Exposes a cache's stats() (ReferenceCache or ProductCache layout) as erp_cache_* metrics."""
+    _caches[name] = stats
+
+
+def cache_stats():
+    """Returns {cache name: stats()} for every registered cache."""
+    return {name: stats() for name, stats in list(_caches.items())}
+
+
+def _cache_samples():
+    for name, stats in list(_caches.items()):
+        yield name, stats()
+
+
+def _cache_hits():
+    for name, stats in _cache_samples():
+        if "hits" in stats:
+            yield (name, "local"), stats["hits"]
+        else:
+            yield (name, "local"), stats["local_hits"]
+            yield (name, "redis"), stats["redis_hits"]
+
+
+registry.gauge("erp_cache_hits_total", "Cache hits, by cache and tier.", ("cache", "tier"), _cache_hits, type_name="counter")
+registry.gauge("erp_cache_misses_total", "Cache misses (loads from the database), by cache.", ("cache",),
+               lambda: (((name,), stats["misses"]) for name, stats in _cache_samples()), type_name="counter")
+registry.gauge("erp_cache_hit_ratio", "Hits / lookups since start, by cache.", ("cache",),
+               lambda: (((name,), stats["hit_ratio"]) for name, stats in _cache_samples()))
+registry.gauge("erp_cache_entries", "Entries held in process, by cache.", ("cache",),
+               lambda: (((name,), stats.get("entries", stats.get("local_entries"))) for name, stats in _cache_samples()))
+
+
+# --- Flask integration ---
+
+def init_metrics(app):
+    """Registers the hooks that count requests and time them per route."""
+
+    @app.before_request
+    def _start_request_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.get("metrics_started")
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            http_latency.observe(time.perf_counter() - started, request.method, route)
+            http_requests.inc(request.method, route, str(response.status_code))
+        return response
@@ -0,0 +1,244 @@
+# Multiprocess metrics: every worker's registry, caches, slow queries and traces shared through a directory
+
+import os
+import time
+import fcntl
+import logging
+import threading
+from contextlib import contextmanager
+
+from src.db.rows import encode_json, decode_json
+from src.observability.metrics import registry, cache_stats as local_cache_stats
+from src.observability.slow_queries import slow_query_log
+from src.observability.tracing import trace_store, summarize_trace
+
+# Configure logger for this module
+logger = logging.getLogger(__name__)
+
+# Unset: /metrics and the admin endpoints report the process that serves them.
+MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR") or None
+FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", 1))
+
+ARCHIVE_FILE = "archive.json" # Counters and histograms of workers that have exited
+LOCK_FILE = ".lock"
+
+_flush_lock = threading.Lock()
+_admin_written = None # (traces recorded, slow queries recorded) in this worker's last admin file
+_flusher = None
+_stop_flushing = threading.Event()
+
+
+def enabled():
+    return MULTIPROC_DIR is not None
+
+
+def _path(kind, pid):
+    return os.path.join(MULTIPROC_DIR, f"{kind}-{pid}.json")
+
+
+def _write_json(path, payload):
+    # Readers never see a half-written file: write aside, then rename over it.
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(encode_json(payload))
+    os.replace(temp_path, path)
+
+
+def _read_json(path):
+    try:
+        with open(path, "rb") as f:
+            return decode_json(f.read())
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        logger.warning(f"Ignoring unreadable metrics file {path}: {e}")
+        return None
+
+
+@contextmanager
+def _directory_lock(exclusive):
+    # Readers share it; folding an exited worker into the archive takes it alone,
+    # so a scrape never counts that worker twice or not at all.
+    with open(os.path.join(MULTIPROC_DIR, LOCK_FILE), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def prepare_directory():
+    """Creates METRICS_MULTIPROC_DIR and empties it of a previous run's files.
+
+    Run once in the server's master before any worker starts (see gunicorn.conf.py).
+    """
+    if not enabled():
+        return
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+    for name in os.listdir(MULTIPROC_DIR):
+        if name.endswith((".json", ".tmp")):
+            os.remove(os.path.join(MULTIPROC_DIR, name))
+    logger.info(f"Multiprocess metrics directory ready: {MULTIPROC_DIR}")
+
+
+def flush():
+    """Writes this worker's metrics (and, when they changed, its slow queries and traces) to the directory."""
+    global _admin_written
+    pid = os.getpid()
+    with _flush_lock:
+        _write_json(_path("metrics", pid), {
+            "pid": pid,
+            "written_at": time.time(),
+            "metrics": registry.snapshot(),
+            "caches": local_cache_stats(),
+        })
+        recorded = (trace_store.recorded, slow_query_log.recorded)
+        if recorded != _admin_written:
+            _write_json(_path("admin", pid), {
+                "pid": pid,
+                "slow_queries": {"recorded": slow_query_log.recorded, "entries": slow_query_log.recent()},
+                "traces": {"recorded": trace_store.recorded, "entries": trace_store.snapshot()},
+            })
+            _admin_written = recorded
+
+
+def _flush_loop():
+    while not _stop_flushing.wait(FLUSH_INTERVAL):
+        try:
+            flush()
+        except Exception as e:
+            logger.error(f"Failed to write multiprocess metrics: {e}", exc_info=True)
+
+
+def start_worker():
+    """Starts this worker's flush thread; called per worker after the fork (see src/web/lifecycle.py)."""
+    global _flusher
+    if not enabled() or (_flusher is not None and _flusher.is_alive()):
+        return # /readyz re-runs init_worker() until the warm-up succeeds
+    # Anything counted in the master before the fork is not this worker's.
+    registry.reset()
+    _stop_flushing.clear()
+    flush()
+    _flusher = threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True)
+    _flusher.start()
+    logger.info(f"Worker {os.getpid()} writes its metrics to {MULTIPROC_DIR} every {FLUSH_INTERVAL:g}s.")
+
+
+def stop_worker():
+    """Stops the flush thread and writes this worker's final counts."""
+    if not enabled():
+        return
+    _stop_flushing.set()
+    flush()
+
+
+def mark_process_dead(pid):
+    """Folds an exited worker's counters and histograms into the archive and drops its files.
+
+    Run in the master for every worker that exits, including killed ones
+    (gunicorn's child_exit hook). Its gauges, slow queries and traces go with it.
+    """
+    if not enabled():
+        return
+    with _directory_lock(exclusive=True):
+        dead = _read_json(_path("metrics", pid))
+        if dead is not None:
+            archive = _read_json(os.path.join(MULTIPROC_DIR, ARCHIVE_FILE)) or {}
+            merged = registry.merged([(None, archive, False), (pid, dead["metrics"], False)])
+            _write_json(os.path.join(MULTIPROC_DIR, ARCHIVE_FILE), merged.snapshot())
+        for kind in ("metrics", "admin"):
+            try:
+                os.remove(_path(kind, pid))
+            except FileNotFoundError:
+                pass
+
+
+def _worker_files(kind):
+    # This worker's own file is refreshed first, so its numbers are current;
+    # the others' are at most METRICS_FLUSH_INTERVAL old.
+    flush()
+    prefix = kind + "-"
+    files = []
+    for name in sorted(os.listdir(MULTIPROC_DIR)):
+        if name.startswith(prefix) and name.endswith(".json"):
+            payload = _read_json(os.path.join(MULTIPROC_DIR, name))
+            if payload is not None:
+                files.append(payload)
+    return files
+
+
+def render_metrics():
+    """The Prometheus text for /metrics: this process, or every worker when METRICS_MULTIPROC_DIR is set."""
+    if not enabled():
+        return registry.render()
+    with _directory_lock(exclusive=False):
+        processes = [(payload["pid"], payload["metrics"], True) for payload in _worker_files("metrics")]
+        archive = _read_json(os.path.join(MULTIPROC_DIR, ARCHIVE_FILE))
+    if archive:
+        processes.append((None, archive, False))
+    return registry.merged(processes).render()
+
+
+def _sum_cache_stats(stats_list):
+    total = {}
+    for stats in stats_list:
+        for key, value in stats.items():
+            if isinstance(value, bool):
+                total[key] = total.get(key, False) or value
+            elif isinstance(value, (int, float)) and key != "hit_ratio":
+                total[key] = total.get(key, 0) + value
+    hits = total.get("hits", total.get("local_hits", 0) + total.get("redis_hits", 0))
+    lookups = hits + total.get("misses", 0)
+    total["hit_ratio"] = round(hits / lookups, 4) if lookups else None
+    return total
+
+
+def cache_stats():
+    """{cache: stats}; with METRICS_MULTIPROC_DIR, summed over workers plus a per-worker "workers" breakdown."""
+    if not enabled():
+        return local_cache_stats()
+    with _directory_lock(exclusive=False):
+        workers = {str(payload["pid"]): payload["caches"] for payload in _worker_files("metrics")}
+    names = sorted({name for caches in workers.values() for name in caches})
+    result = {name: _sum_cache_stats([caches[name] for caches in workers.values() if name in caches]) for name in names}
+    result["workers"] = workers
+    return result
+
+
+def slow_queries(limit=None):
+    """(recorded, entries slowest first); with METRICS_MULTIPROC_DIR, over every live worker, each entry tagged with its pid."""
+    if not enabled():
+        return slow_query_log.recorded, slow_query_log.recent(limit)
+    with _directory_lock(exclusive=False):
+        admins = _worker_files("admin")
+    recorded = sum(admin["slow_queries"]["recorded"] for admin in admins)
+    entries = [dict(entry, pid=admin["pid"]) for admin in admins for entry in admin["slow_queries"]["entries"]]
+    entries.sort(key=lambda entry: entry["duration_ms"], reverse=True)
+    return recorded, entries[:limit] if limit else entries
+
+
+def _all_traces():
+    with _directory_lock(exclusive=False):
+        admins = _worker_files("admin")
+    recorded = sum(admin["traces"]["recorded"] for admin in admins)
+    return recorded, [dict(entry, pid=admin["pid"]) for admin in admins for entry in admin["traces"]["entries"]]
+
+
+def recent_traces(limit=None):
+    """(recorded, trace summaries newest first); with METRICS_MULTIPROC_DIR, over every live worker."""
+    if not enabled():
+        return trace_store.recorded, trace_store.recent(limit)
+    recorded, traces = _all_traces()
+    traces.sort(key=lambda entry: entry["ts"], reverse=True)
+    if limit:
+        traces = traces[:limit]
+    return recorded, [summarize_trace(entry) for entry in traces]
+
+
+def find_trace(trace_id):
+    """One stored trace by id, from whichever live worker recorded it; None if it is no longer buffered."""
+    trace = trace_store.get(trace_id)
+    if trace is not None or not enabled():
+        return trace
+    _, traces = _all_traces()
+    return next((entry for entry in traces if entry["trace_id"] == trace_id), None)
@@ -0,0 +1,193 @@
+# Slow-query log: statements over a threshold, with sampled EXPLAIN plans
+
+import os
+import sys
+import json
+import queue
+import random
+import logging
+import threading
+from collections import deque
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from logging.handlers import RotatingFileHandler
+
+from src.db.replicas import serving_replica
+from src.db.rows import encode_json
+from src.observability.statements import normalize_sql, statement_fingerprint
+
+# Configure logger for this module
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 500))
+EXPLAIN_SAMPLE_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE_RATE", 0.0))
+EXPLAIN_TIMEOUT_MS = int(os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT_MS", 5000))
+BUFFER_SIZE = int(os.getenv("SLOW_QUERY_BUFFER_SIZE", 200))
+LOG_FILE = os.getenv("SLOW_QUERY_LOG_FILE")
+LOG_FILE_MAX_BYTES = int(os.getenv("SLOW_QUERY_LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_FILE_BACKUPS = int(os.getenv("SLOW_QUERY_LOG_BACKUPS", 5))
+
+SERVICE_MODULE_PREFIX = "src.core_modules."
+# Services' thin query helpers; the method that called them is the useful one.
+_QUERY_HELPERS = frozenset({"_execute_query"})
+
+
+def redact_param(value):
+    """Keeps values that identify rows (numbers, dates, booleans) and masks text.
+
+    Strings are where customer names, emails, phone numbers and addresses
+    live, so they are reduced to their length; lists are redacted element-wise.
+    """
+    if value is None or isinstance(value, (bool, int, float, Decimal)):
+        return value if not isinstance(value, Decimal) else float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, str):
+        return f"<str:{len(value)}>"
+    if isinstance(value, (list, tuple)):
+        if len(value) > 20:
+            return [redact_param(item) for item in value[:20]] + [f"<{len(value) - 20} more>"]
+        return [redact_param(item) for item in value]
+    if isinstance(value, dict):
+        return {key: redact_param(item) for key, item in value.items()}
+    return f"<{type(value).__name__}>"
+
+
+def calling_service_method():
+    """Returns "module.Class.method" of the innermost service frame on the stack, if any."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith(SERVICE_MODULE_PREFIX) and frame.f_code.co_name not in _QUERY_HELPERS:
+            return f"{module.rsplit('.', 1)[-1]}.{frame.f_code.co_qualname}"
+        frame = frame.f_back
+    return None
+
+
+def _explain_sql(normalized):
+    # EXPLAIN ANALYZE executes the statement again, so it is only used for
+    # plain reads; anything that writes, locks or consumes sequence values
+    # gets a plan without execution.
+    text = normalized.lower()
+    read_only = text.startswith("select") and not any(
+        marker in text for marker in (" for update", " for share", " for no key update", "nextval(", "setval(")
+    )
+    if read_only:
+        return "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ", True
+    return "EXPLAIN (FORMAT JSON) ", False
+
+
+class SlowQueryLog:
+    """Collects statements slower than SLOW_QUERY_MS.
+
+    Each entry holds the fingerprint, normalized SQL, redacted parameters,
+    duration and the service method that ran it. Entries are kept in a ring
+    buffer for GET /api/admin/slow-queries and, when SLOW_QUERY_LOG_FILE is
+    set, appended to a size-rotated JSON-lines file. A SLOW_QUERY_EXPLAIN_SAMPLE_RATE
+    share of them is re-planned by a background thread on its own pooled
+    connection, so the request that hit the slow statement never waits for it.
+    A statement that ran on a replica is recorded with its name and re-planned
+    on that replica; "explained_on" says where the plan came from, "primary"
+    when the replica could not be used.
+    """
+
+    def __init__(self, threshold_ms=SLOW_QUERY_MS, explain_sample_rate=EXPLAIN_SAMPLE_RATE, buffer_size=BUFFER_SIZE, log_file=LOG_FILE):
+        self.threshold = threshold_ms / 1000.0 if threshold_ms and threshold_ms > 0 else None
+        self.explain_sample_rate = explain_sample_rate
+        self.entries = deque(maxlen=buffer_size)
+        self.recorded = 0
+        self._local = threading.local()
+        self._explain_queue = queue.Queue(maxsize=100)
+        self._explain_thread = None
+        self._lock = threading.Lock()
+        self._file_logger = None
+        if log_file:
+            handler = RotatingFileHandler(log_file, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUPS)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._file_logger = logging.getLogger("erp.slow_queries")
+            self._file_logger.setLevel(logging.INFO)
+            self._file_logger.propagate = False
+            self._file_logger.addHandler(handler)
+
+    def observe(self, query, params, elapsed):
+        """Called for every executed statement; records it when over the threshold."""
+        if self.threshold is None or elapsed < self.threshold or getattr(self._local, "explaining", False):
+            return
+        normalized = normalize_sql(query)
+        entry = {
+            "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "fingerprint": statement_fingerprint(query),
+            "duration_ms": round(elapsed * 1000, 2),
+            "service_method": calling_service_method(),
+            "sql": normalized,
+            "params": redact_param(params) if params is not None else None,
+        }
+        replica = serving_replica()
+        if replica is not None:
+            entry["replica"] = replica.name
+        with self._lock:
+            self.recorded += 1
+            self.entries.append(entry)
+        logger.warning(f"Slow query ({entry['duration_ms']} ms) in {entry['service_method']}: {entry['fingerprint']}")
+
+        if self.explain_sample_rate > 0 and random.random() < self.explain_sample_rate and not isinstance(query, bytes):
+            # Interpolated (bytes) statements carry raw row data; they are not re-run.
+            self._start_explain_thread()
+            try:
+                self._explain_queue.put_nowait((entry, query, params, replica))
+                return # Written to the file once the plan is attached
+            except queue.Full:
+                entry["explain_error"] = "EXPLAIN queue full; skipped"
+        self._write(entry)
+
+    def reset_after_fork(self):
+        # The EXPLAIN thread does not survive a fork; the next sample starts a new one.
+        self._lock = threading.Lock()
+        self._explain_queue = queue.Queue(maxsize=100)
+        self._explain_thread = None
+
+    def recent(self, limit=None):
+        """Returns the buffered entries, slowest first."""
+        with self._lock:
+            entries = list(self.entries)
+        entries.sort(key=lambda entry: entry["duration_ms"], reverse=True)
+        return entries[:limit] if limit else entries
+
+    def _write(self, entry):
+        if self._file_logger is not None:
+            self._file_logger.info(encode_json(entry).decode("utf-8"))
+
+    def _start_explain_thread(self):
+        with self._lock:
+            if self._explain_thread is None or not self._explain_thread.is_alive():
+                self._explain_thread = threading.Thread(target=self._explain_worker, name="slow-query-explain", daemon=True)
+                self._explain_thread.start()
+
+    def _explain_worker(self):
+        from src.db.pool import connection # Imported here: the pool's cursors report back to this module
+        self._local.explaining = True
+        while True:
+            entry, query, params, replica = self._explain_queue.get()
+            prefix, analyzed = _explain_sql(entry["sql"])
+            try:
+                # A plan taken on the primary can differ from the replica's (statistics,
+                # cache state), so the statement goes back where it ran when it can.
+                with connection(replica=replica) as conn:
+                    explained_on = serving_replica()
+                    try:
+                        with conn.cursor() as cur:
+                            cur.execute(f"SET LOCAL statement_timeout = {EXPLAIN_TIMEOUT_MS};")
+                            cur.execute(prefix + query, params)
+                            plan = cur.fetchone()[0]
+                    finally:
+                        conn.rollback() # Never keep what an analyzed statement did
+                entry["explain"] = plan if not isinstance(plan, str) else json.loads(plan)
+                entry["explain_analyzed"] = analyzed
+                entry["explained_on"] = explained_on.name if explained_on is not None else "primary"
+            except Exception as e:
+                entry["explain_error"] = str(e).strip()
+            self._write(entry)
+
+
+slow_query_log = SlowQueryLog()
+os.register_at_fork(after_in_child=slow_query_log.reset_after_fork)
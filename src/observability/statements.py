@@ -0,0 +1,60 @@
+# SQL statement normalization and fingerprints shared by metrics and the slow-query log
+
+import re
+import zlib
+
+_FINGERPRINT_CACHE_SIZE = 2048
+_fingerprints = {}
+
+_TABLE_PATTERN = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE)\s+([A-Za-z_][A-Za-z0-9_.]*)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+# One literal as psycopg2 renders it after _STRING_LITERAL ran: '?' (optionally cast), a number, NULL or a boolean.
+_LITERAL = r"(?:'\?'(?:::[a-z ]+)?|-?\d+(?:\.\d+)?(?:::[a-z]+)?|NULL|true|false)"
+_ROW = rf"\(\s*{_LITERAL}(?:\s*,\s*{_LITERAL})*\s*\)"
+_ROW_LIST = re.compile(rf"{_ROW}(?:\s*,\s*{_ROW})*", re.IGNORECASE)
+
+
+def normalize_sql(query):
+    """Returns query as single-spaced text with literal values replaced by placeholders.
+
+    Parameterized statements only lose their formatting. Statements that
+    arrive already interpolated (bytes from execute_values) have their string
+    literals replaced by '?' and their lists of value rows collapsed to "(...)",
+    so no row data (customer names, emails) ends up in logs or labels.
+    """
+    if isinstance(query, bytes):
+        text = _STRING_LITERAL.sub("'?'", query.decode("utf-8", errors="replace"))
+        text = _ROW_LIST.sub("(...)", text)
+    else:
+        text = str(query)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def statement_fingerprint(query):
+    """Returns a low-cardinality label for a SQL statement, e.g. "select products 3f2a91c0".
+
+    The verb and first table make the label readable; the checksum of the
+    normalized text tells apart different statements on the same table.
+    Results are memoized per query string, since the services run a fixed set
+    of statements.
+    """
+    if isinstance(query, str):
+        fingerprint = _fingerprints.get(query)
+        if fingerprint is not None:
+            return fingerprint
+    if isinstance(query, bytes):
+        # Interpolated multi-row statements are large and differ on every call;
+        # the text before the first VALUES identifies them well enough.
+        values_at = query.find(b"VALUES", 0, 4096)
+        normalized = normalize_sql(query[:values_at] if values_at != -1 else query[:4096])
+    else:
+        normalized = normalize_sql(query)
+    verb = normalized.split(" ", 1)[0].lower() or "unknown"
+    table = _TABLE_PATTERN.search(normalized)
+    fingerprint = f"{verb} {table.group(1) if table else '-'} {zlib.crc32(normalized.encode('utf-8')):08x}"
+    if isinstance(query, str):
+        if len(_fingerprints) >= _FINGERPRINT_CACHE_SIZE:
+            _fingerprints.clear()
+        _fingerprints[query] = fingerprint
+    return fingerprint
@@ -0,0 +1,257 @@
+# Lightweight in-process request tracing: per-request span trees
+
+import os
+import time
+import uuid
+import random
+import logging
+import functools
+import threading
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+
+from flask import g, request
+
+from src.db.rows import encode_json
+
+# Configure logger for this module
+logger = logging.getLogger(__name__)
+
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 0.0))
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", 1000))
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", 100))
+TRACE_LOG_FILE = os.getenv("TRACE_LOG_FILE")
+TRACE_LOG_MAX_BYTES = int(os.getenv("TRACE_LOG_MAX_BYTES", 10 * 1024 * 1024))
+TRACE_LOG_BACKUPS = int(os.getenv("TRACE_LOG_BACKUPS", 5))
+
+# The innermost open span of the current request; None when the request is not sampled.
+_current_span = ContextVar("erp_current_span", default=None)
+
+
+class Span:
+    """One timed operation; children are the spans opened while it was current."""
+
+    __slots__ = ("name", "trace", "start", "duration", "attrs", "children")
+
+    def __init__(self, name, trace, start, attrs=None):
+        self.name = name
+        self.trace = trace
+        self.start = start
+        self.duration = None
+        self.attrs = attrs
+        self.children = []
+
+    def add_child(self, span):
+        if self.trace.span_count >= TRACE_MAX_SPANS:
+            self.trace.dropped_spans += 1
+            return False
+        self.trace.span_count += 1
+        self.children.append(span)
+        return True
+
+    def to_dict(self, origin):
+        duration = self.duration if self.duration is not None else time.perf_counter() - self.start
+        child_time = sum(child.duration or 0.0 for child in self.children)
+        entry = {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round(duration * 1000, 3),
+            # Time not covered by child spans: Python work, serialization, waiting on locks.
+            "self_ms": round(max(duration - child_time, 0.0) * 1000, 3),
+        }
+        if self.attrs:
+            entry["attrs"] = self.attrs
+        if self.children:
+            entry["children"] = [child.to_dict(origin) for child in self.children]
+        return entry
+
+
+class Trace:
+    def __init__(self, name, attrs=None):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.ts = datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+        self.span_count = 1
+        self.dropped_spans = 0
+        self.root = Span(name, self, time.perf_counter(), attrs)
+
+    def to_dict(self):
+        root = self.root.to_dict(self.root.start)
+        return {
+            "trace_id": self.trace_id,
+            "ts": self.ts,
+            "name": self.root.name,
+            "duration_ms": root["duration_ms"],
+            "spans": self.span_count,
+            "dropped_spans": self.dropped_spans,
+            "root": root,
+        }
+
+
+def current_span():
+    return _current_span.get()
+
+
+class span:
+    """Context manager that records a child of the current span.
+
+    A no-op (one ContextVar lookup) when the current request is not traced.
+    """
+
+    __slots__ = ("name", "attrs", "_span", "_token")
+
+    def __init__(self, name, attrs=None):
+        self.name = name
+        self.attrs = attrs
+        self._span = None
+        self._token = None
+
+    def __enter__(self):
+        parent = _current_span.get()
+        if parent is not None:
+            child = Span(self.name, parent.trace, time.perf_counter(), self.attrs)
+            if parent.add_child(child):
+                self._span = child
+                self._token = _current_span.set(child)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._span is not None:
+            self._span.duration = time.perf_counter() - self._span.start
+            if exc_type is not None:
+                self._span.attrs = dict(self._span.attrs or {}, error=exc_type.__name__)
+            _current_span.reset(self._token)
+        return False
+
+
+def traced(func):
+    """Decorator that records each call of a service method as a span named "Class.method"."""
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _current_span.get() is None:
+            return func(*args, **kwargs)
+        with span(name):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def record_span(name, started, elapsed, attrs=None):
+    """Adds an already finished span (e.g. a DB statement timed by the cursor) under the current span."""
+    parent = _current_span.get()
+    if parent is None:
+        return
+    child = Span(name, parent.trace, started, attrs)
+    child.duration = elapsed
+    parent.add_child(child)
+
+
+def summarize_trace(entry):
+    """A stored trace without its span tree, plus the response status."""
+    summary = {key: value for key, value in entry.items() if key != "root"}
+    summary["status"] = entry["root"].get("attrs", {}).get("status")
+    return summary
+
+
+class TraceStore:
+    """Keeps the most recent finished traces and appends each to TRACE_LOG_FILE when set."""
+
+    def __init__(self, buffer_size=TRACE_BUFFER_SIZE, log_file=TRACE_LOG_FILE):
+        self._traces = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self._file_logger = None
+        if log_file:
+            handler = RotatingFileHandler(log_file, maxBytes=TRACE_LOG_MAX_BYTES, backupCount=TRACE_LOG_BACKUPS)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._file_logger = logging.getLogger("erp.traces")
+            self._file_logger.setLevel(logging.INFO)
+            self._file_logger.propagate = False
+            self._file_logger.addHandler(handler)
+
+    def add(self, trace):
+        entry = trace.to_dict()
+        with self._lock:
+            self.recorded += 1
+            self._traces.append(entry)
+        if self._file_logger is not None:
+            self._file_logger.info(encode_json(entry).decode("utf-8"))
+
+    def recent(self, limit=None):
+        """Returns summaries of the buffered traces, newest first."""
+        with self._lock:
+            traces = list(self._traces)
+        traces.reverse()
+        if limit:
+            traces = traces[:limit]
+        return [summarize_trace(entry) for entry in traces]
+
+    def snapshot(self):
+        """Returns the buffered traces, oldest first."""
+        with self._lock:
+            return list(self._traces)
+
+    def get(self, trace_id):
+        with self._lock:
+            for entry in self._traces:
+                if entry["trace_id"] == trace_id:
+                    return entry
+        return None
+
+
+trace_store = TraceStore()
+
+
+# --- Flask integration ---
+
+def init_tracing(app):
+    """Opens a root span for a TRACE_SAMPLE_RATE share of requests and stores the finished tree.
+
+    Streamed responses are finished when the stream closes, so statements run
+    while the body is produced land in the same trace.
+    """
+    if TRACE_SAMPLE_RATE <= 0:
+        logger.info("Request tracing disabled (TRACE_SAMPLE_RATE=0).")
+        return
+
+    def _finish(trace, token):
+        trace.root.duration = time.perf_counter() - trace.root.start
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            _current_span.set(None) # Closed from a different context than the one it was opened in
+        try:
+            trace_store.add(trace)
+        except Exception as e:
+            logger.error(f"Failed to store trace {trace.trace_id}: {e}", exc_info=True)
+
+    @app.before_request
+    def _start_trace():
+        if random.random() >= TRACE_SAMPLE_RATE:
+            return
+        route = request.url_rule.rule if request.url_rule else request.path
+        trace = Trace(f"{request.method} {route}", {"path": request.path})
+        g.trace = trace
+        g.trace_token = _current_span.set(trace.root)
+
+    @app.after_request
+    def _annotate_trace(response):
+        trace = g.get("trace")
+        if trace is not None:
+            trace.root.attrs["status"] = response.status_code
+            response.headers["X-Trace-Id"] = trace.trace_id
+            if response.is_streamed:
+                token = g.pop("trace_token")
+                response.call_on_close(lambda: _finish(trace, token))
+        return response
+
+    @app.teardown_request
+    def _end_trace(exc):
+        trace = g.get("trace")
+        token = g.get("trace_token")
+        if trace is not None and token is not None:
+            if exc is not None:
+                trace.root.attrs["error"] = type(exc).__name__
+            _finish(trace, token)
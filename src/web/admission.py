@@ -0,0 +1,129 @@
+# Admission control: per-endpoint-group concurrency limits and 503 + Retry-After under saturation
+
+import os
+import logging
+import threading
+from functools import wraps
+
+from flask import jsonify
+
+from src.db.pool import PoolSaturatedError, checkout_rejected, reset_checkout_rejected
+from src.observability.metrics import registry
+
+# Configure logger for this module
+logger = logging.getLogger(__name__)
+
+RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", 1))
+QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_MS", 100)) / 1000.0
+# Concurrent requests per group in one worker; groups not listed are unlimited.
+DEFAULT_LIMITS = "reports=4,batch=4,import=2"
+
+
+class AdmissionRejectedError(Exception):
+    """Raised when an endpoint group is at its concurrency limit."""
+
+    def __init__(self, group):
+        self.group = group
+        super().__init__(f"Too many concurrent '{group}' requests.")
+
+
+def _parse_limits(spec):
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, value = item.partition("=")
+        try:
+            limits[name.strip()] = int(value)
+        except ValueError:
+            logger.warning(f"Ignoring invalid ADMISSION_LIMITS entry: {item!r}")
+    return limits
+
+
+class ConcurrencyLimiter:
+    """Caps concurrent requests in one group; extra requests wait up to QUEUE_TIMEOUT, then are rejected."""
+
+    def __init__(self, group, limit):
+        self.group = group
+        self.limit = limit
+        self.in_flight = 0
+        self.rejected = 0
+        self._slots = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        if not self._slots.acquire(timeout=QUEUE_TIMEOUT):
+            with self._lock:
+                self.rejected += 1
+            raise AdmissionRejectedError(self.group)
+        with self._lock:
+            self.in_flight += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+        return False
+
+
+limiters = {group: ConcurrencyLimiter(group, limit)
+            for group, limit in _parse_limits(os.getenv("ADMISSION_LIMITS", DEFAULT_LIMITS)).items() if limit > 0}
+
+registry.gauge("erp_admission_in_flight", "Requests running per admission group.", ("group",),
+               lambda: (((name,), limiter.in_flight) for name, limiter in limiters.items()))
+registry.gauge("erp_admission_rejections_total", "Requests rejected with 503 because their group was at its limit.", ("group",),
+               lambda: (((name,), limiter.rejected) for name, limiter in limiters.items()), type_name="counter")
+
+
+def admission(group):
+    """Decorates a view so at most ADMISSION_LIMITS[group] run at once in this worker.
+
+    Keeps slow endpoints (reports, bulk writes) from taking every pooled
+    connection away from order posting.
+    """
+    def decorator(view):
+        limiter = limiters.get(group)
+        if limiter is None:
+            return view
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            with limiter:
+                return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def busy_response(message):
+    response = jsonify({"error": message, "retry_after": RETRY_AFTER})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(RETRY_AFTER)
+    return response
+
+
+def init_admission(app):
+    """Turns saturation into fast 503 responses with Retry-After.
+
+    Views and services catch broad exceptions and answer 500, 400 or even an
+    empty 200 report, so a rejected pool checkout is also recognized after
+    the fact from a flag the pool sets for the current request.
+    """
+
+    @app.errorhandler(AdmissionRejectedError)
+    def _admission_rejected(e):
+        logger.warning(f"Admission rejected: {e}")
+        return busy_response(str(e))
+
+    @app.errorhandler(PoolSaturatedError)
+    def _pool_saturated(e):
+        logger.warning(f"Database pool saturated: {e}")
+        return busy_response("Service is busy; retry shortly.")
+
+    @app.before_request
+    def _reset_saturation():
+        reset_checkout_rejected()
+
+    @app.after_request
+    def _saturation_to_503(response):
+        if response.status_code != 503 and checkout_rejected():
+            return busy_response("Service is busy; retry shortly.")
+        return response
@@ -0,0 +1,98 @@
+# Conditional GET (ETag / Last-Modified) for the read endpoints
+
+import time
+import logging
+from functools import wraps
+
+from flask import make_response, request
+
+from src.db.versions import get_versions
+from src.web.stickiness import STICKY_COOKIE
+
+# Configure logger for this module
+logger = logging.getLogger(__name__)
+
+
+def _etag(resources, versions):
+    return "-".join(f"{name}.{versions.get(name, 0)}" for name in resources)
+
+
+def _set_validators(response, etag, last_modified):
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Let browsers keep the body but revalidate on every navigation.
+    response.cache_control.no_cache = True
+    return response
+
+
+def _is_not_modified(etag, last_modified):
+    if request.if_none_match:
+        # If-None-Match wins over If-Modified-Since when both are sent (RFC 9110).
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified is not None:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+
+def _recent_writer():
+    # Set on the responses to this client's writes (see src/web/stickiness.py);
+    # the write may have gone through a worker whose commit this one has not seen.
+    until = request.cookies.get(STICKY_COOKIE)
+    try:
+        return until is not None and float(until) > time.time()
+    except ValueError:
+        return False
+
+
+def conditional(*resources, with_ids=()):
+    """Decorates a GET view so it is validated against the versions of resources.
+
+    The validators are computed from resource_versions before the view runs
+    (cached in process for RESOURCE_VERSIONS_TTL seconds, so they usually
+    cost no query); a matching If-None-Match / If-Modified-Since
+    is answered with 304 without calling the view at all. A client that
+    wrote within STICKY_SECONDS is validated against uncached versions, so
+    it never gets a 304 for data from before its own write. Successful responses
+    carry a weak ETag, Last-Modified and Cache-Control: no-cache. If the
+    versions cannot be read the view runs unconditionally. with_ids names
+    extra resources embedded in the response when the request has ?ids=
+    (a batch read of full order details includes product data).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            names = resources + with_ids if "ids" in request.args else resources
+            try:
+                versions, last_modified = get_versions(names, fresh=_recent_writer())
+            except Exception as e:
+                logger.warning(f"Could not read resource versions for {names}, serving {request.path} unconditionally: {e}")
+                return view(*args, **kwargs)
+            etag = _etag(names, versions)
+            if _is_not_modified(etag, last_modified):
+                logger.info(f"Not modified: {request.path} (ETag {etag})")
+                return _set_validators(make_response("", 304), etag, last_modified)
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                _set_validators(response, etag, last_modified)
+            return response
+        return wrapper
+    return decorator
+
+
+def content_etag(view):
+    """Decorates a GET view so its ETag is a hash of the response body.
+
+    For single-record reads served from a cache: a write to one record does
+    not change the validators of any other, and no version lookup is needed.
+    The view always runs; a matching If-None-Match only saves the body.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200:
+            response.add_etag(weak=True)
+            response.cache_control.no_cache = True
+            response.make_conditional(request)
+        return response
+    return wrapper
@@ -0,0 +1,60 @@
+# Per-endpoint latency budgets: starts each request's deadline and answers 504 when it runs out
+
+import os
+import logging
+
+from flask import g, jsonify, request
+
+from src.db.deadlines import DeadlineExceededError, clear_deadline, current_deadline, set_deadline
+from src.observability.metrics import request_deadline_exceeded
+
+# Configure logger for this module
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUDGET_MS = int(os.getenv("REQUEST_BUDGET_MS", 5000))
+
+
+def timeout_response(deadline):
+    response = jsonify({"error": f"Request exceeded its {deadline.budget_ms} ms deadline.",
+                        "budget_ms": deadline.budget_ms})
+    response.status_code = 504
+    return response
+
+
+def init_deadlines(app, budgets, default_ms=DEFAULT_BUDGET_MS):
+    """Gives every request a deadline of budgets[endpoint] milliseconds (default_ms if not listed).
+
+    A budget of None (or 0) disables the deadline for that endpoint. The
+    deadline reaches the service layer through a context variable that pool
+    checkouts read (see src/db/deadlines.py), and it is cleared at teardown:
+    a streamed body is produced after that, so exports are not bounded by it.
+    """
+
+    @app.before_request
+    def _start_deadline():
+        budget_ms = budgets.get(request.endpoint, default_ms)
+        if budget_ms:
+            g.deadline_token = set_deadline(budget_ms)
+
+    @app.errorhandler(DeadlineExceededError)
+    def _deadline_exceeded(e):
+        return timeout_response(current_deadline())
+
+    @app.after_request
+    def _deadline_to_504(response):
+        # Services turn a cancelled statement into their own 500/400, so the
+        # deadline's record of where it ran out decides the status.
+        deadline = current_deadline()
+        if deadline is not None and deadline.exceeded:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            request_deadline_exceeded.inc(route, deadline.exceeded)
+            logger.warning(f"{request.method} {route} exceeded its {deadline.budget_ms} ms deadline ({deadline.exceeded}).")
+            if response.status_code != 504:
+                return timeout_response(deadline)
+        return response
+
+    @app.teardown_request
+    def _clear_deadline(exc):
+        token = g.pop("deadline_token", None)
+        if token is not None:
+            clear_deadline(token)
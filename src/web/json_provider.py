@@ -0,0 +1,26 @@
+# Flask JSON provider backed by src.db.rows.encode_json (orjson when installed)
+
+from flask.json.provider import JSONProvider
+
+from src.db.rows import encode_json, decode_json, orjson
+
+
+class ERPJSONProvider(JSONProvider):
+    """Serializes responses with encode_json instead of Flask's stdlib provider.
+
+    Decimal, date/datetime and RowSet values are encoded directly, so services
+    can return raw result tuples for large lists. Response bodies are written
+    as bytes without an intermediate str. Install with app.json = ERPJSONProvider(app).
+    """
+
+    backend = "orjson" if orjson is not None else "json"
+
+    def dumps(self, obj, **kwargs):
+        return encode_json(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return decode_json(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(encode_json(obj) + b"\n", mimetype="application/json")
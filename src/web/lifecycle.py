@@ -0,0 +1,170 @@
+# Worker lifecycle: post-fork initialization and warm-up, graceful draining, liveness/readiness probes
+
+import os
+import time
+import signal
+import logging
+import threading
+
+from flask import Blueprint, g, jsonify
+
+from src.db.pool import warm_pool, check_database, close_pool
+from src.observability import multiprocess
+
+# Configure logger for this module
+logger = logging.getLogger(__name__)
+
+DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", 25))
+# Seconds a worker keeps serving after SIGTERM with /readyz answering 503, so load
+# balancers stop routing to it before it stops accepting connections.
+READINESS_DELAY = float(os.getenv("SHUTDOWN_READINESS_DELAY", 5))
+
+
+class WorkerState:
+    """Readiness and in-flight request count of the current worker process."""
+
+    def __init__(self):
+        self.ready = False
+        self.draining = False
+        self.in_flight = 0
+        self.started_at = time.time()
+        self.warm_ups = []
+        self._cond = threading.Condition()
+
+    def request_started(self):
+        with self._cond:
+            self.in_flight += 1
+
+    def request_finished(self):
+        with self._cond:
+            self.in_flight -= 1
+            if self.in_flight <= 0:
+                self._cond.notify_all()
+
+    def wait_idle(self, timeout):
+        """Waits until no request is in flight; returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.in_flight <= 0, timeout=timeout)
+
+    def reset_after_fork(self):
+        # Counters and the condition's lock may have been copied mid-update from the parent.
+        self.ready = False
+        self.draining = False
+        self.in_flight = 0
+        self.started_at = time.time()
+        self._cond = threading.Condition()
+
+
+worker_state = WorkerState()
+os.register_at_fork(after_in_child=worker_state.reset_after_fork)
+
+
+def init_worker():
+    """Per-process startup, run in each worker after the fork and before it takes traffic.
+
+    Starts sharing its metrics when METRICS_MULTIPROC_DIR is set, opens this
+    process's own pool, checks its connections and runs the registered
+    warm-ups (e.g. the category cache). A failure is logged and
+    leaves the worker not ready; /readyz retries the warm-up on each probe.
+    """
+    started = time.perf_counter()
+    multiprocess.start_worker()
+    try:
+        connections = warm_pool()
+        for warm_up in worker_state.warm_ups:
+            warm_up()
+    except Exception as e:
+        logger.error(f"Worker {os.getpid()} warm-up failed: {e}", exc_info=True)
+        return False
+    worker_state.ready = True
+    logger.info(f"Worker {os.getpid()} ready: {connections} connections warmed in {(time.perf_counter() - started) * 1000:.0f} ms.")
+    return True
+
+
+def install_drain_signal(delay=READINESS_DELAY):
+    """Makes SIGTERM fail readiness at once and reach the server's own handler delay seconds later.
+
+    gunicorn's worker stops accepting connections as soon as its SIGTERM
+    handler runs, after which no probe can see /readyz answer 503. Call from
+    the worker's main thread once the server has installed its handlers
+    (gunicorn's post_worker_init). A second SIGTERM hands over immediately.
+    """
+    previous = signal.getsignal(signal.SIGTERM)
+    if not callable(previous):
+        logger.warning(f"Worker {os.getpid()} has no SIGTERM handler to defer to; readiness will not fail before shutdown.")
+        return
+
+    def _start_draining(signum, frame):
+        if worker_state.draining:
+            previous(signum, frame)
+            return
+        worker_state.draining = True
+        worker_state.ready = False
+        logger.info(f"Worker {os.getpid()} received SIGTERM: failing readiness for {delay:g}s before it stops accepting requests.")
+        handover = threading.Timer(delay, previous, args=(signum, frame))
+        handover.daemon = True
+        handover.start()
+
+    signal.signal(signal.SIGTERM, _start_draining)
+
+
+def shutdown_worker(timeout=DRAIN_TIMEOUT):
+    """Drains the worker: fails readiness, waits for in-flight requests, then closes the pool."""
+    worker_state.draining = True
+    worker_state.ready = False
+    if not worker_state.wait_idle(timeout):
+        logger.warning(f"Worker {os.getpid()} closing with {worker_state.in_flight} requests still in flight after {timeout:.0f}s.")
+    close_pool()
+    multiprocess.stop_worker()
+    logger.info(f"Worker {os.getpid()} drained and closed its database connections.")
+
+
+health = Blueprint("health", __name__)
+
+
+@health.route("/healthz", methods=["GET"])
+def liveness():
+    # Liveness only says the process serves HTTP; it must not depend on the database,
+    # or a database outage would get every worker restarted.
+    return jsonify({"status": "alive", "pid": os.getpid(), "uptime_s": round(time.time() - worker_state.started_at, 1)})
+
+
+@health.route("/readyz", methods=["GET"])
+def readiness():
+    if worker_state.draining:
+        return jsonify({"status": "draining", "pid": os.getpid()}), 503
+    if not worker_state.ready and not init_worker():
+        return jsonify({"status": "starting", "pid": os.getpid()}), 503
+    try:
+        check_database()
+    except Exception as e:
+        logger.warning(f"Readiness check failed: {e}")
+        return jsonify({"status": "database unavailable", "pid": os.getpid()}), 503
+    return jsonify({"status": "ready", "pid": os.getpid(), "in_flight": worker_state.in_flight})
+
+
+def init_lifecycle(app, warm_ups=()):
+    """Registers the probes and the in-flight request counting that draining waits on.
+
+    A streamed response (e.g. an export) stays in flight until the server
+    closes its body, not just until the view returns, so draining does not
+    close the pool under it.
+    """
+    worker_state.warm_ups = list(warm_ups)
+    app.register_blueprint(health)
+
+    @app.before_request
+    def _count_request():
+        worker_state.request_started()
+        g.lifecycle_counted = True
+
+    @app.after_request
+    def _count_until_closed(response):
+        if response.is_streamed and g.pop("lifecycle_counted", False):
+            response.call_on_close(worker_state.request_finished)
+        return response
+
+    @app.teardown_request
+    def _uncount_request(exc):
+        if g.pop("lifecycle_counted", False):
+            worker_state.request_finished()
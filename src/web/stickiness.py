@@ -0,0 +1,45 @@
+# Read-your-writes across requests: a client that just wrote reads from the primary for a while
+
+import math
+import time
+import logging
+
+from flask import request
+
+from src.db.replicas import replicas, STICKY_SECONDS, reset_routing, stick_to_primary, wrote
+
+# Configure logger for this module
+logger = logging.getLogger(__name__)
+
+STICKY_COOKIE = "erp_primary_until"
+
+
+def init_stickiness(app):
+    """Keeps a client's reads on the primary for STICKY_SECONDS after it wrote.
+
+    Within a request, reads after a commit already stay on the primary (see
+    src/db/replicas.py). Across requests the response to a write carries a
+    cookie with the time until which replicas may still be missing it. A
+    no-op without DATABASE_REPLICA_URLS.
+    """
+    if not replicas:
+        return
+    logger.info(f"Routing read-only queries to {len(replicas)} replica(s); writers stick to the primary for {STICKY_SECONDS:g}s.")
+
+    @app.before_request
+    def _restore_stickiness():
+        reset_routing()
+        until = request.cookies.get(STICKY_COOKIE)
+        if until:
+            try:
+                if float(until) > time.time():
+                    stick_to_primary()
+            except ValueError:
+                pass
+
+    @app.after_request
+    def _set_stickiness(response):
+        if wrote():
+            response.set_cookie(STICKY_COOKIE, f"{time.time() + STICKY_SECONDS:.3f}",
+                                max_age=math.ceil(STICKY_SECONDS), httponly=True, samesite="Lax")
+        return response
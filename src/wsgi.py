@@ -0,0 +1,7 @@
+# Production WSGI entry point: gunicorn -c gunicorn.conf.py src.wsgi:app
+
+from src.app import create_app
+
+# Built once; with preload_app the master builds it and every worker inherits it.
+# Database connections are opened per worker after the fork (src/web/lifecycle.py).
+app = create_app()
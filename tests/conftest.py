@@ -0,0 +1,92 @@
+# Shared fixtures: a throwaway PostgreSQL database for the tests that need one
+
+import os
+import uuid
+
+import psycopg2
+import pytest
+
+# The service modules read their settings at import time, so point them at the test
+# database (or at nothing) before anything under src/ is imported.
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+# A streaming replica of TEST_DATABASE_URL's cluster, for the read-routing tests.
+TEST_DATABASE_REPLICA_URL = os.getenv("TEST_DATABASE_REPLICA_URL")
+if TEST_DATABASE_URL:
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+else:
+    os.environ.pop("DATABASE_URL", None)
+for name in ("REDIS_HOST", "DATABASE_REPLICA_URLS", "METRICS_MULTIPROC_DIR"):
+    os.environ.pop(name, None)
+os.environ["ACCESS_LOG_ENABLED"] = "false"
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+MIGRATIONS_DIR = os.path.join(TESTS_DIR, os.pardir, "database_design", "migrations")
+
+
+def load_schema(dsn):
+    """Recreates the public schema from tests/schema.sql plus every migration. Destroys all data."""
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("DROP SCHEMA public CASCADE; CREATE SCHEMA public;")
+            with open(os.path.join(TESTS_DIR, "schema.sql")) as f:
+                cur.execute(f.read())
+            for name in sorted(os.listdir(MIGRATIONS_DIR)):
+                with open(os.path.join(MIGRATIONS_DIR, name)) as f:
+                    cur.execute(f.read())
+    finally:
+        conn.close()
+
+
+@pytest.fixture(scope="session")
+def database_url():
+    if not TEST_DATABASE_URL:
+        pytest.skip("Set TEST_DATABASE_URL to a throwaway PostgreSQL database to run the database tests.")
+    return TEST_DATABASE_URL
+
+
+@pytest.fixture(scope="session")
+def replica_url(database_url):
+    if not TEST_DATABASE_REPLICA_URL:
+        pytest.skip("Set TEST_DATABASE_REPLICA_URL to a streaming replica of the test database to run the replica tests.")
+    return TEST_DATABASE_REPLICA_URL
+
+
+@pytest.fixture(scope="session")
+def schema(database_url):
+    load_schema(database_url)
+    return database_url
+
+
+@pytest.fixture
+def db(schema):
+    """A fresh shared pool on the test database; the product cache starts empty."""
+    from src.db.pool import init_pool, close_pool
+    from src.cache.product_cache import product_cache
+    from src.db import versions
+
+    product_cache.clear()
+    versions.clear_cache()
+    init_pool(schema, min_conn=1, max_conn=5)
+    yield schema
+    close_pool()
+    product_cache.clear()
+
+
+@pytest.fixture(scope="session")
+def app():
+    from src.app import create_app
+
+    return create_app()
+
+
+@pytest.fixture
+def client(app, db):
+    return app.test_client()
+
+
+@pytest.fixture
+def sku():
+    """A SKU no other test uses (the schema is shared by the whole session)."""
+    return f"T-{uuid.uuid4().hex[:12]}"
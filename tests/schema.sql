@@ -0,0 +1,105 @@
+-- Tables the backend services use, as described in database_design/postgres_schema.md.
+-- Loaded into the test database by tests/conftest.py before the migrations are applied.
+
+CREATE TABLE categories (
+    category_id SERIAL PRIMARY KEY,
+    category_name VARCHAR(255) UNIQUE NOT NULL,
+    description TEXT
+);
+
+CREATE TABLE products (
+    product_id SERIAL PRIMARY KEY,
+    sku VARCHAR(255) UNIQUE NOT NULL,
+    product_name VARCHAR(255) NOT NULL,
+    description TEXT,
+    category_id INTEGER REFERENCES categories (category_id),
+    unit_price DECIMAL(10, 2) NOT NULL,
+    average_cost DECIMAL(10, 2) DEFAULT 0.00,
+    last_purchase_price DECIMAL(10, 2),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE inventory_levels (
+    inventory_id SERIAL PRIMARY KEY,
+    product_id INTEGER UNIQUE REFERENCES products (product_id),
+    available_quantity INTEGER NOT NULL DEFAULT 0,
+    inventory_level_status VARCHAR(50) NOT NULL CHECK (inventory_level_status IN ('In Stock', 'Low Stock', 'Out of Stock')),
+    reorder_point INTEGER DEFAULT 0,
+    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE customers (
+    customer_id SERIAL PRIMARY KEY,
+    customer_name VARCHAR(255) NOT NULL,
+    email VARCHAR(255) UNIQUE,
+    phone VARCHAR(50),
+    address_line1 VARCHAR(255),
+    address_line2 VARCHAR(255),
+    city VARCHAR(100),
+    state_province VARCHAR(100),
+    postal_code VARCHAR(20),
+    country VARCHAR(100),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE sales_orders (
+    order_id SERIAL PRIMARY KEY,
+    order_number VARCHAR(255) UNIQUE NOT NULL,
+    customer_id INTEGER REFERENCES customers (customer_id),
+    order_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    total_amount DECIMAL(12, 2) NOT NULL,
+    status VARCHAR(50) NOT NULL DEFAULT 'Pending',
+    shipping_address_line1 VARCHAR(255),
+    shipping_address_line2 VARCHAR(255),
+    shipping_city VARCHAR(100),
+    shipping_state_province VARCHAR(100),
+    shipping_postal_code VARCHAR(20),
+    shipping_country VARCHAR(100),
+    notes TEXT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE sales_order_items (
+    order_item_id SERIAL PRIMARY KEY,
+    order_id INTEGER REFERENCES sales_orders (order_id),
+    product_id INTEGER REFERENCES products (product_id),
+    sku VARCHAR(255) NOT NULL,
+    quantity INTEGER NOT NULL,
+    unit_price DECIMAL(10, 2) NOT NULL,
+    line_total DECIMAL(12, 2) NOT NULL
+);
+
+CREATE TABLE suppliers (
+    supplier_id SERIAL PRIMARY KEY,
+    supplier_name VARCHAR(255) NOT NULL,
+    contact_name VARCHAR(255),
+    email VARCHAR(255) UNIQUE,
+    phone VARCHAR(50),
+    address_line1 VARCHAR(255),
+    city VARCHAR(100),
+    country VARCHAR(100),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE purchase_orders (
+    po_id SERIAL PRIMARY KEY,
+    po_number VARCHAR(255) UNIQUE NOT NULL,
+    supplier_id INTEGER REFERENCES suppliers (supplier_id),
+    order_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expected_delivery_date TIMESTAMP,
+    total_amount DECIMAL(12, 2) NOT NULL,
+    status VARCHAR(50) NOT NULL DEFAULT 'Pending',
+    notes TEXT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE purchase_order_items (
+    po_item_id SERIAL PRIMARY KEY,
+    po_id INTEGER REFERENCES purchase_orders (po_id),
+    product_id INTEGER REFERENCES products (product_id),
+    sku VARCHAR(255) NOT NULL,
+    quantity INTEGER NOT NULL,
+    unit_cost DECIMAL(10, 2) NOT NULL,
+    line_total DECIMAL(12, 2) NOT NULL
+);
@@ -0,0 +1,74 @@
+from datetime import datetime
+
+import pytest
+
+from src import app as app_module
+from src.core_modules.product_management.product_service import ProductService
+from src.core_modules.sales_management.sales_service import SalesService
+from src.core_modules.purchase_management.purchase_service import PurchaseService
+
+
+@pytest.fixture
+def two_products(db, sku):
+    products = ProductService()
+    products.add_product(sku, "Widget", "Tools", quantity=4, unit_price=1.5)
+    products.add_product(sku + "-B", "Gadget", "Gear", quantity=9, unit_price=2.0)
+    return [sku, sku + "-B"]
+
+
+def test_multi_get_returns_request_order_and_omits_missing(client, two_products):
+    first, second = two_products
+    response = client.get(f"/api/products?skus={second},{first}-MISSING,{first}")
+    assert response.status_code == 200
+    assert [product["sku"] for product in response.get_json()] == [second, first]
+    assert response.get_json()[1] == ProductService().get_product_by_sku(first)
+
+
+def test_multi_get_fields_whitelist(client, two_products):
+    first, second = two_products
+    response = client.get(f"/api/products?skus={first},{second}&fields=quantity,category")
+    assert response.status_code == 200
+    assert response.get_json() == [
+        {"sku": first, "quantity": 4, "category": "Tools"},
+        {"sku": second, "quantity": 9, "category": "Gear"},
+    ]
+
+
+@pytest.mark.parametrize("query", ["skus={sku}&fields=unit_price,password", "fields=unit_price", "skus=,"])
+def test_multi_get_rejects_bad_arguments(client, sku, query):
+    response = client.get("/api/products?" + query.format(sku=sku))
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_multi_get_key_limit(client, monkeypatch):
+    monkeypatch.setattr(app_module, "BATCH_READ_MAX_KEYS", 3)
+    assert client.get("/api/products?skus=A,B,C").status_code == 200
+    response = client.get("/api/products?skus=A,B,C,D")
+    assert response.status_code == 400
+    assert "at most 3" in response.get_json()["error"]
+
+
+def test_order_ids_return_full_details_in_request_order(client, sku):
+    ProductService().add_product(sku, "Widget", "Tools", quantity=10, unit_price=1.0)
+    sales = SalesService()
+    first, second = (sales.record_sale("Batch Customer", [{"sku": sku, "quantity": n}], datetime.now().isoformat())["order_id"] for n in (1, 2))
+    purchase = PurchaseService().record_purchase("Batch Supplier", [{"sku": sku, "quantity": 5, "cost_price": 0.5}], datetime.now().isoformat())["po_id"]
+
+    response = client.get(f"/api/sales?ids={second},999999999,{first}")
+    assert response.status_code == 200
+    assert [order["order_id"] for order in response.get_json()] == [second, first]
+    assert response.get_json()[0] == client.get(f"/api/sales/{second}").get_json()
+    assert [line["quantity"] for line in response.get_json()[0]["items"]] == [2]
+
+    response = client.get(f"/api/purchases?ids={purchase}")
+    assert [order["po_id"] for order in response.get_json()] == [purchase]
+    assert response.get_json()[0] == client.get(f"/api/purchases/{purchase}").get_json()
+
+
+@pytest.mark.parametrize("path", ["/api/sales", "/api/purchases"])
+def test_order_ids_reject_bad_arguments(client, monkeypatch, path):
+    assert client.get(path + "?ids=1,x").status_code == 400
+    monkeypatch.setattr(app_module, "BATCH_READ_MAX_KEYS", 2)
+    assert client.get(path + "?ids=1,2").status_code == 200
+    assert client.get(path + "?ids=1,2,3").status_code == 400
@@ -0,0 +1,118 @@
+import time
+from datetime import datetime
+
+import psycopg2
+import pytest
+
+from src.db import versions
+from src.db.pool import execute_query, transaction
+from src.core_modules.product_management import product_service as product_module
+from src.core_modules.product_management.product_service import ProductService
+from src.core_modules.purchase_management.purchase_service import PurchaseService
+from src.web.stickiness import STICKY_COOKIE
+
+
+def _etag(response):
+    assert response.status_code == 200
+    return response.headers["ETag"]
+
+
+def test_list_revalidates_until_a_write(client, sku):
+    etag = _etag(client.get("/api/products"))
+    assert client.get("/api/products", headers={"If-None-Match": etag}).status_code == 304
+
+    ProductService().add_product(sku, "Widget", "Tools", quantity=1, unit_price=1.0)
+    # A write through this worker drops its cached versions straight away.
+    response = client.get("/api/products", headers={"If-None-Match": etag})
+    assert _etag(response) != etag
+
+
+def test_versions_are_cached_in_process(db, monkeypatch):
+    calls = []
+    real_execute_query = versions.execute_query
+
+    def counting_execute_query(*args, **kwargs):
+        calls.append(args[0])
+        return real_execute_query(*args, **kwargs)
+
+    monkeypatch.setattr(versions, "execute_query", counting_execute_query)
+    first = versions.get_versions(("products", "sales"))
+    assert versions.get_versions(("products", "sales")) == first
+    assert versions.get_versions(("sales",))[0] == {"sales": first[0]["sales"]}
+    assert len(calls) == 1
+
+    monkeypatch.setattr(versions, "VERSIONS_TTL", 0)
+    versions.get_versions(("products",))
+    assert len(calls) == 2
+
+
+def test_read_between_bump_and_commit_is_not_cached(db):
+    before = versions.get_versions(("products",))[0]
+    with transaction() as cur:
+        versions.bump_versions(cur, "products")
+        # Another request of this worker, on its own connection, still sees the old counter.
+        assert versions.get_versions(("products",))[0] == before
+    assert versions.get_versions(("products",))[0]["products"] == before["products"] + 1
+
+
+def test_recent_writer_skips_the_cached_versions(client):
+    etag = _etag(client.get("/api/products"))
+    # A write committed by another worker: this one's cached counters do not see it yet.
+    execute_query("UPDATE resource_versions SET version = version + 1 WHERE resource_name = 'products' AND shard = 0;", commit=True)
+    assert client.get("/api/products", headers={"If-None-Match": etag}).status_code == 304
+
+    client.set_cookie(STICKY_COOKIE, f"{time.time() + 60:.3f}") # This client wrote through it
+    response = client.get("/api/products", headers={"If-None-Match": etag})
+    assert _etag(response) != etag
+
+
+def test_product_etag_only_changes_with_that_product(client, sku):
+    products = ProductService()
+    other = sku + "-B"
+    products.add_product(sku, "Widget", "Tools", quantity=1, unit_price=1.0)
+    products.add_product(other, "Gadget", "Tools", quantity=1, unit_price=1.0)
+    etag = _etag(client.get(f"/api/products/{sku}"))
+
+    products.update_product(other, {"unit_price": 2.0})
+    assert client.get(f"/api/products/{sku}", headers={"If-None-Match": etag}).status_code == 304
+
+    products.update_product(sku, {"unit_price": 3.0})
+    response = client.get(f"/api/products/{sku}", headers={"If-None-Match": etag})
+    assert _etag(response) != etag
+    assert response.get_json()["unit_price"] == 3.0
+
+
+def test_failed_version_bump_rolls_back_the_write(db, monkeypatch, sku):
+    products = ProductService()
+    products.add_product(sku, "Widget", "Tools", quantity=1, unit_price=1.0)
+
+    def failing_bump(cur, *resources):
+        raise psycopg2.OperationalError("bump failed")
+
+    monkeypatch.setattr(product_module, "bump_versions", failing_bump)
+    with pytest.raises(psycopg2.OperationalError):
+        products.update_product(sku, {"unit_price": 9.0})
+    assert products.get_product_by_sku(sku)["unit_price"] == 1.0
+
+
+def test_invalid_purchase_leaves_nothing_behind(db, sku):
+    products = ProductService()
+    products.add_product(sku, "Widget", "Tools", quantity=1, unit_price=1.0)
+    supplier = f"Supplier {sku}"
+    before = versions.get_versions(("purchases",))[0]
+
+    result = PurchaseService().record_purchase(
+        supplier, [{"sku": sku, "quantity": 1, "cost_price": 0.5}, {"sku": sku + "-MISSING", "quantity": 1, "cost_price": 0.5}],
+        datetime.now().isoformat(), status="Received"
+    )
+    assert "not found" in result["error"]
+    assert products.get_product_by_sku(sku)["quantity"] == 1
+    versions.clear_cache()
+    assert versions.get_versions(("purchases",))[0] == before
+    conn = psycopg2.connect(db)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*) FROM suppliers WHERE supplier_name = %s", (supplier,))
+            assert cur.fetchone()[0] == 0
+    finally:
+        conn.close()
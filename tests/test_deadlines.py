@@ -0,0 +1,80 @@
+from contextlib import ExitStack
+
+import pytest
+from psycopg2.errors import QueryCanceled
+
+import src.app as app_module
+from src.db import instrumentation
+from src.db.deadlines import DeadlineExceededError, clear_deadline, current_deadline, set_deadline
+from src.db.pool import connection, execute_query, transaction
+
+
+@pytest.fixture
+def deadline():
+    tokens = []
+
+    def start(budget_ms):
+        tokens.append(set_deadline(budget_ms))
+        return current_deadline()
+
+    yield start
+    for token in reversed(tokens):
+        clear_deadline(token)
+
+
+def test_timeout_rides_on_the_first_statement(db, deadline, monkeypatch):
+    def separate_round_trip(conn):
+        raise AssertionError("SET LOCAL sent in a round trip of its own")
+
+    monkeypatch.setattr(instrumentation, "apply_statement_timeout", separate_round_trip)
+    deadline(5000)
+    with transaction() as cur:
+        cur.execute("SELECT 1")
+        cur.execute("SHOW statement_timeout")
+        timeout = cur.fetchone()[0]
+    assert timeout.endswith("ms") and 4000 < int(timeout[:-2]) <= 5000
+    with transaction() as cur:
+        cur.execute("SELECT 1")
+        assert cur.fetchone() == (1,) # The SET's own result does not leak into the caller's
+
+
+def test_no_timeout_without_a_deadline(db):
+    with transaction() as cur:
+        cur.execute("SELECT 1")
+        cur.execute("SHOW statement_timeout")
+        assert cur.fetchone()[0] == "0"
+
+
+def test_statement_cancelled_at_the_deadline(db, deadline):
+    current = deadline(200)
+    with pytest.raises(QueryCanceled):
+        execute_query("SELECT pg_sleep(2)")
+    assert current.exceeded == "statement"
+
+
+def test_checkout_expires_at_the_deadline(db, deadline):
+    current = deadline(100)
+    with ExitStack() as held:
+        for _ in range(5): # The db fixture's max_conn
+            held.enter_context(connection())
+        with pytest.raises(DeadlineExceededError):
+            execute_query("SELECT 1")
+    assert current.exceeded == "checkout"
+
+
+def test_cancelled_statement_answers_504(client, monkeypatch):
+    monkeypatch.setitem(app_module.REQUEST_BUDGETS_MS, "api.get_products", 200)
+    monkeypatch.setattr(app_module.product_service, "get_all_products", lambda: execute_query("SELECT pg_sleep(2)"))
+    response = client.get("/api/products")
+    assert response.status_code == 504
+    assert response.get_json()["budget_ms"] == 200
+
+
+def test_checkout_expiry_answers_504(client, monkeypatch):
+    monkeypatch.setitem(app_module.REQUEST_BUDGETS_MS, "api.get_products", 100)
+    with ExitStack() as held:
+        for _ in range(5):
+            held.enter_context(connection())
+        response = client.get("/api/products")
+    assert response.status_code == 504
+    assert response.get_json()["budget_ms"] == 100
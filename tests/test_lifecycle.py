@@ -0,0 +1,46 @@
+import os
+import signal
+import time
+
+import pytest
+from flask import Flask, Response
+
+from src.web.lifecycle import init_lifecycle, install_drain_signal, worker_state
+
+
+@pytest.fixture
+def fresh_state():
+    worker_state.reset_after_fork()
+    yield worker_state
+    worker_state.reset_after_fork()
+
+
+def test_streamed_response_stays_in_flight_until_closed(fresh_state):
+    app = Flask(__name__)
+    init_lifecycle(app)
+
+    @app.route("/export")
+    def export():
+        return Response(iter(["[", "]"]), mimetype="application/json")
+
+    response = app.test_client().get("/export", buffered=False)
+    assert fresh_state.in_flight == 1 # The view has returned, the body is still being sent
+    assert response.get_data() == b"[]"
+    response.close()
+    assert fresh_state.in_flight == 0
+
+
+def test_sigterm_fails_readiness_before_the_server_stops(fresh_state):
+    handed_over = []
+    original = signal.signal(signal.SIGTERM, lambda signum, frame: handed_over.append(time.monotonic()))
+    try:
+        install_drain_signal(delay=0.2)
+        sent = time.monotonic()
+        os.kill(os.getpid(), signal.SIGTERM)
+        assert fresh_state.draining and not handed_over
+        deadline = time.monotonic() + 2
+        while not handed_over and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert handed_over and handed_over[0] - sent >= 0.2
+    finally:
+        signal.signal(signal.SIGTERM, original)
@@ -0,0 +1,101 @@
+import os
+
+import pytest
+
+from src.observability import multiprocess
+from src.observability.metrics import MetricsRegistry
+
+OTHER_PID = 999999 # A worker that is not this test process
+
+
+def _sample(text, prefix):
+    return [line for line in text.splitlines() if line.startswith(prefix)]
+
+
+def test_merged_sums_counters_and_histograms_and_keeps_gauges_per_process():
+    worker = MetricsRegistry()
+    requests = worker.counter("requests_total", "Requests.", ("route",))
+    latency = worker.histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+    worker.gauge("pool_idle", "Idle connections.", (), lambda: [((), 2)])
+
+    requests.inc("/a", amount=2)
+    latency.observe(0.05)
+    first = worker.snapshot()
+    requests.reset()
+    latency.reset()
+    requests.inc("/a")
+    latency.observe(0.5)
+    second = worker.snapshot()
+
+    text = worker.merged([(1, first, True), (2, second, True), (3, first, False)]).render()
+    assert _sample(text, "requests_total{") == ['requests_total{route="/a"} 5']
+    assert _sample(text, "latency_seconds_bucket") == [
+        'latency_seconds_bucket{le="0.1"} 2', 'latency_seconds_bucket{le="1.0"} 3', 'latency_seconds_bucket{le="+Inf"} 3']
+    assert _sample(text, "latency_seconds_count") == ["latency_seconds_count 3"]
+    assert _sample(text, "pool_idle{") == ['pool_idle{pid="1"} 2', 'pool_idle{pid="2"} 2'] # Exited process 3 has no gauges
+
+
+@pytest.fixture
+def shared_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(multiprocess, "MULTIPROC_DIR", str(tmp_path))
+    monkeypatch.setattr(multiprocess, "_admin_written", None)
+    multiprocess.prepare_directory()
+    return tmp_path
+
+
+def _other_worker(route_count, slow_ms, trace_id):
+    multiprocess._write_json(multiprocess._path("metrics", OTHER_PID), {
+        "pid": OTHER_PID,
+        "metrics": {"erp_http_requests_total": [[["GET", "/other", "200"], route_count]],
+                    "erp_db_pool_waiting": [[[], 3]]},
+        "caches": {"categories": {"hits": 3, "misses": 1, "hit_ratio": 0.75, "entries": 2, "max_entries": 10}},
+    })
+    multiprocess._write_json(multiprocess._path("admin", OTHER_PID), {
+        "pid": OTHER_PID,
+        "slow_queries": {"recorded": 1, "entries": [{"fingerprint": "SELECT slow", "duration_ms": slow_ms}]},
+        "traces": {"recorded": 1, "entries": [{"trace_id": trace_id, "ts": "2999-01-01T00:00:00.000+00:00", "name": "GET /other",
+                                               "duration_ms": 1.0, "spans": 1, "dropped_spans": 0,
+                                               "root": {"name": "GET /other", "attrs": {"status": 200}}}]},
+    })
+
+
+def test_endpoints_report_every_worker(shared_dir):
+    _other_worker(route_count=7, slow_ms=123456.0, trace_id="feedfacefeedface")
+
+    text = multiprocess.render_metrics()
+    assert 'erp_http_requests_total{method="GET",route="/other",status="200"} 7' in text
+    assert f'erp_db_pool_waiting{{pid="{OTHER_PID}"}} 3' in text
+    assert f'erp_db_pool_waiting{{pid="{os.getpid()}"}}' in text # This process flushed its own first
+
+    recorded, entries = multiprocess.slow_queries(limit=1)
+    assert recorded >= 1 and entries == [{"fingerprint": "SELECT slow", "duration_ms": 123456.0, "pid": OTHER_PID}]
+
+    _, traces = multiprocess.recent_traces(limit=1)
+    assert traces[0]["trace_id"] == "feedfacefeedface" and traces[0]["status"] == 200 and "root" not in traces[0]
+    assert multiprocess.find_trace("feedfacefeedface")["pid"] == OTHER_PID
+
+    stats = multiprocess.cache_stats()
+    assert stats["workers"][str(OTHER_PID)]["categories"]["hits"] == 3
+    assert stats["categories"]["hits"] >= 3
+    assert set(stats["workers"]) == {str(OTHER_PID), str(os.getpid())}
+
+
+def test_exited_worker_counters_are_kept(shared_dir):
+    _other_worker(route_count=7, slow_ms=1.0, trace_id="0123456789abcdef")
+    multiprocess.mark_process_dead(OTHER_PID)
+    assert not os.path.exists(multiprocess._path("metrics", OTHER_PID))
+    assert not os.path.exists(multiprocess._path("admin", OTHER_PID))
+
+    _other_worker(route_count=2, slow_ms=1.0, trace_id="0123456789abcdef") # Its pid reused by a new worker
+    text = multiprocess.render_metrics()
+    assert 'erp_http_requests_total{method="GET",route="/other",status="200"} 9' in text
+    assert multiprocess.find_trace("0123456789abcdef") is not None
+    multiprocess.mark_process_dead(OTHER_PID)
+    assert 'erp_http_requests_total{method="GET",route="/other",status="200"} 9' in multiprocess.render_metrics()
+    assert multiprocess.find_trace("0123456789abcdef") is None
+
+
+def test_single_process_without_directory(monkeypatch):
+    monkeypatch.setattr(multiprocess, "MULTIPROC_DIR", None)
+    assert "# TYPE erp_http_requests_total counter" in multiprocess.render_metrics()
+    assert "workers" not in multiprocess.cache_stats()
@@ -0,0 +1,57 @@
+import time
+import threading
+from contextlib import ExitStack
+
+from src.db import pool as db_pool
+
+
+def _backend_pid(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_backend_pid();")
+        pid = cur.fetchone()[0]
+    conn.rollback()
+    return pid
+
+
+def test_returned_connections_stay_open(db):
+    # psycopg2 alone would close every returned connection beyond min_conn=1.
+    with ExitStack() as stack:
+        conns = [stack.enter_context(db_pool.connection()) for _ in range(4)]
+        first_pids = {_backend_pid(conn) for conn in conns}
+    assert len(db_pool.get_pool()._pool) == 4
+
+    with ExitStack() as stack:
+        conns = [stack.enter_context(db_pool.connection()) for _ in range(4)]
+        assert {_backend_pid(conn) for conn in conns} == first_pids
+
+
+def test_warm_pool_checks_initial_connections(db):
+    assert db_pool.warm_pool() == 1
+
+
+def test_concurrent_first_use_creates_one_pool(db, monkeypatch):
+    db_pool.close_pool()
+    created = []
+    init_pool = db_pool.init_pool
+
+    def slow_init_pool(*args, **kwargs):
+        time.sleep(0.05) # Widen the window in which a second caller could also see no pool
+        created.append(init_pool(*args, **kwargs))
+        return created[-1]
+
+    monkeypatch.setattr(db_pool, "init_pool", slow_init_pool)
+    barrier = threading.Barrier(8)
+    pools = []
+
+    def first_use():
+        barrier.wait()
+        pools.append(db_pool.get_pool())
+
+    threads = [threading.Thread(target=first_use) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(created) == 1
+    assert all(p is created[0] for p in pools)
+    assert not created[0].closed
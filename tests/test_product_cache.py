@@ -0,0 +1,184 @@
+import json
+from datetime import datetime
+
+import fakeredis
+import pytest
+
+from src.cache.product_cache import ProductCache, product_cache
+from src.db.pool import execute_query
+from src.core_modules.product_management.product_service import ProductService
+from src.core_modules.sales_management.sales_service import SalesService
+from src.core_modules.purchase_management.purchase_service import PurchaseService
+
+
+class Loader:
+    """Stands in for ProductService._load_product_by_sku; counts calls."""
+
+    def __init__(self, price=1.0, during_load=None):
+        self.price = price
+        self.calls = 0
+        self.during_load = during_load
+
+    def __call__(self, sku):
+        self.calls += 1
+        product = {"sku": sku, "unit_price": self.price}
+        if self.during_load is not None:
+            self.during_load()
+        return product
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis()
+
+
+def test_read_through_fills_both_tiers(redis_client):
+    worker_a = ProductCache(redis_client=redis_client)
+    worker_b = ProductCache(redis_client=redis_client)
+    loader = Loader(price=2.5)
+
+    assert worker_a.get("A1", loader) == {"sku": "A1", "unit_price": 2.5}
+    assert worker_a.get("A1", loader)["unit_price"] == 2.5
+    assert worker_b.get("A1", loader)["unit_price"] == 2.5
+    assert loader.calls == 1
+    assert worker_a.stats()["local_hits"] == 1
+    assert worker_b.stats()["redis_hits"] == 1
+
+
+def test_missing_products_are_not_cached(redis_client):
+    cache = ProductCache(redis_client=redis_client)
+    assert cache.get("NOPE", lambda sku: None) is None
+    assert redis_client.get(cache.key_prefix + "NOPE") is None
+    assert cache.stats()["local_entries"] == 0
+
+
+def test_invalidate_drops_both_tiers(redis_client):
+    worker_a = ProductCache(redis_client=redis_client)
+    worker_b = ProductCache(redis_client=redis_client)
+    worker_a.get("A1", Loader(price=1.0))
+
+    worker_b.invalidate(["A1"])
+    assert redis_client.get(worker_a.key_prefix + "A1") is None
+    worker_a.invalidate(["A1"])
+    assert worker_a.get("A1", Loader(price=3.0))["unit_price"] == 3.0
+
+
+def test_load_racing_another_workers_invalidation_is_not_written_to_redis(redis_client):
+    reader = ProductCache(redis_client=redis_client)
+    writer = ProductCache(redis_client=redis_client)
+    # The reader loads the old row; the writer's commit and invalidation land before the load returns.
+    stale = Loader(price=1.0, during_load=lambda: writer.invalidate(["A1"]))
+
+    assert reader.get("A1", stale)["unit_price"] == 1.0 # The reader's own request still gets what it read
+    assert redis_client.get(reader.key_prefix + "A1") is None
+
+    other = ProductCache(redis_client=redis_client)
+    fresh = Loader(price=2.0)
+    assert other.get("A1", fresh)["unit_price"] == 2.0
+    assert fresh.calls == 1
+
+
+def test_load_racing_a_local_invalidation_is_not_cached(redis_client):
+    cache = ProductCache(redis_client=redis_client)
+    stale = Loader(price=1.0, during_load=lambda: cache.invalidate(["A1"]))
+
+    cache.get("A1", stale)
+    assert cache.stats()["local_entries"] == 0
+    assert redis_client.get(cache.key_prefix + "A1") is None
+    assert cache.get("A1", Loader(price=2.0))["unit_price"] == 2.0
+
+
+def test_redis_errors_are_treated_as_misses():
+    class BrokenRedis(fakeredis.FakeRedis):
+        def mget(self, *args, **kwargs):
+            raise ConnectionError("redis down")
+
+    cache = ProductCache(redis_client=BrokenRedis())
+    loader = Loader()
+    assert cache.get("A1", loader)["sku"] == "A1"
+    assert loader.calls == 1
+
+
+# Service write paths invalidate the shared cache, Redis tier included.
+
+@pytest.fixture
+def cached(db, monkeypatch, redis_client):
+    monkeypatch.setattr(product_cache, "redis_client", redis_client)
+    return redis_client
+
+
+def _in_redis(redis_client, sku):
+    return redis_client.get(product_cache.key_prefix + sku) is not None
+
+
+def _redis_field(redis_client, sku, field):
+    # What another worker would be served on its next local miss (None: it loads from the database).
+    payload = redis_client.get(product_cache.key_prefix + sku)
+    return json.loads(payload)[field] if payload is not None else None
+
+
+def test_product_update_invalidates(cached, sku):
+    products = ProductService()
+    products.add_product(sku, "Widget", "Tools", quantity=10, unit_price=1.0)
+    assert products.get_product_by_sku(sku)["unit_price"] == 1.0
+    assert _in_redis(cached, sku)
+
+    assert products.update_product(sku, {"unit_price": 4.0})["unit_price"] == 4.0
+    assert _redis_field(cached, sku, "unit_price") in (None, 4.0)
+    assert products.get_product_by_sku(sku)["unit_price"] == 4.0
+
+
+def test_sale_invalidates(cached, sku):
+    products = ProductService()
+    products.add_product(sku, "Widget", "Tools", quantity=10, unit_price=1.0)
+    assert products.get_product_by_sku(sku)["quantity"] == 10
+
+    sale = SalesService().record_sale("Cache Customer", [{"sku": sku, "quantity": 3}], datetime.now().isoformat())
+    assert "error" not in sale
+    assert _redis_field(cached, sku, "quantity") in (None, 7)
+    assert products.get_product_by_sku(sku)["quantity"] == 7
+
+
+def test_received_purchase_invalidates(cached, sku):
+    products = ProductService()
+    products.add_product(sku, "Widget", "Tools", quantity=10, unit_price=1.0)
+    assert products.get_product_by_sku(sku)["quantity"] == 10
+
+    purchases = PurchaseService()
+    po = purchases.record_purchase("Cache Supplier", [{"sku": sku, "quantity": 5, "cost_price": 0.5}], datetime.now().isoformat())
+    assert products.get_product_by_sku(sku)["quantity"] == 10 # Ordered, not received yet
+    purchases.update_purchase_status(po["po_id"], "Received")
+    assert _redis_field(cached, sku, "quantity") in (None, 15)
+    assert products.get_product_by_sku(sku)["quantity"] == 15
+
+
+def test_product_delete_invalidates(cached, sku):
+    products = ProductService()
+    products.add_product(sku, "Widget", "Tools", quantity=10, unit_price=1.0)
+    assert products.get_product_by_sku(sku) is not None
+
+    assert products.delete_product(sku)
+    assert not _in_redis(cached, sku)
+    assert products.get_product_by_sku(sku) is None
+
+
+def test_writes_resolve_the_product_in_the_database(cached, sku):
+    products = ProductService()
+    products.add_product(sku, "Widget", "Tools", quantity=10, unit_price=1.0)
+    stale_id = products.get_product_by_sku(sku)["product_id"]
+    # Deleted and re-created behind the cache's back: the cached product_id is gone.
+    execute_query("DELETE FROM inventory_levels WHERE product_id = %s;", (stale_id,), commit=True)
+    execute_query("""
+        WITH gone AS (DELETE FROM products WHERE product_id = %s RETURNING sku, product_name, category_id)
+        INSERT INTO products (sku, product_name, category_id, unit_price) SELECT sku, product_name, category_id, 1.0 FROM gone;
+    """, (stale_id,), commit=True)
+    execute_query("""
+        INSERT INTO inventory_levels (product_id, available_quantity, inventory_level_status)
+        SELECT product_id, 10, 'In Stock' FROM products WHERE sku = %s;
+    """, (sku,), commit=True)
+    assert products.get_product_by_sku(sku)["product_id"] == stale_id
+
+    updated = products.update_product(sku, {"quantity": 4})
+    assert updated["product_id"] != stale_id and updated["quantity"] == 4
+    assert products.delete_product(sku)
+    assert products.get_product_by_sku(sku) is None
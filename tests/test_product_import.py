@@ -0,0 +1,43 @@
+import pytest
+
+from src.db.pool import execute_query
+from src.core_modules.product_management.product_import import normalize_record
+from src.core_modules.product_management.product_service import ProductService
+
+
+def _csv(*rows):
+    return ["sku,name,category,quantity,reorder_point\n"] + [",".join(map(str, row)) + "\n" for row in rows]
+
+
+def _inventory(sku):
+    return execute_query("""
+        SELECT il.available_quantity, il.reorder_point FROM inventory_levels il
+        JOIN products p ON p.product_id = il.product_id WHERE p.sku = %s
+    """, (sku,), fetch_one=True)
+
+
+@pytest.mark.parametrize("field", ["quantity", "reorder_point"])
+def test_negative_counts_are_rejected(field):
+    with pytest.raises(ValueError, match="must not be negative"):
+        normalize_record({"sku": "S", "name": "N", "category": "C", field: "-1"})
+
+
+def test_import_counts_inserts_and_updates(db, sku):
+    products = ProductService()
+    products.add_product(sku, "Widget", "Tools", quantity=1, unit_price=1.0)
+    new_sku = sku + "-NEW"
+
+    result = products.import_products(_csv((sku, "Widget", "Tools", 7, ""), (new_sku, "Gadget", "Tools", 3, 2), (sku + "-BAD", "Bad", "Tools", -4, "")), "csv")
+    assert (result["received"], result["inserted"], result["updated"]) == (3, 1, 1)
+    assert [error["row"] for error in result["errors"]] == [3]
+    assert _inventory(sku) == (7, 0)
+    assert _inventory(new_sku) == (3, 2)
+
+    result = products.import_products(_csv((new_sku, "Gadget", "Tools", "", 5)), "csv")
+    assert (result["inserted"], result["updated"]) == (0, 1)
+    assert _inventory(new_sku) == (3, 5)
+
+
+def test_import_row_limit(db, sku):
+    with pytest.raises(ValueError, match="at most 2 rows"):
+        ProductService().import_products(_csv(*[(f"{sku}-{i}", "Widget", "Tools", 1, 0) for i in range(3)]), "csv", max_rows=2)
@@ -0,0 +1,144 @@
+import time
+
+import psycopg2
+import pytest
+from flask import Flask, jsonify
+
+from src.db import instrumentation, replicas as routing
+from src.db.pool import connection, execute_query
+from src.db.replicas import Replica, read_only, reset_routing
+from src.observability.slow_queries import SlowQueryLog
+from src.web.stickiness import STICKY_COOKIE, init_stickiness
+
+# The replicas list is shared by reference (src/web/stickiness.py imports it), so the
+# fixtures add to it rather than replace it. Services decorated with @read_only while
+# it was empty never route; the tests decorate their reads after adding a replica.
+
+
+@pytest.fixture
+def add_replica(db, monkeypatch):
+    added = []
+
+    def add(dsn, name="test-replica"):
+        replica = Replica(dsn, name)
+        routing.replicas.append(replica)
+        added.append(replica)
+        return replica
+
+    monkeypatch.setattr(routing, "REPLICA_CHECK_INTERVAL", 0) # Re-measure the lag on every checkout
+    reset_routing()
+    yield add
+    for replica in added:
+        routing.replicas.remove(replica)
+    reset_routing()
+
+
+@pytest.fixture
+def replica(add_replica, replica_url):
+    return add_replica(replica_url)
+
+
+def _in_recovery():
+    return execute_query("SELECT pg_is_in_recovery()", fetch_one=True)[0]
+
+
+def _read_from_replica():
+    """Runs a read-only query and reports whether a standby answered it."""
+    return read_only(_in_recovery)()
+
+
+def _write_on_primary(dsn):
+    # Outside the pool, so this process does not go sticky.
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("UPDATE resource_versions SET updated_at = CURRENT_TIMESTAMP WHERE resource_name = 'products' AND shard = 0;")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def test_reads_go_to_a_caught_up_replica(replica):
+    assert _read_from_replica()
+    assert not _in_recovery() # Outside @read_only
+    assert replica.up and replica.lag <= routing.REPLICA_MAX_LAG_SECONDS
+
+
+def test_lagging_replica_falls_back_to_primary(replica, replica_url, database_url, monkeypatch):
+    monkeypatch.setattr(routing, "REPLICA_MAX_LAG_SECONDS", 0.2)
+    admin = psycopg2.connect(replica_url)
+    admin.autocommit = True
+    try:
+        with admin.cursor() as cur:
+            cur.execute("SELECT pg_wal_replay_pause();")
+        _write_on_primary(database_url)
+        time.sleep(0.5)
+        assert not _read_from_replica()
+        assert replica.lag > 0.2
+    finally:
+        with admin.cursor() as cur:
+            cur.execute("SELECT pg_wal_replay_resume();")
+        admin.close()
+
+    deadline = time.monotonic() + 5
+    while not _read_from_replica():
+        assert time.monotonic() < deadline, "replica did not catch up after replay resumed"
+        time.sleep(0.1)
+
+
+def test_unreachable_replica_falls_back_to_primary(add_replica, monkeypatch):
+    monkeypatch.setattr(routing, "REPLICA_RETRY_SECONDS", 60)
+    down = add_replica("postgresql://postgres:@/erp_test?host=/nonexistent&port=1", "down-replica")
+    assert not _read_from_replica()
+    assert not down.up
+    assert not down.usable(time.monotonic()) # Skipped without another connection attempt
+    assert not _read_from_replica()
+
+
+def test_writer_reads_from_primary_inside_the_sticky_window(replica, monkeypatch):
+    app = Flask(__name__)
+    init_stickiness(app)
+
+    @app.route("/read")
+    def read():
+        return jsonify(replica=_read_from_replica())
+
+    @app.route("/write", methods=["POST"])
+    def write():
+        execute_query("UPDATE resource_versions SET updated_at = CURRENT_TIMESTAMP WHERE resource_name = 'products' AND shard = 0;", commit=True)
+        return jsonify(replica=_read_from_replica()) # Same request, after the commit
+
+    writer, other = app.test_client(), app.test_client()
+    assert writer.get("/read").get_json()["replica"]
+
+    response = writer.post("/write")
+    assert response.get_json()["replica"] is False
+    assert writer.get_cookie(STICKY_COOKIE) is not None
+    assert writer.get("/read").get_json()["replica"] is False
+    assert other.get("/read").get_json()["replica"] # A client that did not write is unaffected
+
+    writer.set_cookie(STICKY_COOKIE, f"{time.time() - 1:.3f}") # The window has passed
+    assert writer.get("/read").get_json()["replica"]
+
+
+def _explained(log, count):
+    deadline = time.monotonic() + 5
+    while sum("explained_on" in entry for entry in log.recent()) < count:
+        assert time.monotonic() < deadline, f"EXPLAIN did not finish: {log.recent()}"
+        time.sleep(0.05)
+    return sorted(log.recent(), key=lambda entry: entry["ts"])
+
+
+def test_slow_replica_query_is_explained_on_that_replica(replica, monkeypatch):
+    log = SlowQueryLog(threshold_ms=0.001, explain_sample_rate=1.0, log_file=None)
+    monkeypatch.setattr(instrumentation, "slow_query_log", log)
+    with connection(replica=replica) as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*) FROM products;")
+    on_replica = _explained(log, 1)[0]
+    assert on_replica["replica"] == replica.name
+    assert on_replica["explained_on"] == replica.name and on_replica["explain_analyzed"]
+
+    execute_query("SELECT count(*) FROM categories;")
+    on_primary = _explained(log, 2)[-1]
+    assert "replica" not in on_primary and on_primary["explained_on"] == "primary"
@@ -0,0 +1,99 @@
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from src.db.pool import execute_query, transaction
+from src.core_modules.product_management.product_service import ProductService
+from src.core_modules.sales_management.sales_service import InsufficientStockError, SalesService
+
+
+def _stock(sku):
+    return execute_query("""
+        SELECT il.available_quantity FROM inventory_levels il JOIN products p ON p.product_id = il.product_id
+        WHERE p.sku = %s
+    """, (sku,), fetch_one=True)[0]
+
+
+def _product_id(sku):
+    return execute_query("SELECT product_id FROM products WHERE sku = %s", (sku,), fetch_one=True)[0]
+
+
+def _order(sku, quantity, **item):
+    return {
+        "customer_name": "Batch Customer",
+        "items": [dict(item, sku=sku, quantity=quantity)],
+        "order_date": datetime.now().isoformat(),
+    }
+
+
+def test_batch_rejects_malformed_orders_individually(db, sku):
+    ProductService().add_product(sku, "Widget", "Tools", quantity=10, unit_price=2.0)
+    malformed = [
+        dict(_order(sku, 1), items="not a list"),
+        dict(_order(sku, 1), items=["not an object"]),
+        dict(_order(sku, 1), items=[{"quantity": 1}]),
+        _order(sku, 0),
+        _order(sku, True),
+        _order(sku, 1, price="cheap"),
+    ]
+    result = SalesService().record_sales_batch([_order(sku, 2)] + malformed + [_order(sku, 3, price=1.5)])
+
+    assert (result["created"], result["rejected"]) == (2, len(malformed))
+    assert [entry["index"] for entry in result["results"]] == list(range(len(malformed) + 2))
+    assert "order_id" in result["results"][0] and "order_id" in result["results"][-1]
+    assert all("error" in entry for entry in result["results"][1:-1])
+    assert result["results"][-1]["total_amount"] == 4.5
+    assert _stock(sku) == 5
+
+
+def test_batch_rejects_only_the_order_short_on_stock(db, sku):
+    ProductService().add_product(sku, "Widget", "Tools", quantity=5, unit_price=1.0)
+    result = SalesService().record_sales_batch([_order(sku, 3), _order(sku, 3), _order(sku, 2)])
+
+    assert (result["created"], result["rejected"]) == (2, 1)
+    assert result["results"][1]["short_skus"] == [sku]
+    assert "order_id" in result["results"][2]
+    assert _stock(sku) == 0
+
+
+def test_oversell_is_rejected_with_the_short_skus(db, sku):
+    products = ProductService()
+    short = sku + "-SHORT"
+    products.add_product(sku, "Widget", "Tools", quantity=5, unit_price=1.0)
+    products.add_product(short, "Gadget", "Tools", quantity=1, unit_price=1.0)
+    ids = {_product_id(sku): sku, _product_id(short): short}
+
+    with pytest.raises(InsufficientStockError) as excinfo:
+        with transaction() as cur:
+            SalesService()._decrement_inventory(cur, {product_id: 2 for product_id in ids}, ids)
+    assert excinfo.value.short_skus == [short]
+    # The whole statement's work rolls back with the transaction, the line that fit included.
+    assert (_stock(sku), _stock(short)) == (5, 1)
+
+    result = SalesService().record_sale("Stock Customer", [{"sku": sku, "quantity": 6}], datetime.now().isoformat())
+    assert result["short_skus"] == [sku]
+    assert _stock(sku) == 5
+
+
+def test_concurrent_sales_cannot_both_take_the_last_units(db, sku):
+    ProductService().add_product(sku, "Widget", "Tools", quantity=3, unit_price=1.0)
+    product_id = _product_id(sku)
+    sales = SalesService()
+    results = []
+
+    def second_sale():
+        results.append(sales.record_sale("Stock Customer", [{"sku": sku, "quantity": 3}], datetime.now().isoformat()))
+
+    with transaction() as cur:
+        sales._decrement_inventory(cur, {product_id: 3}, {product_id: sku})
+        # The second sale now waits on the row lock held by this one.
+        competitor = threading.Thread(target=second_sale)
+        competitor.start()
+        time.sleep(0.2)
+        assert not results
+    competitor.join(timeout=5)
+
+    assert results[0]["short_skus"] == [sku]
+    assert _stock(sku) == 0